@@ -20,7 +20,18 @@ import tiktoken
 import os
 import json # Added for JSON parsing
 
+import complexity_cache
+import complexity_executor
 import complexity_measures
+import llm_cache
+import llm_deadline
+import llm_gateway
+import llm_hedging
+import llm_ledger
+import llm_limits
+import llm_routing
+import llm_scheduler
+import llm_singleflight
 from complexity_measures import (
     Plan,
     PlanStep,
@@ -1373,6 +1384,75 @@ class PromptEngineeringConfig:
         agents (int): Number of agents for collaborative reasoning (default: 3)
         complexity_factor (int): Multiplier for adjusting step budget based on task
             complexity (default: 5)
+        cache_path (Optional[str]): SQLite file for the persistent LLM response cache;
+            None disables caching (default: "llm_cache.sqlite3")
+        cache_max_bytes (int): Size bound of the response cache before LRU eviction
+            (default: 256 MiB)
+        cache_ttl_seconds (Optional[float]): Default lifetime of cached responses
+            (default: 7 days)
+        cache_policies (Dict[str, dict]): Call sites opted into caching, mapped to
+            CachePolicy keyword arguments such as ttl_seconds or max_temperature
+            (default: llm_cache.DEFAULT_CACHE_POLICIES)
+        single_flight_call_sites (List[str]): Call sites whose identical in-flight or
+            just-finished requests share one upstream call
+            (default: llm_singleflight.DEFAULT_SINGLE_FLIGHT_CALL_SITES)
+        single_flight_linger_seconds (float): How long a finished result still answers
+            identical requests (default: 5.0)
+        hedging_policies (Dict[str, dict]): Call sites whose slow requests get a duplicate
+            once they exceed the observed latency percentile, mapped to HedgePolicy kwargs
+            (percentile, budget_fraction, min_samples); "default" applies to all call
+            sites (default: {}, hedging off)
+        stream_early_stop (bool): Stream step generations and hang up at the
+            boundary the caller needs (</reward>, </agent_response>, ...) instead of relying
+            on server-side stop sequences (default: True)
+        max_choices_per_request (int): Candidates requested per call via the API's n
+            parameter when sampling several answers to the same prompt. Batched
+            candidates share one sampled temperature; 1 sends one request per
+            candidate, each with its own (default: 1)
+        model_routes (Dict[str, str]): Model per call site, overriding the model the call
+            site asks for; "default" applies to every unlisted chat call site
+            (default: {}, every call site keeps its own model)
+        model_escalations (Dict[str, dict]): Call sites whose requests move to a bigger
+            model when the reflection reward of the step being revised is low, mapped
+            to EscalationRule kwargs, e.g. {"revise_step": {"model": "gpt-4o",
+            "below_reward": 0.5}} (default: {})
+        adaptive_completion_limits (bool): Size max_completion_tokens from each call
+            site's observed completion lengths, retrying truncated responses with the
+            call site's own limit (default: True)
+        completion_limit_percentile (float): Observed completion-length percentile the
+            adaptive limit covers before headroom is added (default: 0.99)
+        call_site_timeouts (Dict[str, float]): Seconds each LLM request of a call site may
+            take; "default" covers other call sites
+            (default: llm_deadline.DEFAULT_CALL_SITE_TIMEOUTS)
+        run_timeout_seconds (Optional[float]): Deadline for all LLM calls made by one
+            main() run; requests that cannot finish in time raise
+            llm_scheduler.LLMTimeoutError (default: None, no run deadline)
+        complexity_thread_workers (int): Threads running the is_complex_final measures
+            (default: 8)
+        complexity_process_workers (int): Processes running the CPU-bound spaCy measures;
+            0 runs them on threads (default: 0)
+        complexity_label_measures (List[str]): Zero-weight complexity measures computed
+            anyway for the ML fine-tuning label (default: [], only the weighted measures)
+        complexity_spacy_tier (str): spaCy model tier of the complexity measures, "sm",
+            "md", "lg" or "trf"; see benchmark_spacy_tiers.py for the accuracy trade-off
+            (default: "trf")
+        complexity_cache_path (Optional[str]): SQLite file memoizing complexity assessments
+            and plans by normalized query; None disables it (default: "complexity_cache.sqlite3")
+        complexity_cache_ttl_seconds (Optional[float]): Lifetime of cached assessments;
+            None keeps them until the measures or weights change (default: 7 days)
+        model_prices (Dict[str, dict]): USD per million input, cached-input and output
+            tokens per model, used to cost the LLM usage ledger
+            (default: llm_ledger.DEFAULT_MODEL_PRICES)
+        export_llm_usage (bool): Write the per-call token/cost ledger and its rollups
+            as JSON and CSV at the end of main() (default: True)
+        rate_limits (Dict[str, dict]): Requests/min and tokens/min per model, e.g.
+            {"gpt-4o-mini": {"rpm": 500, "tpm": 200000}}; "default" covers other models
+            (default: llm_scheduler.DEFAULT_RATE_LIMITS)
+        call_site_priorities (Dict[str, str]): "critical", "normal" or "background" per
+            call site (default: llm_scheduler.DEFAULT_CALL_SITE_PRIORITIES)
+        circuit_breaker_threshold (int): Consecutive provider failures before LLM calls
+            fail fast (default: 5)
+        circuit_breaker_reset_seconds (float): How long the breaker stays open (default: 30.0)
     """
 
     max_steps: int = 20
@@ -1388,6 +1468,33 @@ class PromptEngineeringConfig:
         3  # Number of agents for Collaborative Multi-Agent Reasoning, where multiple agents work together to solve a task by sharing insights and refining each other's suggestions.
     )
     complexity_factor: int = 5  # Factor to adjust step budget based on complexity
+    cache_path: Optional[str] = llm_cache.DEFAULT_CACHE_PATH
+    cache_max_bytes: int = llm_cache.DEFAULT_CACHE_MAX_BYTES
+    cache_ttl_seconds: Optional[float] = llm_cache.DEFAULT_CACHE_TTL_SECONDS
+    cache_policies: Dict[str, dict] = llm_cache.DEFAULT_CACHE_POLICIES
+    single_flight_call_sites: List[str] = list(llm_singleflight.DEFAULT_SINGLE_FLIGHT_CALL_SITES)
+    single_flight_linger_seconds: float = llm_singleflight.DEFAULT_LINGER_SECONDS
+    hedging_policies: Dict[str, dict] = {}
+    stream_early_stop: bool = True
+    max_choices_per_request: int = 1
+    model_routes: Dict[str, str] = llm_routing.DEFAULT_MODEL_ROUTES
+    model_escalations: Dict[str, dict] = {}
+    adaptive_completion_limits: bool = True
+    completion_limit_percentile: float = llm_limits.DEFAULT_LIMIT_PERCENTILE
+    call_site_timeouts: Dict[str, float] = llm_deadline.DEFAULT_CALL_SITE_TIMEOUTS
+    run_timeout_seconds: Optional[float] = None
+    complexity_thread_workers: int = complexity_executor.DEFAULT_THREAD_WORKERS
+    complexity_process_workers: int = 0
+    complexity_label_measures: List[str] = []
+    complexity_spacy_tier: str = complexity_measures.DEFAULT_SPACY_TIER
+    complexity_cache_path: Optional[str] = complexity_cache.DEFAULT_COMPLEXITY_CACHE_PATH
+    complexity_cache_ttl_seconds: Optional[float] = complexity_cache.DEFAULT_COMPLEXITY_CACHE_TTL_SECONDS
+    model_prices: Dict[str, dict] = llm_ledger.DEFAULT_MODEL_PRICES
+    export_llm_usage: bool = True
+    rate_limits: Dict[str, dict] = llm_scheduler.DEFAULT_RATE_LIMITS
+    call_site_priorities: Dict[str, str] = llm_scheduler.DEFAULT_CALL_SITE_PRIORITIES
+    circuit_breaker_threshold: int = llm_scheduler.DEFAULT_BREAKER_THRESHOLD
+    circuit_breaker_reset_seconds: float = llm_scheduler.DEFAULT_BREAKER_RESET_SECONDS
 
     def __init__(
         self,
@@ -1402,6 +1509,33 @@ class PromptEngineeringConfig:
         backtrack: bool = True,
         agents: int = 3,
         complexity_factor: int = 5,
+        cache_path: Optional[str] = llm_cache.DEFAULT_CACHE_PATH,
+        cache_max_bytes: int = llm_cache.DEFAULT_CACHE_MAX_BYTES,
+        cache_ttl_seconds: Optional[float] = llm_cache.DEFAULT_CACHE_TTL_SECONDS,
+        cache_policies: Optional[Dict[str, dict]] = None,
+        single_flight_call_sites: Optional[List[str]] = None,
+        single_flight_linger_seconds: float = llm_singleflight.DEFAULT_LINGER_SECONDS,
+        hedging_policies: Optional[Dict[str, dict]] = None,
+        stream_early_stop: bool = True,
+        max_choices_per_request: int = 1,
+        model_routes: Optional[Dict[str, str]] = None,
+        model_escalations: Optional[Dict[str, dict]] = None,
+        adaptive_completion_limits: bool = True,
+        completion_limit_percentile: float = llm_limits.DEFAULT_LIMIT_PERCENTILE,
+        call_site_timeouts: Optional[Dict[str, float]] = None,
+        run_timeout_seconds: Optional[float] = None,
+        complexity_thread_workers: int = complexity_executor.DEFAULT_THREAD_WORKERS,
+        complexity_process_workers: int = 0,
+        complexity_label_measures: Optional[List[str]] = None,
+        complexity_spacy_tier: str = complexity_measures.DEFAULT_SPACY_TIER,
+        complexity_cache_path: Optional[str] = complexity_cache.DEFAULT_COMPLEXITY_CACHE_PATH,
+        complexity_cache_ttl_seconds: Optional[float] = complexity_cache.DEFAULT_COMPLEXITY_CACHE_TTL_SECONDS,
+        model_prices: Optional[Dict[str, dict]] = None,
+        export_llm_usage: bool = True,
+        rate_limits: Optional[Dict[str, dict]] = None,
+        call_site_priorities: Optional[Dict[str, str]] = None,
+        circuit_breaker_threshold: int = llm_scheduler.DEFAULT_BREAKER_THRESHOLD,
+        circuit_breaker_reset_seconds: float = llm_scheduler.DEFAULT_BREAKER_RESET_SECONDS,
     ):
         """Initialize the configuration settings.
 
@@ -1417,6 +1551,33 @@ class PromptEngineeringConfig:
             backtrack: Enable/disable backtracking in reasoning
             agents: Number of agents for collaborative reasoning
             complexity_factor: Multiplier for adjusting step budget
+            cache_path: SQLite file for the LLM response cache, or None to disable it
+            cache_max_bytes: Size bound of the response cache
+            cache_ttl_seconds: Default lifetime of cached responses
+            cache_policies: Call sites opted into caching and their CachePolicy kwargs
+            single_flight_call_sites: Call sites whose identical requests are coalesced
+            single_flight_linger_seconds: How long a finished result answers identical requests
+            hedging_policies: Call sites that hedge slow requests and their HedgePolicy kwargs
+            stream_early_stop: Stream step generations and stop at the needed boundary
+            max_choices_per_request: Candidates sampled per request via the n parameter
+            model_routes: Model per call site
+            model_escalations: Call sites that escalate low-reward revisions and their EscalationRule kwargs
+            adaptive_completion_limits: Size completion limits from observed output lengths
+            completion_limit_percentile: Output-length percentile covered by the adaptive limit
+            call_site_timeouts: Per-request timeout per call site
+            run_timeout_seconds: Deadline for all LLM calls of one main() run
+            complexity_thread_workers: Threads running the complexity measures
+            complexity_process_workers: Processes running the spaCy complexity measures
+            complexity_label_measures: Zero-weight complexity measures used for the fine-tuning label
+            complexity_spacy_tier: spaCy model tier of the complexity measures
+            complexity_cache_path: SQLite file of the complexity assessment cache, or None
+            complexity_cache_ttl_seconds: Lifetime of cached complexity assessments
+            model_prices: Per-model token prices used by the LLM usage ledger
+            export_llm_usage: Export the LLM usage ledger at the end of main()
+            rate_limits: Requests/min and tokens/min per model
+            call_site_priorities: Scheduling priority class per call site
+            circuit_breaker_threshold: Consecutive provider failures before failing fast
+            circuit_breaker_reset_seconds: How long the circuit breaker stays open
         """
         self.max_steps = max_steps
         self.initial_budget = initial_budget
@@ -1429,6 +1590,55 @@ class PromptEngineeringConfig:
         self.backtrack = backtrack
         self.agents = agents
         self.complexity_factor = complexity_factor
+        self.cache_path = cache_path
+        self.cache_max_bytes = cache_max_bytes
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.cache_policies = (
+            dict(llm_cache.DEFAULT_CACHE_POLICIES)
+            if cache_policies is None
+            else cache_policies
+        )
+        self.single_flight_call_sites = (
+            list(llm_singleflight.DEFAULT_SINGLE_FLIGHT_CALL_SITES)
+            if single_flight_call_sites is None
+            else single_flight_call_sites
+        )
+        self.single_flight_linger_seconds = single_flight_linger_seconds
+        self.hedging_policies = {} if hedging_policies is None else hedging_policies
+        self.stream_early_stop = stream_early_stop
+        self.max_choices_per_request = max_choices_per_request
+        self.model_routes = (
+            dict(llm_routing.DEFAULT_MODEL_ROUTES) if model_routes is None else model_routes
+        )
+        self.model_escalations = {} if model_escalations is None else model_escalations
+        self.adaptive_completion_limits = adaptive_completion_limits
+        self.completion_limit_percentile = completion_limit_percentile
+        self.call_site_timeouts = (
+            dict(llm_deadline.DEFAULT_CALL_SITE_TIMEOUTS)
+            if call_site_timeouts is None
+            else call_site_timeouts
+        )
+        self.run_timeout_seconds = run_timeout_seconds
+        self.complexity_thread_workers = complexity_thread_workers
+        self.complexity_process_workers = complexity_process_workers
+        self.complexity_label_measures = list(complexity_label_measures or [])
+        self.complexity_spacy_tier = complexity_spacy_tier
+        self.complexity_cache_path = complexity_cache_path
+        self.complexity_cache_ttl_seconds = complexity_cache_ttl_seconds
+        self.model_prices = (
+            dict(llm_ledger.DEFAULT_MODEL_PRICES) if model_prices is None else model_prices
+        )
+        self.export_llm_usage = export_llm_usage
+        self.rate_limits = (
+            dict(llm_scheduler.DEFAULT_RATE_LIMITS) if rate_limits is None else rate_limits
+        )
+        self.call_site_priorities = (
+            dict(llm_scheduler.DEFAULT_CALL_SITE_PRIORITIES)
+            if call_site_priorities is None
+            else call_site_priorities
+        )
+        self.circuit_breaker_threshold = circuit_breaker_threshold
+        self.circuit_breaker_reset_seconds = circuit_breaker_reset_seconds
 
 
 # CompnentType represents a category of different final output component types, ie. whether the output is its own standalone file, a part of a larger file, or a response to a prompt.
@@ -1897,6 +2107,80 @@ class AdvancedPromptEngineer:
         self.config = config
         self.knowledge_base = {}  # For Retrieval-Augmented Generation
         self.task_object = None
+        self.configure_llm_cache()
+        self.configure_llm_scheduler()
+        llm_gateway.get_gateway().configure_hedging(
+            llm_hedging.Hedger(
+                {
+                    call_site: llm_hedging.HedgePolicy(**(options or {}))
+                    for call_site, options in self.config.hedging_policies.items()
+                }
+            )
+        )
+        llm_gateway.get_gateway().configure_single_flight(
+            llm_singleflight.SingleFlight(
+                call_sites=self.config.single_flight_call_sites,
+                linger_seconds=self.config.single_flight_linger_seconds,
+            )
+        )
+        llm_gateway.get_gateway().configure_routing(
+            llm_routing.ModelRouter(
+                routes=self.config.model_routes,
+                escalations={
+                    call_site: llm_routing.EscalationRule(**options)
+                    for call_site, options in self.config.model_escalations.items()
+                },
+            )
+        )
+        llm_gateway.get_gateway().configure_timeouts(self.config.call_site_timeouts)
+        llm_gateway.get_gateway().configure_completion_limits(
+            llm_limits.CompletionSizer(percentile=self.config.completion_limit_percentile)
+            if self.config.adaptive_completion_limits
+            else None
+        )
+        llm_gateway.get_gateway().configure_ledger(
+            llm_ledger.LLMLedger(prices=self.config.model_prices)
+        )
+        complexity_measures.configure_measure_executor(
+            thread_workers=self.config.complexity_thread_workers,
+            process_workers=self.config.complexity_process_workers,
+        )
+        complexity_measures.configure_spacy(self.config.complexity_spacy_tier)
+        complexity_measures.configure_complexity_cache(
+            self.config.complexity_cache_path, self.config.complexity_cache_ttl_seconds
+        )
+
+    def configure_llm_cache(self) -> None:
+        """Attach the persistent response cache described by the config to the LLM gateway."""
+        if not self.config.cache_path:
+            llm_gateway.get_gateway().configure_cache(None)
+            return
+        try:
+            cache = llm_cache.LLMResponseCache(
+                path=self.config.cache_path,
+                max_bytes=self.config.cache_max_bytes,
+                ttl_seconds=self.config.cache_ttl_seconds,
+            )
+        except Exception as e:
+            print_saver.print_and_store(f"Could not open LLM response cache: {e}")
+            return
+        policies = {
+            call_site: llm_cache.CachePolicy(**(options or {}))
+            for call_site, options in self.config.cache_policies.items()
+        }
+        llm_gateway.get_gateway().configure_cache(cache, policies)
+
+    def configure_llm_scheduler(self) -> None:
+        """Apply the config's rate limits, priorities and circuit breaker to the LLM gateway."""
+        llm_gateway.get_gateway().configure_scheduler(
+            llm_scheduler.LLMScheduler(
+                rate_limits=self.config.rate_limits,
+                priorities=self.config.call_site_priorities,
+                max_retries=self.config.max_retries,
+                breaker_threshold=self.config.circuit_breaker_threshold,
+                breaker_reset_seconds=self.config.circuit_breaker_reset_seconds,
+            )
+        )
 
     def determine_output_type_from_content(self, content: str, file_path: str, task: Task) -> OutputType:
         """
@@ -2112,7 +2396,8 @@ class AdvancedPromptEngineer:
             {"role": "user", "content": system_prompt},
         ]
         try:
-            prompt_response = openai.chat.completions.create(
+            prompt_response = llm_gateway.chat_sync(
+                call_site="name_file",
                 model=self.config.model,
                 messages=messages,
                 temperature=0.2,
@@ -2133,7 +2418,8 @@ class AdvancedPromptEngineer:
             {"role": "user", "content": system_prompt},
         ]
         try:
-            prompt_response = openai.chat.completions.create(
+            prompt_response = llm_gateway.chat_sync(
+                call_site="name_project",
                 model=self.config.model,
                 messages=messages,
                 temperature=0.2,
@@ -2286,7 +2572,8 @@ class AdvancedPromptEngineer:
             {"role": "user", "content": this_step},
         ]
         try:
-            prompt_response = openai.chat.completions.create(
+            prompt_response = llm_gateway.chat_sync(
+                call_site="convert_planstep_to_prompt",
                 model=self.config.model,
                 messages=messages,
                 temperature=0.2,
@@ -2451,7 +2738,8 @@ class AdvancedPromptEngineer:
         """
         messages.append({"role": "user", "content": user_prompt})
         try:
-            decision_response = openai.chat.completions.create(
+            decision_response = llm_gateway.chat_sync(
+                call_site="component_decision",
                 model=self.config.model,
                 messages=messages,
                 temperature=0.2,
@@ -3454,7 +3742,8 @@ class AdvancedPromptEngineer:
         }
         messages = [system_message, {"role": "user", "content": prompt}]
         try:
-            response = openai.beta.chat.completions.parse(
+            response = llm_gateway.parse_sync(
+                call_site="judge_step_completion",
                 model="gpt-4o-mini",  # Specify the model
                 messages=messages,  # Pass the messages directly as a list of dicts
                 response_format=CompletionStatus,  # Define the response format
@@ -3523,7 +3812,8 @@ class AdvancedPromptEngineer:
             assert isinstance(
                 subtask, Subtask
             ), f"Invalid subtask type. Please provide a valid Subtask object. Type: {type(subtask)}"
-            response = openai.beta.chat.completions.parse(
+            response = llm_gateway.parse_sync(
+                call_site="judge_subtask_completion",
                 model="gpt-4o-mini",  # Specify the model
                 messages=messages,  # Pass the messages directly as a list of dicts
                 response_format=CompletionStatus,  # Define the response format
@@ -3563,7 +3853,9 @@ class AdvancedPromptEngineer:
                 {"role": "user", "content": prompt},
             ]
 
-            response = self.call_openai(messages=messages, temperature=0.2)
+            response = self.call_openai(
+                messages=messages, temperature=0.2, call_site="judge_step"
+            )
 
             reflection_match = re.search(
                 r"<reflection>(.*?)<\/reflection>", response, re.DOTALL | re.IGNORECASE
@@ -3628,7 +3920,8 @@ class AdvancedPromptEngineer:
             {"role": "user", "content": prompt},
         ]
 
-        response = openai.beta.chat.completions.parse(
+        response = llm_gateway.parse_sync(
+            call_site="judge_final_answer",
             model=self.config.model,
             messages=messages,
             response_format=FinalReviewScore,
@@ -3723,11 +4016,14 @@ class AdvancedPromptEngineer:
         """
         Assesses the complexity of the task based on a simple heuristic.
         This can be enhanced with more sophisticated NLP techniques.
+        Tasks assessed before, up to case and whitespace, are served from the complexity cache.
         """
         # # TODO: Utilize complexity_measures.py for more advanced complexity assessment
         # word_count = len(task.split())
         # complexity = min(word_count // 5, 5)  # Returns a value between 0 and 5
-        complexity, plan = complexity_measures.is_complex_final(task, True)
+        complexity, plan = complexity_measures.is_complex_final(
+            task, True, label_measures=self.config.complexity_label_measures
+        )
 
         return (complexity, plan)
 
@@ -3737,7 +4033,9 @@ class AdvancedPromptEngineer:
         """
         plan = None
         if complexity == 0:
-            complexity, plan = complexity_measures.is_complex_final(task, True)
+            complexity, plan = complexity_measures.is_complex_final(
+                task, True, label_measures=self.config.complexity_label_measures
+            )
         adjusted_budget = int(
             self.config.initial_budget + complexity * self.config.complexity_factor
         )
@@ -3951,7 +4249,8 @@ Remember to provide a clear and concise answer within <agent_response> tags at t
                 response = self.call_openai(
                     messages=msgs,
                     temperature=agent_intro_mapping[i]["temperature"],
-                    stop_sequence=["</agent_response>"],
+                    stream_until=["</reward>", "</agent_response>"],
+                    call_site="collaborative_reasoning",
                 )
                 print_saver.print_and_store(f"Agent {i} response: {response}")
                 msgs.append(
@@ -4064,6 +4363,8 @@ Remember to provide a clear and concise answer within <agent_response> tags at t
                         temperature=agent_intro_mapping[i]["temperature"]
                         + max(random.uniform(-0.1, 0.1), 0.01),
                         stop_sequence=["</step>"],
+                        call_site="revise_step",
+                        reward=current_step.reflection.reward,
                     )
                     if revision:
                         msgs.remove(msgs[-1])
@@ -4267,7 +4568,8 @@ Remember to provide a clear and concise answer within <agent_response> tags at t
             {"role": "user", "content": meta_prompt},
         ]
         try:
-            response = openai.beta.chat.completions.parse(
+            response = llm_gateway.parse_sync(
+                call_site="refine_prompt_via_meta_prompt",
                 model="gpt-4o-mini",  # Specify the model
                 messages=messages,  # Pass the messages directly as a list of dicts
                 response_format=PromptSuggestions,  # Parse the response into the PromptSuggestions class
@@ -4533,12 +4835,13 @@ Task: {task}
 
         if n == 0:
             n = 1
+        # Provider errors are retried (with backoff) by the gateway's scheduler;
+        # this loop only re-asks when the answer could not be used.
         for attempt in range(self.config.max_retries):
-            base_delay = 1
-            max_delay = 16
             try:
 
-                response = openai.beta.chat.completions.parse(
+                response = llm_gateway.parse_sync(
+                    call_site="place_step",
                     model=self.config.model,
                     messages=messages,
                     response_format=StepNumber,
@@ -4547,10 +4850,11 @@ Task: {task}
                 new_step_num = int(response.choices[0].message.parsed.score)
 
                 return new_step_num
+            except (openai.APIError, llm_scheduler.SchedulerError) as e:
+                print_saver.print_and_store(f"LLM request failed in place_step: {e}.")
+                break
             except Exception as e:
                 print_saver.print_and_store(f"Unexpected error: {e}.")
-                wait = min(base_delay * (2**attempt), max_delay)
-                time.sleep(wait + random.uniform(0, 1))  # Adding jitter
         return ""
 
     # -------------------------------
@@ -4563,9 +4867,48 @@ Task: {task}
         top_p: float = 0.0,
         n: int = 0,
         stop_sequence: str | list[str] = None,
+        call_site: str = "call_openai",
+        stream_until: Optional[List[str]] = None,
+        reward: Optional[float] = None,
     ) -> str:
         """
         Calls the OpenAI API with the given prompt and handles retries.
+        `call_site` names the caller for the gateway's per-call-site policies.
+        `stream_until` lists boundaries (e.g. "</reward>") after which the caller needs
+        nothing more; the response is streamed and cut off at the first one, and the
+        text before it is returned, just as with `stop_sequence`.
+        `reward` is the reflection reward of the step being revised; the gateway's
+        model router may escalate low-reward revisions to a bigger model.
+        Returns the first choice; use `call_openai_choices` to get all `n` of them.
+        """
+        choices = self.call_openai_choices(
+            messages=messages,
+            temperature=temperature,
+            top_p=top_p,
+            n=n,
+            stop_sequence=stop_sequence,
+            call_site=call_site,
+            stream_until=stream_until,
+            reward=reward,
+        )
+        return choices[0] if choices else ""
+
+    def call_openai_choices(
+        self,
+        messages: List[dict],
+        temperature: float = 0.0,
+        top_p: float = 0.0,
+        n: int = 0,
+        stop_sequence: str | list[str] = None,
+        call_site: str = "call_openai",
+        stream_until: Optional[List[str]] = None,
+        reward: Optional[float] = None,
+    ) -> List[str]:
+        """
+        Like `call_openai`, but returns the content of every choice, so `n` candidates
+        for the same prompt cost one request (and one copy of the prompt tokens).
+        Requests above `config.max_choices_per_request` are split into several calls.
+        Returns an empty list if the request fails.
         """
         if temperature == 0.0 and self.config.temperature > 0.0 and top_p == 0.0:
             temperature = self.config.temperature
@@ -4582,26 +4925,43 @@ Task: {task}
         if n == 0:
             n = 1
 
-        base_delay = 1
-        max_delay = 16
+        if stream_until and not self.config.stream_early_stop:
+            # Fall back to server-side stop sequences (the API accepts at most 4)
+            stop_sequence = list(stream_until)[:4]
+            stream_until = None
 
+        per_request = max(1, self.config.max_choices_per_request)
+        choices: List[str] = []
+        # Provider errors are retried (with backoff) by the gateway's scheduler
         for attempt in range(self.config.max_retries):
             try:
-                response = openai.chat.completions.create(
-                    model=self.config.model,
-                    messages=messages,
-                    temperature=temperature if temperature > 0.0 else None,
-                    top_p=top_p,
-                    n=n,
-                    stop=stop_sequence,
-                )
-
-                return response.choices[0].message.content
+                while len(choices) < n:
+                    request = dict(
+                        call_site=call_site,
+                        model=self.config.model,
+                        messages=messages,
+                        temperature=temperature if temperature > 0.0 else None,
+                        top_p=top_p,
+                        stop=stop_sequence,
+                        n=min(per_request, n - len(choices)),
+                    )
+                    if reward is not None:
+                        request["step_reward"] = reward
+                    if stream_until:
+                        response = llm_gateway.chat_stream_sync(stop_at=stream_until, **request)
+                    else:
+                        response = llm_gateway.chat_sync(**request)
+                    texts = llm_gateway.choice_texts(response)
+                    if not texts:
+                        break
+                    choices.extend(texts)
+                return choices
+            except (openai.APIError, llm_scheduler.SchedulerError) as e:
+                print_saver.print_and_store(f"LLM request failed in {call_site}: {e}.")
+                break
             except Exception as e:
                 print_saver.print_and_store(f"Unexpected error: {e}.")
-                wait = min(base_delay * (2**attempt), max_delay)
-                time.sleep(wait + random.uniform(0, 1))  # Adding jitter
-        return ""
+        return choices
 
     # -------------------------------
     # Response Parsing
@@ -6919,11 +7279,11 @@ Task: {task}
         ]
         decision_response = None
         decision = None
-        base_delay = 1
-        max_delay = 16
+        # Provider errors are retried (with backoff) by the gateway's scheduler
         for attempt in range(self.config.max_retries):
             try:
-                decision_response = openai.beta.chat.completions.parse(
+                decision_response = llm_gateway.parse_sync(
+                    call_site="choose_best_response",
                     model=self.config.model,
                     messages=messages,
                     response_format=response_choices,
@@ -6939,6 +7299,11 @@ Task: {task}
                 return (
                     best_response if best_response != "" else random.choice(responses)
                 )
+            except (openai.APIError, llm_scheduler.SchedulerError) as e:
+                print_saver.print_and_store(
+                    f"LLM request failed in choose_best_response: {e}. Using default decision."
+                )
+                break
             except Exception as e:
                 if decision_response:
                     print_saver.print_and_store(
@@ -6949,9 +7314,6 @@ Task: {task}
                         f"Error in choose_best_response: {e}. Using default decision.  Responses available: {responses}."
                     )
 
-                wait = min(base_delay * (2**attempt), max_delay)
-                time.sleep(wait + random.uniform(0, 1))  # Adding jitter
-
         if decision:
             best_response = responses[int(decision) - 1]
         else:
@@ -7000,29 +7362,44 @@ Task: {task}
             answer_response = None
             while len(new_steps) < step_budget and not step_completion:
 
-                step_responses = []
-                for _ in range(consistency_multiplier):
-                    step_response = self.call_openai(
-                        messages=msgs,
-                        temperature=max(
-                            random.uniform(
-                                max(
-                                    temperature
-                                    - (min(temperature * max(self.config.n, 5), 1.2)),
-                                    0.1,
-                                ),
-                                min(
-                                    2.0,
-                                    temperature
-                                    + (min(temperature * max(self.config.n, 5), 1.2)),
-                                ),
+                def sample_temperature() -> float:
+                    return max(
+                        random.uniform(
+                            max(
+                                temperature
+                                - (min(temperature * max(self.config.n, 5), 1.2)),
+                                0.1,
+                            ),
+                            min(
+                                2.0,
+                                temperature
+                                + (min(temperature * max(self.config.n, 5), 1.2)),
                             ),
-                            0.01,
                         ),
-                        stop_sequence=["</answer>"],
+                        0.01,
+                    )
+
+                if self.config.max_choices_per_request > 1:
+                    # Opted into batching: the candidates share one prompt and, in
+                    # exchange for a single request, one sampled temperature
+                    step_responses = self.call_openai_choices(
+                        messages=msgs,
+                        temperature=sample_temperature(),
+                        n=consistency_multiplier,
+                        stream_until=["</reward>", "</answer>"],
+                        call_site="self_consistency",
                     )
-                    if step_response:
-                        step_responses.append(step_response)
+                else:
+                    step_responses = []
+                    for _ in range(consistency_multiplier):
+                        step_response = self.call_openai(
+                            messages=msgs,
+                            temperature=sample_temperature(),
+                            stream_until=["</reward>", "</answer>"],
+                            call_site="self_consistency",
+                        )
+                        if step_response:
+                            step_responses.append(step_response)
                 plan_step_index = 0
                 for i, stp in enumerate(task.plan.steps):
                     if stp.step_number == plan_step_number:
@@ -7148,6 +7525,8 @@ Task: {task}
                         messages=msgs_b,
                         temperature=temperature + max(random.uniform(-0.1, 0.1), 0.01),
                         stop_sequence=["</step>"],
+                        call_site="revise_step",
+                        reward=current_step.reflection.reward,
                     )
                     if revision:
                         msgs.remove(msgs[-1])
@@ -7342,7 +7721,8 @@ Task: {task}
         ]
 
         # Call the OpenAI API to generate the modified prompt
-        response = openai.chat.completions.create(
+        response = llm_gateway.chat_sync(
+            call_site="apply_prompt_modifications",
             model=self.config.model,
             messages=messages,
         )
@@ -7358,7 +7738,8 @@ Task: {task}
         first_prompt = self.automatic_prompt_engineering(task)
 
         # Call the OpenAI API to generate the refined prompt
-        response = openai.chat.completions.create(
+        response = llm_gateway.chat_sync(
+            call_site="task_into_prompt",
             model=self.config.model,
             messages=[
                 {
@@ -7514,6 +7895,15 @@ Task: {task}
         """
         Integrates all components to process the task and generate the final answer.
         """
+        # Every LLM request below is attributed to this task (and plan step) in the usage ledger
+        ledger_start = llm_gateway.get_gateway().ledger.mark()
+        # Both are restored even if the run raises, so a spent deadline cannot leak into later runs
+        with llm_ledger.labels(task=task[:100], plan_step=None), llm_deadline.deadline(
+            self.config.run_timeout_seconds
+        ):
+            return self._main(task, ledger_start)
+
+    def _main(self, task: str, ledger_start: int) -> Interaction:
         # Step 1: Retrieve Information
         retrieved_info = self.retrieve_information(task)
         print_saver.print_and_store("Retrieved Information:\n" + retrieved_info)
@@ -7607,6 +7997,7 @@ Task: {task}
                 print_saver.print_and_store(
                     f"Current Plan Step: {curr_num} - {curr_name}"
                 )
+                llm_ledger.set_labels(plan_step=curr_num)
                 this_step_prompt = self.convert_planstep_to_prompt(
                     current_plan_step, task_object
                 )
@@ -7702,6 +8093,8 @@ Task: {task}
                     "content": assistant_tags,
                 },
             ]
+            # Both the agents and the self-consistency check work from the same refined step prompt
+            curr_refined_desc = self.task_into_prompt(curr_desc)
             # Step 5: Collaborative Multi-Agent Reasoning
             # for collaborative_reasoning, input only the current prompt minus the initial prompt
             agent_prompt = current_planstep_prompt.replace(initial_prompt, "")
@@ -7709,7 +8102,7 @@ Task: {task}
                 agent_interaction = self.collaborative_reasoning_main(
                     Task(
                         curr_desc,
-                        self.task_into_prompt(curr_desc),
+                        curr_refined_desc,
                         complexity,
                         [],
                         [],
@@ -7731,7 +8124,7 @@ Task: {task}
             self_consistent_interaction = self.self_consistency(
                 Task(
                     curr_desc,
-                    self.task_into_prompt(curr_desc),
+                    curr_refined_desc,
                     complexity,
                     [],
                     [],
@@ -7933,10 +8326,62 @@ Task: {task}
                 )
                 interaction = self.judge_final_answer(task, main_interaction)
                 main_interaction.final_reward = interaction.final_reward
+                self.report_llm_usage(since=ledger_start)
                 return main_interaction
         else:
+            self.report_llm_usage(since=ledger_start)
             return main_interaction
 
+    def report_llm_usage(self, since: int = 0) -> None:
+        """Log how much LLM traffic the gateway's layers absorbed during this run.
+
+        Also logs token and cost totals per phase from the usage ledger and, if
+        `config.export_llm_usage` is set, exports the ledger entries recorded
+        after position `since` next to the run's print log.
+        """
+        gateway = llm_gateway.get_gateway()
+        totals = gateway.ledger.totals(since)
+        print_saver.print_and_store(
+            f"LLM usage: {totals['requests']} requests, {totals['prompt_tokens']} prompt "
+            f"({totals['cached_tokens']} cached) + {totals['completion_tokens']} completion "
+            f"tokens, ${totals['cost_usd']:.4f}"
+        )
+        for phase, phase_totals in gateway.ledger.rollup("phase", since).items():
+            print_saver.print_and_store(
+                f"LLM usage [{phase}]: {phase_totals['requests']} requests, "
+                f"{phase_totals['prompt_tokens'] + phase_totals['completion_tokens']} tokens, "
+                f"${phase_totals['cost_usd']:.4f}"
+            )
+        if self.config.export_llm_usage:
+            try:
+                paths = gateway.ledger.export(f"{print_saver.save_filename}_llm_usage", since)
+                print_saver.print_and_store(f"LLM usage ledger saved to {', '.join(paths)}")
+            except OSError as e:
+                print_saver.print_and_store(f"Could not export LLM usage ledger: {e}")
+        if gateway.single_flight is not None:
+            print_saver.print_and_store(
+                f"LLM single-flight: {gateway.single_flight.collapsed_calls} calls collapsed "
+                f"into {gateway.single_flight.stats['leaders']} upstream requests"
+            )
+        if any(gateway.router.stats.values()):
+            print_saver.print_and_store(
+                f"LLM routing: {gateway.router.stats['rerouted']} requests rerouted, "
+                f"{gateway.router.stats['escalated']} low-reward revisions escalated"
+            )
+        if gateway.sizer is not None and gateway.sizer.stats["limited"]:
+            print_saver.print_and_store(
+                f"LLM completion limits: {gateway.sizer.stats['limited']} requests sent with an "
+                f"adaptive max_completion_tokens, {gateway.sizer.stats['truncated_retries']} "
+                f"retried after truncation"
+            )
+        for call_site, metrics in gateway.hedger.metrics().items():
+            if metrics["hedged"]:
+                print_saver.print_and_store(
+                    f"LLM hedging [{call_site}]: {metrics['hedged']}/{metrics['requests']} hedged, "
+                    f"{metrics['hedge_wins']} won by the hedge, p95 {metrics['p95']:.2f}s, "
+                    f"p99 {metrics['p99']:.2f}s"
+                )
+
     def adaptive_complexity_handling(
         self, task: str, interaction: Interaction
     ) -> Interaction:
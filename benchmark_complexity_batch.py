@@ -0,0 +1,77 @@
+# benchmark_complexity_batch.py
+"""
+Throughput of ``is_complex_final_batch`` against scoring queries one at a time.
+
+Both paths score the same queries with every weighted measure. The single-query
+path calls ``score_complexity(query, early_exit=False)`` in a loop, which is the
+scoring that ``is_complex_final`` does. ``--no-llm`` leaves out is_complex_llm,
+so the benchmark makes no API calls::
+
+    python benchmark_complexity_batch.py --queries tasks.csv --no-llm
+"""
+
+import argparse
+import time
+from typing import Dict, List
+
+import pandas as pd
+
+import complexity_measures as cm
+
+
+def benchmark_batch(queries: List[str], need_plan: bool = True) -> Dict[str, float]:
+    """
+    Times both paths over ``queries``.
+
+    Args:
+        queries (List[str]): Queries to score.
+        need_plan (bool): Include is_complex_llm.
+
+    Returns:
+        Dict[str, float]: Queries per second of each path, the speedup, and the share
+            of queries where both paths reach the same decision.
+    """
+    cm.warmup()
+    weights = cm.COMPLEXITY_WEIGHTS
+    if not need_plan:
+        # score_complexity has no switch for leaving the plan out of the total
+        cm.COMPLEXITY_WEIGHTS = {**weights, "llm": 0.0}
+    try:
+        started = time.perf_counter()
+        single = [cm.score_complexity(query, early_exit=False, need_plan=need_plan) for query in queries]
+        single_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        batch = cm.is_complex_final_batch(queries, need_plan=need_plan)
+        batch_seconds = time.perf_counter() - started
+    finally:
+        cm.COMPLEXITY_WEIGHTS = weights
+
+    # Without the plan, the batch total is renormalized over the remaining weights
+    total_weight = sum(weight for name, weight in weights.items() if need_plan or name != "llm")
+    single_decisions = [assessment.total_score / total_weight > cm.COMPLEXITY_THRESHOLD for assessment in single]
+    return {
+        "single_qps": len(queries) / single_seconds,
+        "batch_qps": len(queries) / batch_seconds,
+        "speedup": single_seconds / batch_seconds,
+        "agreement": sum(a == b for a, b in zip(single_decisions, batch["is_complex"])) / max(1, len(queries)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--queries", help="CSV with a query column (default: SEED_QUERIES)")
+    parser.add_argument("--repeat", type=int, default=1, help="Score the query set this many times")
+    parser.add_argument("--no-llm", action="store_true", help="Leave out is_complex_llm")
+    args = parser.parse_args()
+
+    queries = list((pd.read_csv(args.queries) if args.queries else cm.SEED_QUERIES)["query"]) * args.repeat
+    report = benchmark_batch(queries, need_plan=not args.no_llm)
+    print(f"{len(queries)} queries")
+    print(f"single: {report['single_qps']:.1f} queries/s")
+    print(f"batch:  {report['batch_qps']:.1f} queries/s ({report['speedup']:.1f}x)")
+    print(f"decision agreement: {report['agreement']:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# benchmark_spacy_tiers.py
+"""
+Accuracy and latency of the spaCy model tiers for the complexity measures.
+
+Every tier in ``complexity_measures.SPACY_MODELS`` scores a labelled query set
+with the spaCy-based measures. Their weighted score, renormalized over the
+spaCy measures' weights, decides complexity the same way ``score_complexity``
+does. Each tier is then compared with the reference tier (``trf`` by default):
+
+- agreement: share of queries where the decision matches the reference
+- accuracy: share of queries where the decision matches the label
+- mean_score_delta: mean absolute difference in the spaCy score
+- ms_per_query: mean parse plus scoring time
+
+The queries come from a CSV file with ``query`` and ``complex`` columns, or
+from ``complexity_measures.SEED_QUERIES``::
+
+    python benchmark_spacy_tiers.py --queries labelled_queries.csv --tiers sm md trf
+"""
+
+import argparse
+import time
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+import complexity_measures as cm
+
+
+def spacy_measures() -> List[cm.Measure]:
+    return [
+        measure
+        for measure in cm.COMPLEXITY_MEASURES
+        if measure.name in cm.SPACY_MEASURE_DISABLE and cm.COMPLEXITY_WEIGHTS.get(measure.name)
+    ]
+
+
+def score_with_tier(query: str, tier: str, measures: List[cm.Measure]) -> float:
+    """Weighted spaCy-measure score of ``query`` parsed with ``tier``."""
+    analysis = cm.QueryAnalysis(query, disable=cm.spacy_disable_for([m.name for m in measures]), tier=tier)
+    total_weight = sum(cm.COMPLEXITY_WEIGHTS[m.name] for m in measures)
+    score = sum(cm.COMPLEXITY_WEIGHTS[m.name] * m.func(analysis) for m in measures)
+    return score / total_weight if total_weight else 0.0
+
+
+def benchmark_spacy_tiers(
+    queries: pd.DataFrame,
+    tiers: Optional[List[str]] = None,
+    reference: str = "trf",
+) -> Dict[str, Dict[str, float]]:
+    """
+    Scores ``queries`` with every tier and compares the decisions with ``reference``.
+
+    Args:
+        queries (pd.DataFrame): ``query`` and ``complex`` (0/1) columns.
+        tiers (Optional[List[str]]): Tiers to compare; defaults to all of SPACY_MODELS.
+        reference (str): Tier the others are compared with.
+
+    Returns:
+        Dict[str, Dict[str, float]]: agreement, accuracy, mean_score_delta and
+            ms_per_query per tier.
+    """
+    tiers = list(cm.SPACY_MODELS) if tiers is None else list(tiers)
+    if reference not in tiers:
+        tiers.append(reference)
+    measures = spacy_measures()
+    scores: Dict[str, List[float]] = {}
+    seconds: Dict[str, float] = {}
+    for tier in tiers:
+        cm.get_nlp(tier)  # load outside the timed loop
+        started = time.perf_counter()
+        scores[tier] = [score_with_tier(query, tier, measures) for query in queries["query"]]
+        seconds[tier] = time.perf_counter() - started
+
+    labels = [bool(label) for label in queries["complex"]]
+    reference_decisions = [score > cm.COMPLEXITY_THRESHOLD for score in scores[reference]]
+    report = {}
+    for tier in tiers:
+        decisions = [score > cm.COMPLEXITY_THRESHOLD for score in scores[tier]]
+        count = max(1, len(decisions))
+        report[tier] = {
+            "agreement": sum(a == b for a, b in zip(decisions, reference_decisions)) / count,
+            "accuracy": sum(a == b for a, b in zip(decisions, labels)) / count,
+            "mean_score_delta": sum(abs(a - b) for a, b in zip(scores[tier], scores[reference])) / count,
+            "ms_per_query": 1000 * seconds[tier] / count,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--queries", help="CSV with query and complex columns (default: SEED_QUERIES)")
+    parser.add_argument("--tiers", nargs="+", choices=sorted(cm.SPACY_MODELS), help="Tiers to compare")
+    parser.add_argument("--reference", default="trf", choices=sorted(cm.SPACY_MODELS))
+    args = parser.parse_args()
+
+    queries = pd.read_csv(args.queries) if args.queries else cm.SEED_QUERIES
+    report = benchmark_spacy_tiers(queries, args.tiers, args.reference)
+    print(f"{'tier':<6}{'agreement':>11}{'accuracy':>10}{'score delta':>13}{'ms/query':>10}")
+    for tier, row in report.items():
+        print(
+            f"{tier:<6}{row['agreement']:>11.2%}{row['accuracy']:>10.2%}"
+            f"{row['mean_score_delta']:>13.3f}{row['ms_per_query']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# complexity_cache.py
+"""
+Persistent memo of complexity assessments, keyed by the normalized query.
+
+Assessing a query runs the whole measure ensemble. That includes
+``is_complex_llm``, whose plan generation and conversion make several LLM
+calls. Asking about the same task again, even with different case or
+whitespace, reruns all of it. ``ComplexityCache`` keeps each query's outcome
+in a SQLite file: the total score, the decision, the per-measure scores and
+the plan as JSON.
+
+Entries are keyed by the SHA-256 of the query lowercased with its whitespace
+collapsed. That is the same normalization the training store deduplicates by.
+Each entry carries the ``version`` the cache was opened with. An entry with any
+other version is a miss and is deleted. The owner derives the version from
+whatever decides a score, such as measure code, weights and threshold (see
+``fingerprint``), so a change there drops every older entry.
+
+An entry is either complete, with every weighted measure scored, or partial,
+when the cascade stopped early. Only complete entries answer requests for the
+full score.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COMPLEXITY_CACHE_PATH = "complexity_cache.sqlite3"
+# Measures such as is_complex_ml and is_complex_statistical keep learning, so entries do not live forever
+DEFAULT_COMPLEXITY_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+def query_key(query: str) -> str:
+    """SHA-256 of ``query`` lowercased with its whitespace collapsed."""
+    normalized = " ".join(query.strip().lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def fingerprint(sources: Iterable[str], settings: Mapping[str, Any]) -> str:
+    """
+    Version string that changes whenever any of ``sources`` or ``settings`` does.
+
+    Args:
+        sources (Iterable[str]): Source code the cached scores depend on.
+        settings (Mapping[str, Any]): JSON-serializable values the scores depend on,
+            such as weights and thresholds.
+
+    Returns:
+        str: Hex digest of both.
+    """
+    digest = hashlib.sha256()
+    for source in sources:
+        digest.update(hashlib.sha256(source.encode("utf-8")).digest())
+    digest.update(json.dumps(settings, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ComplexityCache:
+    """SQLite-backed store of complexity assessments with TTL expiry and version invalidation.
+
+    Attributes:
+        path (str): Location of the SQLite database file.
+        ttl_seconds (Optional[float]): Entry lifetime; None keeps entries until the version changes.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_COMPLEXITY_CACHE_PATH,
+        ttl_seconds: Optional[float] = DEFAULT_COMPLEXITY_CACHE_TTL_SECONDS,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS assessments (
+                key TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                complete INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                expires_at REAL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, query: str, version: str, complete: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Cached assessment of ``query``, or None.
+
+        Args:
+            query (str): The query; case and whitespace are ignored.
+            version (str): Current version; entries stored under another one are deleted.
+            complete (bool): Only accept entries with every weighted measure scored.
+
+        Returns:
+            Optional[Dict[str, Any]]: The stored assessment, or None on a miss.
+        """
+        key = query_key(query)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, complete, payload, expires_at FROM assessments WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            stored_version, stored_complete, payload, expires_at = row
+            stale = stored_version != version
+            if stale or (expires_at is not None and expires_at <= time.time()):
+                self._conn.execute("DELETE FROM assessments WHERE key = ?", (key,))
+                self._conn.commit()
+                self.invalidations += stale
+                self.misses += 1
+                return None
+            if complete and not stored_complete:
+                self.misses += 1
+                return None
+        try:
+            assessment = json.loads(payload)
+        except ValueError:
+            logger.warning("Dropping unreadable complexity cache entry %s", key)
+            self.delete(query)
+            return None
+        self.hits += 1
+        return assessment
+
+    def put(self, query: str, version: str, assessment: Mapping[str, Any], complete: bool = True) -> None:
+        """Stores ``assessment`` (JSON-serializable) for ``query``; a partial one never replaces a complete one."""
+        now = time.time()
+        key = query_key(query)
+        payload = json.dumps(assessment)
+        with self._lock:
+            if not complete:
+                row = self._conn.execute(
+                    "SELECT version, complete FROM assessments WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[0] == version and row[1]:
+                    return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO assessments VALUES (?, ?, ?, ?, ?, ?)",
+                (key, version, int(complete), payload, now + self.ttl_seconds if self.ttl_seconds else None, now),
+            )
+            self._conn.commit()
+
+    def delete(self, query: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM assessments WHERE key = ?", (query_key(query),))
+            self._conn.commit()
+
+    def prune(self, version: str) -> int:
+        """Deletes expired entries and those of other versions; returns how many were removed."""
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM assessments WHERE version != ? OR (expires_at IS NOT NULL AND expires_at <= ?)",
+                (version, time.time()),
+            ).rowcount
+            self._conn.commit()
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM assessments")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM assessments").fetchone()[0]
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
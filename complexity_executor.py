@@ -0,0 +1,473 @@
+# complexity_executor.py
+"""
+Concurrent execution of the ``is_complex_final`` measure ensemble.
+
+Each complexity measure is a plain ``func(query)`` (``query`` being the string
+or the shared ``complexity_measures.QueryAnalysis``) and is described by a
+``Measure``. The measure names the pool it runs on:
+
+* ``"thread"`` for I/O-bound measures (LLM calls through the gateway) and for
+  anything that releases the GIL. Every thread runs in a copy of the caller's
+  ``contextvars`` context, so ledger labels and the run deadline still apply.
+* ``"process"`` for CPU-bound measures (spaCy parses, graph walks). These go
+  to a process pool when ``MeasureExecutor.process_workers`` is above zero and
+  to the thread pool otherwise.
+* ``"inline"`` for cheap regex/counting measures. These run on the calling
+  thread while the pooled measures are in flight.
+
+Measures that share a ``serial_group`` never run at the same time in this
+process. The spaCy measures use this so they do not all drive one pipeline
+at once.
+
+Each measure has its own ``timeout`` in seconds, counted from when it was
+submitted. A measure that times out or raises gets its ``default`` score. A
+``required`` measure re-raises instead (``is_complex_llm`` has to return the
+plan). A timed-out thread cannot be interrupted and is left to finish; its
+result is discarded. A measure still waiting for its serial group when its
+timeout passes gives up rather than taking the group's turn late.
+
+``MeasureExecutor.run`` evaluates every measure. ``run_cascade`` first starts
+the required measures. It then goes through the rest cheapest first, using
+each measure's smoothed observed duration: inline measures run on the calling
+thread and pooled ones are submitted without waiting for the previous ones.
+As soon as the caller's ``decided`` callback says the remaining measures can
+no longer change the outcome, the measures not yet started are dropped and
+those in flight are abandoned.
+
+``run_batch`` scores a list of queries. A measure with a ``batch`` function
+is called once with every query; the others are submitted once per query and
+share the pools. In a batch, a measure's ``timeout`` is multiplied by the
+number of queries and covers all of them.
+
+The smoothed durations form a latency profile. ``estimate`` uses it to predict
+how long a set of measures takes to run concurrently, and ``save_profile`` /
+``load_profile`` keep it across processes.
+"""
+
+import concurrent.futures
+import contextvars
+import json
+import logging
+import multiprocessing
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEASURE_TIMEOUT = 30.0
+DEFAULT_THREAD_WORKERS = 8
+COST_SMOOTHING = 0.3
+POOLS = ("thread", "process", "inline")
+
+
+@dataclass
+class Measure:
+    """One complexity measure and how to run it.
+
+    Attributes:
+        name (str): Key of the score in ``is_complex_final``'s score dict.
+        func (Callable[[Any], Any]): Module-level function taking the query (picklable for the process pool).
+        pool (str): "thread", "process" or "inline".
+        timeout (Optional[float]): Seconds from the start of the run; None waits indefinitely.
+        default (Any): Score used when the measure fails or times out.
+        required (bool): Re-raise failures instead of using ``default``.
+        serial_group (Optional[str]): Measures in the same group run one at a time.
+        label (str): Name used in the complexity log.
+        cost (float): Expected seconds, used to order the cascade until a duration is observed.
+        bounds (Tuple[float, float]): Lowest and highest score the measure can return.
+        batch (Optional[Callable[[List[Any]], List[Any]]]): Scores a list of queries in one
+            call, one value per query, for run_batch.
+    """
+
+    name: str
+    func: Callable[[Any], Any]
+    pool: str = "thread"
+    timeout: Optional[float] = DEFAULT_MEASURE_TIMEOUT
+    default: Any = 0.0
+    required: bool = False
+    serial_group: Optional[str] = None
+    label: str = ""
+    cost: float = 1.0
+    bounds: Tuple[float, float] = (0.0, 1.0)
+    batch: Optional[Callable[[List[Any]], List[Any]]] = None
+
+    def __post_init__(self):
+        if self.pool not in POOLS:
+            raise ValueError(f"Unknown pool {self.pool!r} for measure {self.name!r}; expected one of {POOLS}")
+        self.label = self.label or self.name
+
+
+@dataclass
+class MeasureResult:
+    """Outcome of one measure.
+
+    Attributes:
+        name (str): Measure name.
+        value (Any): Score returned by the measure, or its default.
+        seconds (float): Time from the start of the run until the measure finished.
+        error (str): Exception type name if the measure failed, else "".
+        timed_out (bool): True when the measure missed its timeout.
+    """
+
+    name: str
+    value: Any
+    seconds: float = 0.0
+    error: str = ""
+    timed_out: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return not self.error and not self.timed_out
+
+
+class MeasureExecutor:
+    """Runs measures concurrently with per-measure timeouts and default scores.
+
+    Pools are created on first use and reused across runs.
+
+    Attributes:
+        thread_workers (int): Size of the thread pool.
+        process_workers (int): Size of the process pool; 0 runs "process" measures on threads.
+        stats (Dict[str, int]): Counts of runs, measure failures, timeouts and cascade skips.
+        costs (Dict[str, float]): Smoothed observed duration of each measure, in seconds.
+    """
+
+    def __init__(self, thread_workers: int = DEFAULT_THREAD_WORKERS, process_workers: int = 0):
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        self.stats = {"runs": 0, "failures": 0, "timeouts": 0, "skipped": 0}
+        self.costs: Dict[str, float] = {}
+        self._threads: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._processes: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._group_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _thread_pool(self) -> concurrent.futures.ThreadPoolExecutor:
+        with self._lock:
+            if self._threads is None:
+                self._threads = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.thread_workers, thread_name_prefix="complexity"
+                )
+            return self._threads
+
+    def _process_pool(self) -> Optional[concurrent.futures.ProcessPoolExecutor]:
+        if self.process_workers <= 0:
+            return None
+        with self._lock:
+            if self._processes is None:
+                # Fork shares the already-loaded models with the workers instead of reloading them
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context("fork" if "fork" in methods else None)
+                self._processes = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.process_workers, mp_context=context
+                )
+            return self._processes
+
+    def _group_lock(self, group: Optional[str]) -> Optional[threading.Lock]:
+        if group is None:
+            return None
+        with self._lock:
+            return self._group_locks.setdefault(group, threading.Lock())
+
+    def _call(
+        self,
+        measure: Measure,
+        query: Any,
+        func: Optional[Callable[[Any], Any]] = None,
+        deadline: Optional[float] = None,
+        dropped: Optional[threading.Event] = None,
+    ) -> Any:
+        func = func or measure.func
+        lock = self._group_lock(measure.serial_group)
+        if lock is None:
+            return func(query)
+        # A measure whose result is no longer wanted gives the group's turn to the others
+        if not lock.acquire(timeout=-1 if deadline is None else max(0.0, deadline - time.monotonic())):
+            raise concurrent.futures.TimeoutError(f"{measure.name} timed out waiting for {measure.serial_group}")
+        try:
+            if dropped is not None and dropped.is_set():
+                raise concurrent.futures.CancelledError(f"{measure.name} is no longer needed")
+            return func(query)
+        finally:
+            lock.release()
+
+    def _submit(
+        self,
+        measure: Measure,
+        query: Any,
+        func: Optional[Callable[[Any], Any]] = None,
+        deadline: Optional[float] = None,
+        dropped: Optional[threading.Event] = None,
+    ) -> concurrent.futures.Future:
+        if measure.pool == "process":
+            pool = self._process_pool()
+            if pool is not None:
+                try:
+                    return pool.submit(func or measure.func, query)
+                except concurrent.futures.BrokenExecutor as e:
+                    logger.warning(f"[Complexity] Process pool unavailable ({e}); running {measure.name} on a thread")
+                    with self._lock:
+                        self._processes = None
+        context = contextvars.copy_context()
+        return self._thread_pool().submit(context.run, self._call, measure, query, func, deadline, dropped)
+
+    def _failed(self, measure: Measure, error: BaseException, started: float, timed_out: bool = False) -> MeasureResult:
+        if measure.required:
+            raise error
+        self.stats["timeouts" if timed_out else "failures"] += 1
+        logger.warning(
+            f"[Complexity] {measure.label} {'timed out' if timed_out else 'failed'} "
+            f"({type(error).__name__}: {error}); using default score {measure.default}"
+        )
+        return MeasureResult(
+            measure.name,
+            measure.default,
+            seconds=time.monotonic() - started,
+            error="" if timed_out else type(error).__name__,
+            timed_out=timed_out,
+        )
+
+    def cost(self, measure: Measure) -> float:
+        """Observed cost of ``measure`` in seconds, or its prior ``cost`` before it has run."""
+        return self.costs.get(measure.name, measure.cost)
+
+    def estimate(self, measures: Sequence[Measure]) -> float:
+        """Expected seconds for ``run(measures)``: inline measures run back to back while
+        pooled ones run side by side, except that a serial group runs its measures in turn."""
+        inline = sum(self.cost(measure) for measure in measures if measure.pool == "inline")
+        lanes: Dict[str, float] = {}
+        for index, measure in enumerate(measures):
+            if measure.pool != "inline":
+                lane = measure.serial_group or f"_{index}"
+                lanes[lane] = lanes.get(lane, 0.0) + self.cost(measure)
+        return max([inline, *lanes.values()])
+
+    def save_profile(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.costs, f, indent=2)
+
+    def load_profile(self, path: str) -> bool:
+        """Merge a saved latency profile into ``costs``; False if there is none."""
+        try:
+            with open(path) as f:
+                self.costs.update({name: float(seconds) for name, seconds in json.load(f).items()})
+        except (OSError, ValueError, AttributeError) as e:
+            logger.debug(f"[Complexity] No latency profile loaded from {path}: {e}")
+            return False
+        return True
+
+    def _observe(self, name: str, seconds: float) -> None:
+        previous = self.costs.get(name)
+        self.costs[name] = seconds if previous is None else previous + COST_SMOOTHING * (seconds - previous)
+
+    def _start(
+        self,
+        measure: Measure,
+        query: Any,
+        times: Dict[str, List[float]],
+        dropped: Optional[threading.Event] = None,
+    ) -> concurrent.futures.Future:
+        """Submit ``measure``; ``times[name]`` collects its submit and finish times."""
+        submitted = time.monotonic()
+        times[measure.name] = [submitted]
+        deadline = None if measure.timeout is None else submitted + measure.timeout
+        future = self._submit(measure, query, deadline=deadline, dropped=dropped)
+        future.add_done_callback(lambda _: times[measure.name].append(time.monotonic()))
+        return future
+
+    def _run_inline(self, measure: Measure, query: Any, started: float) -> MeasureResult:
+        began = time.monotonic()
+        try:
+            value = self._call(measure, query)
+        except Exception as e:
+            return self._failed(measure, e, started)
+        self._observe(measure.name, time.monotonic() - began)
+        return MeasureResult(measure.name, value, seconds=time.monotonic() - started)
+
+    def _collect(
+        self, measure: Measure, future: concurrent.futures.Future, started: float, times: Dict[str, List[float]]
+    ) -> MeasureResult:
+        submitted = times[measure.name][0]
+        wait = None if measure.timeout is None else max(0.0, submitted + measure.timeout - time.monotonic())
+        try:
+            value = future.result(timeout=wait)
+        except concurrent.futures.TimeoutError as e:
+            future.cancel()
+            return self._failed(measure, e, started, timed_out=True)
+        except Exception as e:
+            return self._failed(measure, e, started)
+        submitted, done = (times[measure.name] + [time.monotonic()])[:2]
+        self._observe(measure.name, done - submitted)
+        return MeasureResult(measure.name, value, seconds=done - started)
+
+    def run(self, measures: Sequence[Measure], query: Any) -> Dict[str, MeasureResult]:
+        """Run ``measures`` on ``query``; results keep the order of ``measures``."""
+        self.stats["runs"] += 1
+        started = time.monotonic()
+        times: Dict[str, List[float]] = {}
+        futures = {
+            measure.name: self._start(measure, query, times) for measure in measures if measure.pool != "inline"
+        }
+        results = {
+            measure.name: self._run_inline(measure, query, started) for measure in measures if measure.pool == "inline"
+        }
+        for measure in measures:
+            if measure.name in futures:
+                results[measure.name] = self._collect(measure, futures[measure.name], started, times)
+        return {measure.name: results[measure.name] for measure in measures}
+
+    def run_cascade(
+        self,
+        measures: Sequence[Measure],
+        query: Any,
+        decided: Callable[[Dict[str, MeasureResult]], bool],
+    ) -> Dict[str, MeasureResult]:
+        """Run ``measures`` cheapest first until ``decided(results)`` returns True.
+
+        Required measures always run and are started first. The others are taken in
+        cost order: inline ones run on the calling thread and pooled ones are submitted
+        without waiting, so they overlap. ``decided`` sees every result as soon as it
+        is collected; once it holds, non-required measures that have not finished are
+        dropped. Dropped measures are missing from the returned dict; the others keep
+        the order of ``measures``.
+        """
+        self.stats["runs"] += 1
+        started = time.monotonic()
+        times: Dict[str, List[float]] = {}
+        dropped = threading.Event()
+        pending = {
+            measure.name: self._start(measure, query, times)
+            for measure in measures
+            if measure.required and measure.pool != "inline"
+        }
+        by_name = {measure.name: measure for measure in measures}
+        results: Dict[str, MeasureResult] = {}
+
+        def collect_done() -> None:
+            for name in [name for name, future in pending.items() if future.done()]:
+                results[name] = self._collect(by_name[name], pending.pop(name), started, times)
+
+        def settled() -> bool:
+            collect_done()
+            if not decided(results):
+                return False
+            for name in [name for name in pending if not by_name[name].required]:
+                pending.pop(name).cancel()
+                self.stats["skipped"] += 1
+            dropped.set()
+            return True
+
+        for measure in sorted((m for m in measures if m.name not in pending), key=self.cost):
+            if not measure.required and settled():
+                self.stats["skipped"] += 1
+                continue
+            if measure.pool == "inline":
+                results[measure.name] = self._run_inline(measure, query, started)
+            else:
+                pending[measure.name] = self._start(
+                    measure, query, times, dropped=None if measure.required else dropped
+                )
+
+        while True:
+            settled()
+            if not pending:
+                break
+            deadlines = [
+                times[name][0] + by_name[name].timeout for name in pending if by_name[name].timeout is not None
+            ]
+            wait = None if not deadlines else max(0.0, min(deadlines) - time.monotonic())
+            concurrent.futures.wait(list(pending.values()), timeout=wait, return_when=concurrent.futures.FIRST_COMPLETED)
+            now = time.monotonic()
+            for name in list(pending):
+                measure = by_name[name]
+                if measure.timeout is not None and now >= times[name][0] + measure.timeout:
+                    results[name] = self._collect(measure, pending.pop(name), started, times)
+        return {measure.name: results[measure.name] for measure in measures if measure.name in results}
+
+    def _batch_values(self, measure: Measure, queries: Sequence[Any], value: Any) -> List[Any]:
+        if len(value) != len(queries):
+            raise ValueError(f"{measure.name} returned {len(value)} values for {len(queries)} queries")
+        return list(value)
+
+    def run_batch(self, measures: Sequence[Measure], queries: Sequence[Any]) -> List[Dict[str, MeasureResult]]:
+        """Run ``measures`` on every query in ``queries``; one result dict per query.
+
+        Measures with a ``batch`` function score the whole list in one call. The rest
+        run once per query, side by side on the pools. Batch runs do not update the
+        latency profile, which describes single queries. Each result's ``seconds`` is
+        the time from the start of the run until that measure finished.
+        """
+        self.stats["runs"] += 1
+        started = time.monotonic()
+        queries = list(queries)
+        futures: Dict[str, Any] = {}
+        for measure in measures:
+            if measure.pool == "inline":
+                continue
+            if measure.batch is not None:
+                futures[measure.name] = self._submit(measure, queries, measure.batch)
+            else:
+                futures[measure.name] = [self._submit(measure, query) for query in queries]
+
+        values: Dict[str, List[MeasureResult]] = {}
+        for measure in measures:
+            if measure.pool != "inline":
+                continue
+            if measure.batch is not None:
+                try:
+                    batch = self._batch_values(measure, queries, self._call(measure, queries, measure.batch))
+                except Exception as e:
+                    values[measure.name] = [self._failed(measure, e, started)] * len(queries)
+                    continue
+                seconds = time.monotonic() - started
+                values[measure.name] = [MeasureResult(measure.name, value, seconds=seconds) for value in batch]
+            else:
+                values[measure.name] = [self._run_inline(measure, query, started) for query in queries]
+
+        for measure in measures:
+            if measure.name not in futures:
+                continue
+            timeout = None if measure.timeout is None else measure.timeout * max(1, len(queries))
+            pending = futures[measure.name]
+            if measure.batch is None:
+                values[measure.name] = [self._collect_batch(measure, future, started, timeout) for future in pending]
+                continue
+            result = self._collect_batch(measure, pending, started, timeout)
+            try:
+                batch = self._batch_values(measure, queries, result.value) if result.ok else [result.value] * len(queries)
+            except ValueError as e:
+                result = self._failed(measure, e, started)
+                batch = [result.value] * len(queries)
+            values[measure.name] = [replace(result, value=value) for value in batch]
+        return [{measure.name: values[measure.name][index] for measure in measures} for index in range(len(queries))]
+
+    def _collect_batch(
+        self, measure: Measure, future: concurrent.futures.Future, started: float, timeout: Optional[float]
+    ) -> MeasureResult:
+        wait = None if timeout is None else max(0.0, started + timeout - time.monotonic())
+        try:
+            value = future.result(timeout=wait)
+        except concurrent.futures.TimeoutError as e:
+            future.cancel()
+            return self._failed(measure, e, started, timed_out=True)
+        except Exception as e:
+            return self._failed(measure, e, started)
+        return MeasureResult(measure.name, value, seconds=time.monotonic() - started)
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            pools = [pool for pool in (self._threads, self._processes) if pool is not None]
+            self._threads = self._processes = None
+        for pool in pools:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def timings(results: Dict[str, MeasureResult]) -> List[str]:
+    """One "name: seconds" line per measure, slowest first, for the complexity log."""
+    ordered = sorted(results.values(), key=lambda result: result.seconds, reverse=True)
+    return [
+        f"{result.name}: {result.seconds:.2f}s" + ("" if result.ok else f" ({result.error or 'timeout'})")
+        for result in ordered
+    ]
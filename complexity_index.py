@@ -0,0 +1,161 @@
+# complexity_index.py
+"""
+Nearest-neighbour index over labelled historical queries, for ``is_complex_statistical``.
+
+The index holds every query in the training store (see ``complexity_learner``)
+and the seed queries, together with their 0/1 complexity labels. Queries are
+TF-IDF vectors with unit length, so a sparse dot product gives their cosine
+similarity. A search multiplies the query vectors with the index matrix.
+Only rows that share a term with a query come out nonzero, so the cost grows
+with the matching rows rather than with the size of the history. The top k
+are then picked from each result row.
+
+New queries are added with ``add``. They are transformed with the current
+vocabulary and appended as small segments. Segments of similar size are
+merged, as in a binary counter, so there are only O(log n) segments and each
+row is copied O(log n) times. The vocabulary and IDF weights stay fixed
+between rebuilds. Once the index has grown by ``rebuild_growth`` since the
+last fit, ``needs_rebuild`` turns true and the owner (the learner's background
+thread) calls ``rebuild``. That refits the vectorizer on the whole history
+and swaps the new state in with a single assignment, so searches never see a
+half-built index.
+"""
+
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from complexity_learner import LABEL_THRESHOLD, normalize_query, training_set
+
+DEFAULT_REBUILD_GROWTH = 0.25
+
+
+class _IndexState:
+    """Immutable snapshot searched by ``QueryIndex``; ``labels`` may be longer than ``size``."""
+
+    def __init__(
+        self,
+        vectorizer: Optional[TfidfVectorizer],
+        segments: Tuple[sp.csr_matrix, ...],
+        labels: np.ndarray,
+        size: int,
+    ):
+        self.vectorizer = vectorizer
+        self.segments = segments
+        self.labels = labels
+        self.size = size
+
+
+class QueryIndex:
+    """Growing TF-IDF kNN index of labelled queries.
+
+    Attributes:
+        seed (List[Tuple[str, int]]): Labelled queries always included.
+        rebuild_growth (float): Growth since the last fit after which needs_rebuild is True.
+        queries (List[str]): Normalized text of every indexed query, in row order.
+    """
+
+    def __init__(
+        self,
+        rows: Sequence[Tuple[str, float]] = (),
+        seed: Sequence[Tuple[str, int]] = (),
+        rebuild_growth: float = DEFAULT_REBUILD_GROWTH,
+    ):
+        self.seed = list(seed)
+        self.rebuild_growth = rebuild_growth
+        self.queries: List[str] = []
+        self._fitted_size = 0
+        self._lock = threading.Lock()
+        self._state: Optional[_IndexState] = None
+        self.rebuild(rows)
+
+    def __len__(self) -> int:
+        return self._state.size
+
+    @property
+    def vectorizer(self) -> TfidfVectorizer:
+        return self._state.vectorizer
+
+    @property
+    def labels(self) -> np.ndarray:
+        state = self._state
+        return state.labels[: state.size]
+
+    @property
+    def needs_rebuild(self) -> bool:
+        return len(self) > self._fitted_size * (1 + self.rebuild_growth)
+
+    def matrix(self) -> sp.csr_matrix:
+        """All indexed vectors as one matrix, in row order."""
+        return sp.vstack(self._state.segments).tocsr()
+
+    def rebuild(self, rows: Sequence[Tuple[str, float]]) -> None:
+        """Refits the vectorizer on ``rows`` plus the seed queries and replaces the index."""
+        queries, labels = training_set(rows, self.seed)
+        vectorizer, matrix = None, sp.csr_matrix((len(queries), 0))
+        try:
+            vectorizer = TfidfVectorizer()
+            matrix = vectorizer.fit_transform(queries)
+        except ValueError:
+            # No queries, or no words in them: nothing to search yet
+            vectorizer = None
+        with self._lock:
+            self.queries = list(queries)
+            self._fitted_size = len(queries)
+            self._state = _IndexState(vectorizer, (matrix.tocsr(),), np.asarray(labels, dtype=np.float64), len(queries))
+
+    def add(self, query: str, score: float) -> None:
+        """Appends one labelled query, vectorized with the current vocabulary."""
+        query = normalize_query(query)
+        with self._lock:
+            state = self._state
+            if state.vectorizer is None:
+                row = sp.csr_matrix((1, 0))
+            else:
+                row = state.vectorizer.transform([query]).tocsr()
+            segments = list(state.segments) + [row]
+            while len(segments) > 1 and segments[-2].shape[0] <= 2 * segments[-1].shape[0]:
+                last = segments.pop()
+                segments.append(sp.vstack([segments.pop(), last]).tocsr())
+            labels = state.labels
+            if state.size == len(labels):
+                labels = np.concatenate([labels, np.zeros(max(16, len(labels)))])
+            # Rows past a snapshot's size are invisible to it, so this write is safe
+            labels[state.size] = 1.0 if score >= LABEL_THRESHOLD else 0.0
+            self.queries.append(query)
+            self._state = _IndexState(state.vectorizer, tuple(segments), labels, state.size + 1)
+
+    def search(self, queries: Sequence[str], k: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The k most similar indexed queries of each query.
+
+        Args:
+            queries (Sequence[str]): Queries to look up.
+            k (int): Neighbours per query.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Cosine similarities and labels of the neighbours,
+                each shaped (len(queries), k), most similar first. Missing neighbours have
+                similarity 0 and label 0.
+        """
+        state = self._state
+        similarities = np.zeros((len(queries), k))
+        labels = np.zeros((len(queries), k))
+        if state.vectorizer is None or not len(queries):
+            return similarities, labels
+        vectors = state.vectorizer.transform([str(query) for query in queries])
+        # Sparse product: only rows sharing a term with the query are computed
+        products = sp.hstack([vectors @ segment.T for segment in state.segments]).tocsr()
+        for row in range(len(queries)):
+            start, end = products.indptr[row], products.indptr[row + 1]
+            data, columns = products.data[start:end], products.indices[start:end]
+            if len(data) > k:
+                top = np.argpartition(-data, k)[:k]
+                data, columns = data[top], columns[top]
+            order = np.argsort(-data, kind="stable")
+            similarities[row, : len(order)] = data[order]
+            labels[row, : len(order)] = state.labels[columns[order]]
+        return similarities, labels
@@ -0,0 +1,278 @@
+# complexity_learner.py
+"""
+Background training of the ``is_complex_ml`` classifier.
+
+``is_complex_final`` labels each query it scores with the ensemble's
+outlier-trimmed average. That label is a training example for the ML measure.
+Examples go to ``ComplexityLearner.submit``, which only puts them on a queue,
+so the request path never waits on training.
+
+A single background thread takes examples off the queue and:
+
+* appends each one to a ``TrainingStore``, a JSON-lines file that is only ever
+  appended to (the history is never re-read or rewritten per example);
+* updates the served model in place with ``partial_fit``. The model is a
+  ``HashingVectorizer`` followed by an ``SGDClassifier`` with log loss, so it
+  needs no vocabulary and can learn one example at a time;
+* every ``refit_every`` examples, or when ``request_refit`` is called, fits a
+  fresh model on the whole deduplicated store plus the seed queries. The new
+  model replaces the served one in a single assignment, and both are pickled
+  atomically (write to a temporary file, then ``os.replace``).
+
+An optional ``index`` (``complexity_index.QueryIndex``) gets every example
+too. The same thread rebuilds it whenever it reports ``needs_rebuild``.
+
+Model files from older versions (TF-IDF + logistic regression) cannot learn
+incrementally. They keep serving until the first refit, which the learner
+queues as soon as it loads one.
+"""
+
+import json
+import logging
+import os
+import pickle
+import queue
+import threading
+import time
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import Pipeline
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_PATH = "complexity_training.jsonl"
+DEFAULT_REFIT_EVERY = 500
+DEFAULT_SAVE_EVERY = 50
+HASHING_FEATURES = 2**18
+LABEL_THRESHOLD = 0.5
+CLASSES = [0, 1]
+
+_REFIT = object()
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.strip().lower().split())
+
+
+def make_model() -> Pipeline:
+    """Untrained hashing + SGD pipeline; predict_proba needs the log loss."""
+    return Pipeline(
+        [
+            ("hashing", HashingVectorizer(n_features=HASHING_FEATURES, alternate_sign=False)),
+            ("clf", SGDClassifier(loss="log_loss", random_state=0)),
+        ]
+    )
+
+
+def supports_partial_fit(model) -> bool:
+    return isinstance(model, Pipeline) and hasattr(model.steps[-1][1], "partial_fit") and "hashing" in model.named_steps
+
+
+class TrainingStore:
+    """Append-only JSON-lines file of (query, score) training examples.
+
+    Attributes:
+        path (str): File the examples are appended to.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, query: str, score: float) -> None:
+        line = json.dumps({"query": query, "score": float(score), "time": time.time()})
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def extend(self, rows: Iterable[Tuple[str, float]]) -> None:
+        for query, score in rows:
+            self.append(query, score)
+
+    def rows(self) -> List[Tuple[str, float]]:
+        """All examples, oldest first. Lines cut short by a crash are skipped."""
+        if not os.path.exists(self.path):
+            return []
+        rows = []
+        with self._lock, open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                    rows.append((row["query"], float(row["score"])))
+                except (ValueError, KeyError, TypeError):
+                    continue
+        return rows
+
+
+def training_set(
+    rows: Sequence[Tuple[str, float]], seed: Sequence[Tuple[str, int]] = ()
+) -> Tuple[List[str], List[int]]:
+    """Deduplicated queries and 0/1 labels; the newest label of a query wins, seed labels come last."""
+    seen = set()
+    queries, labels = [], []
+    for query, score in list(reversed(rows)) + list(seed):
+        key = normalize_query(query)
+        if key in seen:
+            continue
+        seen.add(key)
+        queries.append(key)
+        labels.append(1 if score >= LABEL_THRESHOLD else 0)
+    return queries, labels
+
+
+class ComplexityLearner:
+    """Serves the complexity classifier and trains it on a background thread.
+
+    Attributes:
+        store (TrainingStore): Where examples are kept.
+        model_path (Optional[str]): Pickle of the served model; None keeps it in memory only.
+        seed (List[Tuple[str, int]]): Labelled queries always included in full refits.
+        refit_every (int): Examples between full refits; 0 refits only on request.
+        save_every (int): Incremental updates between model saves.
+        model: The served scikit-learn pipeline.
+        index: Nearest-neighbour index kept up to date with the store, once attached.
+        stats (Dict[str, int]): Examples learned, full refits, and failed updates.
+    """
+
+    def __init__(
+        self,
+        store: TrainingStore,
+        model_path: Optional[str] = None,
+        seed: Sequence[Tuple[str, int]] = (),
+        refit_every: int = DEFAULT_REFIT_EVERY,
+        save_every: int = DEFAULT_SAVE_EVERY,
+    ):
+        self.store = store
+        self.model_path = model_path
+        self.seed = list(seed)
+        self.refit_every = refit_every
+        self.save_every = save_every
+        self.stats = {"updates": 0, "refits": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._since_refit = 0
+        self._since_save = 0
+        self._thread: Optional[threading.Thread] = None
+        self.index = None
+
+        self.model = self._load()
+        if self.model is None:
+            self.model = self._fit(self.store.rows())
+            self._save()
+        elif not supports_partial_fit(self.model):
+            self.request_refit()
+
+    def _load(self):
+        if not self.model_path or not os.path.exists(self.model_path):
+            return None
+        try:
+            with open(self.model_path, "rb") as f:
+                return pickle.load(f)
+        except Exception as e:
+            logger.warning("Could not load %s, refitting: %s", self.model_path, e)
+            return None
+
+    def _save(self) -> None:
+        if not self.model_path:
+            return
+        tmp_path = f"{self.model_path}.tmp"
+        with self._lock:
+            data = pickle.dumps(self.model)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.model_path)
+        self._since_save = 0
+
+    def _fit(self, rows: Sequence[Tuple[str, float]]) -> Pipeline:
+        queries, labels = training_set(rows, self.seed)
+        model = make_model()
+        if len(set(labels)) < len(CLASSES):
+            # One class only: start from nothing and let partial_fit learn both
+            model.named_steps["clf"].partial_fit(
+                model.named_steps["hashing"].transform(queries or [""]), labels or [0], classes=CLASSES
+            )
+        else:
+            model.fit(queries, labels)
+        return model
+
+    def predict_proba(self, queries: List[str]):
+        with self._lock:
+            return self.model.predict_proba(queries)
+
+    def submit(self, query: str, score: float) -> None:
+        """Queues one labelled query; returns immediately."""
+        self._ensure_thread()
+        self._queue.put((query, score))
+
+    def request_refit(self) -> None:
+        """Queues a full refit on the background thread."""
+        self._ensure_thread()
+        self._queue.put(_REFIT)
+
+    def flush(self) -> None:
+        """Blocks until everything queued so far has been learned."""
+        self._queue.join()
+
+    def refit(self) -> None:
+        """Fits a fresh model on the whole store and swaps it in."""
+        model = self._fit(self.store.rows())
+        with self._lock:
+            self.model = model
+        self._since_refit = 0
+        self.stats["refits"] += 1
+        self._save()
+
+    def attach_index(self, index):
+        """Keeps ``index`` updated with every learned example; returns it."""
+        self.index = index
+        return index
+
+    def _learn(self, query: str, score: float) -> None:
+        self.store.append(query, score)
+        index = self.index
+        if index is not None:
+            index.add(query, score)
+            if index.needs_rebuild:
+                index.rebuild(self.store.rows())
+        with self._lock:
+            if supports_partial_fit(self.model):
+                X = self.model.named_steps["hashing"].transform([normalize_query(query)])
+                self.model.steps[-1][1].partial_fit(X, [1 if score >= LABEL_THRESHOLD else 0], classes=CLASSES)
+        self.stats["updates"] += 1
+        self._since_refit += 1
+        self._since_save += 1
+        if self.refit_every and self._since_refit >= self.refit_every:
+            self.refit()
+        elif self.save_every and self._since_save >= self.save_every:
+            self._save()
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="complexity-learner", daemon=True)
+                self._thread.start()
+
+    def _worker(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if item is _REFIT:
+                    self.refit()
+                else:
+                    self._learn(*item)
+            except Exception:
+                self.stats["errors"] += 1
+                logger.exception("Complexity learner update failed")
+            finally:
+                self._queue.task_done()
+
+    def shutdown(self) -> None:
+        """Finishes queued work, saves the model and stops the thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self._since_save:
+            self._save()
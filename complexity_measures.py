@@ -1,7 +1,4 @@
-from ast import Tuple
-from calendar import c
-from curses import nl
-from doctest import debug
+import dataclasses
 import inspect
 import os
 import re
@@ -9,30 +6,33 @@ import math
 import pickle
 import string
 import sys
-from tkinter import BOTH
-from typing import Dict, List, Optional
-from cv2 import merge
-from flask import g
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 from pydantic import BaseModel, Field
-from regex import P, sub
 from scipy import stats
-from sklearn.model_selection import GridSearchCV, cross_val_score
-import spacy
 import networkx as nx
 import nltk
 import scipy.sparse as sp
 from collections import Counter, defaultdict
-import sympy
-from sympy import N
 from textblob import TextBlob
 from nltk.corpus import wordnet as wn
 from nltk.tokenize import word_tokenize, sent_tokenize
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
+from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.pipeline import Pipeline
 import openai
+import llm_gateway
+from complexity_cache import (
+    DEFAULT_COMPLEXITY_CACHE_PATH,
+    DEFAULT_COMPLEXITY_CACHE_TTL_SECONDS,
+    ComplexityCache,
+    fingerprint,
+)
+from complexity_executor import Measure, MeasureExecutor, MeasureResult, timings
+from complexity_index import QueryIndex
+from complexity_learner import ComplexityLearner, TrainingStore
+from lexicon_pack import LexiconTable, load_pack
 from nltk.corpus import cmudict
-from transformers import pipeline
 import pandas as pd
 import datetime as dt
 from textstat import flesch_reading_ease
@@ -42,8 +42,6 @@ from textstat import flesch_reading_ease
 date_str = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 save_path = f"debug_log_complexity_{date_str}.txt"
 
-client = openai.OpenAI()
-
 
 import numpy as np
 import logging
@@ -53,16 +51,6 @@ from functools import lru_cache
 # Set up logging
 logging.basicConfig(level=logging.DEBUG, filename="logging_" + save_path, filemode="w")
 
-
-import scipy.sparse as sp
-import numpy as np
-import logging
-
-
-import numpy as np
-import logging
-from typing import Tuple
-
 DEBUG_INDICATOR = True
 
 
@@ -216,7 +204,9 @@ def get_embedding(text, model="text-embedding-3-small"):
 
     # Fetch embedding
     try:
-        response = client.embeddings.create(input=text, model=model)
+        response = llm_gateway.embed_sync(
+            call_site="get_embedding", input=text, model=model
+        )
         if not response or not response.data or (not response.data[0].embedding):
             printer.print_custom(
                 f"Invalid response from the embedding model: {response}"
@@ -238,17 +228,6 @@ def get_embedding(text, model="text-embedding-3-small"):
     return embedding
 
 
-# Initialize Hugging Face's SRL pipeline
-try:
-    srl_pipeline = pipeline(
-        "token-classification",
-        model="dbmdz/bert-large-cased-finetuned-conll03-english",
-    )
-except Exception as e:
-    printer.print_custom(f"Error loading SRL model: {e}")
-    srl_pipeline = None
-
-
 def jaccard_similarity(str1: str, str2: str) -> float:
     """
     Calculates the Jaccard similarity between two strings.
@@ -270,32 +249,296 @@ def jaccard_similarity(str1: str, str2: str) -> float:
     return float(len(intersection)) / len(union) if union else 0.0
 
 
-# Ensure necessary NLTK data is downloaded
-nltk_packages = ["punkt", "averaged_perceptron_tagger", "wordnet", "cmudict"]
-for package in nltk_packages:
+# Heavy resources (spaCy and Hugging Face pipelines, NLTK data, the ML and
+# statistical models) are loaded on first use, or up front by warmup(), rather
+# than at import time. Each loads once per process.
+_resources: Dict[str, object] = {}
+_resource_locks: Dict[str, threading.Lock] = {}
+_resources_lock = threading.Lock()
+
+
+def _resource(name: str, load):
+    if name in _resources:
+        return _resources[name]
+    with _resources_lock:
+        lock = _resource_locks.setdefault(name, threading.Lock())
+    with lock:
+        if name not in _resources:
+            _resources[name] = load()
+    return _resources[name]
+
+
+# NLTK packages and the paths nltk.data.find knows them by
+NLTK_RESOURCES = {
+    "punkt": "tokenizers/punkt",
+    "averaged_perceptron_tagger": "taggers/averaged_perceptron_tagger",
+    "averaged_perceptron_tagger_eng": "taggers/averaged_perceptron_tagger_eng",
+    "wordnet": "corpora/wordnet",
+    "cmudict": "corpora/cmudict",
+}
+
+
+def _download_nltk_data() -> bool:
+    for package, path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            nltk.download(package)
+    return True
+
+
+def ensure_nltk_data() -> None:
+    """Downloads the NLTK packages the measures use, once per process, if they are missing."""
+    _resource("nltk", _download_nltk_data)
+
+
+# spaCy model per tier, fastest first; benchmark_spacy_tiers() measures what each costs in accuracy
+SPACY_MODELS = {
+    "sm": "en_core_web_sm",
+    "md": "en_core_web_md",
+    "lg": "en_core_web_lg",
+    "trf": "en_core_web_trf",
+}
+DEFAULT_SPACY_TIER = "trf"
+spacy_tier = DEFAULT_SPACY_TIER
+
+
+def configure_spacy(tier: str) -> None:
+    """Selects the spaCy model tier ("sm", "md", "lg" or "trf") used by later parses."""
+    global spacy_tier
+    if tier not in SPACY_MODELS:
+        raise ValueError(f"Unknown spaCy tier {tier!r}; expected one of {sorted(SPACY_MODELS)}")
+    spacy_tier = tier
+
+
+def _load_spacy(model: str):
+    import spacy
+
     try:
-        nltk.data.find(
-            f"tokenizers/{package}" if package == "punkt" else f"corpora/{package}"
+        return spacy.load(model)
+    except OSError:
+        from spacy.cli import download
+
+        download(model)
+        return spacy.load(model)
+
+
+def get_nlp(tier: Optional[str] = None):
+    """spaCy pipeline of ``tier`` (default: the configured spacy_tier), shared by the dependency-based measures."""
+    model = SPACY_MODELS[tier or spacy_tier]
+    return _resource(f"spacy:{model}", lambda: _load_spacy(model))
+
+
+# The measures read POS tags, lemmas and the dependency parse, never entities
+SPACY_DISABLED = ["ner"]
+# Components each spaCy measure can do without; a shared parse skips only those no requested measure needs
+SPACY_MEASURE_DISABLE = {
+    "nlp": ["ner", "lemmatizer"],
+    "srl": ["ner", "lemmatizer"],
+    "graph": ["ner"],
+    "recursive": ["ner", "lemmatizer"],
+    "ast": ["ner", "lemmatizer"],
+}
+
+
+def spacy_disable_for(measure_names: List[str]) -> List[str]:
+    """Pipeline components none of ``measure_names`` needs."""
+    sets = [set(SPACY_MEASURE_DISABLE[name]) for name in measure_names if name in SPACY_MEASURE_DISABLE]
+    if not sets:
+        return list(SPACY_DISABLED)
+    return sorted(set.intersection(*sets))
+
+
+SPACY_BATCH_SIZE = 64
+# Each extra process loads its own copy of the transformer; worth it only for large batches
+SPACY_N_PROCESS = 1
+
+
+def parse_texts(
+    texts: List[str],
+    batch_size: int = SPACY_BATCH_SIZE,
+    n_process: int = SPACY_N_PROCESS,
+    disable: Optional[List[str]] = None,
+    tier: Optional[str] = None,
+) -> list:
+    """
+    Parses several texts with one batched spaCy pass instead of one call per text.
+
+    Args:
+        texts (List[str]): Texts to parse.
+        batch_size (int): Texts per transformer batch.
+        n_process (int): Worker processes for nlp.pipe.
+        disable (Optional[List[str]]): Components to skip; defaults to SPACY_DISABLED.
+        tier (Optional[str]): spaCy model tier; defaults to spacy_tier.
+
+    Returns:
+        list: One spaCy Doc per text, in order.
+    """
+    disable = SPACY_DISABLED if disable is None else disable
+    return list(get_nlp(tier).pipe(texts, batch_size=batch_size, n_process=n_process, disable=disable))
+
+
+def count_spacy_tokens(texts: List[str], batch_size: int = SPACY_BATCH_SIZE * 16) -> List[int]:
+    """spaCy token counts of ``texts``, from the tokenizer alone (no transformer pass)."""
+    return [len(doc) for doc in get_nlp().tokenizer.pipe(texts, batch_size=batch_size)]
+
+
+def _load_srl_pipeline():
+    # Hugging Face's SRL pipeline; only is_complex_srl uses it
+    try:
+        from transformers import pipeline
+
+        return pipeline(
+            "token-classification",
+            model="dbmdz/bert-large-cased-finetuned-conll03-english",
         )
-    except LookupError:
-        nltk.download(package)
-nltk.download("averaged_perceptron_tagger_eng")
-# Initialize spaCy model
-try:
-    nlp_spacy = spacy.load("en_core_web_trf")
-except OSError:
-    from spacy.cli import download
+    except Exception as e:
+        printer.print_custom(f"Error loading SRL model: {e}")
+        return None
+
+
+def get_srl_pipeline():
+    return _resource("srl", _load_srl_pipeline)
 
-    download("en_core_web_trf")
-    nlp_spacy = spacy.load("en_core_web_trf")
 
+def get_cmudict() -> dict:
+    """CMU pronouncing dictionary used for syllable counts."""
+    return _resource("cmudict", lambda: ensure_nltk_data() or cmudict.dict())
 
-def get_srl_spacy(input_query: str):
-    doc = nlp_spacy(input_query)
+
+# Precomputed syllable and hypernym-depth tables, built with `python lexicon_pack.py`
+lexicon_pack_dir = "lexicon_pack"
+
+
+def get_lexicon() -> Optional[Dict[str, LexiconTable]]:
+    """Memory-mapped lexicon pack, or None when none has been built (NLTK is used instead)."""
+    return _resource("lexicon", lambda: load_pack(lexicon_pack_dir))
+
+
+def _warm_lexicon():
+    # The pack, or the CMU dictionary the syllable counts fall back to without one
+    return get_lexicon() or get_cmudict()
+
+
+def count_syllables(word: str) -> int:
+    """Syllables of the first CMU pronunciation of ``word``, or its vowel groups if it has none."""
+    word_lower = word.lower()
+    lexicon = get_lexicon()
+    if lexicon is not None:
+        syllables = lexicon["syllables"].get(word_lower)
+    else:
+        pronunciations = get_cmudict().get(word_lower)
+        syllables = None if not pronunciations else sum(1 for phone in pronunciations[0] if phone[-1].isdigit())
+    if syllables is None:
+        # Fallback: count vowels as syllables
+        syllables = len(re.findall(r"[aeiouy]+", word_lower))
+    return syllables
+
+
+def hypernym_depth(noun: str) -> Optional[int]:
+    """max_depth() of the first WordNet noun synset of ``noun``; None if it is not a WordNet noun."""
+    lexicon = get_lexicon()
+    if lexicon is not None:
+        return lexicon["hypernym_depth"].get(noun.lower())
+    ensure_nltk_data()
+    synsets = wn.synsets(noun, pos=wn.NOUN)
+    return synsets[0].max_depth() if synsets else None
+
+
+class QueryAnalysis:
+    """
+    Per-query analysis shared by the complexity measures.
+
+    Each view of the query is computed on first use and then reused: the spaCy
+    Doc (one transformer forward pass for every spaCy measure), its verbs and noun
+    chunks, and the NLTK tokens, POS tags and sentences. Every measure accepts a
+    QueryAnalysis or a plain string.
+
+    When sent to a worker process, only the text is pickled and the worker
+    recomputes what it needs.
+    """
+
+    def __init__(self, text: str, disable: Optional[List[str]] = None, tier: Optional[str] = None):
+        self.text = text
+        self.disable = list(SPACY_DISABLED if disable is None else disable)
+        self.tier = tier or spacy_tier
+        self._memo = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def of(cls, query: "str | QueryAnalysis") -> "QueryAnalysis":
+        return query if isinstance(query, QueryAnalysis) else cls(query)
+
+    @classmethod
+    def batch(
+        cls, texts: List[str], disable: Optional[List[str]] = None, parse: bool = True
+    ) -> List["QueryAnalysis"]:
+        """Analyses of ``texts``; with ``parse`` their Docs come from one batched nlp.pipe pass."""
+        analyses = [cls(text, disable=disable) for text in texts]
+        if parse and analyses:
+            docs = parse_texts(texts, disable=analyses[0].disable, tier=analyses[0].tier)
+            for analysis, doc in zip(analyses, docs):
+                analysis._memo["doc"] = doc
+        return analyses
+
+    def _get(self, name: str, compute):
+        with self._lock:
+            if name not in self._memo:
+                self._memo[name] = compute()
+            return self._memo[name]
+
+    def __getstate__(self):
+        return {"text": self.text, "disable": self.disable, "tier": self.tier}
+
+    def __setstate__(self, state):
+        self.__init__(state["text"], state.get("disable"), state.get("tier"))
+
+    def __str__(self) -> str:
+        return self.text
+
+    @property
+    def doc(self):
+        """spaCy Doc of the query."""
+        return self._get("doc", lambda: get_nlp(self.tier)(self.text, disable=self.disable))
+
+    @property
+    def verbs(self) -> list:
+        return self._get("verbs", lambda: [token for token in self.doc if token.pos_ == "VERB"])
+
+    @property
+    def noun_chunks(self) -> list:
+        return self._get("noun_chunks", lambda: list(self.doc.noun_chunks))
+
+    @property
+    def tokens(self) -> List[str]:
+        """NLTK word tokens of the query."""
+        return self._get("tokens", lambda: ensure_nltk_data() or word_tokenize(self.text))
+
+    @property
+    def lower_tokens(self) -> List[str]:
+        return self._get("lower_tokens", lambda: [token.lower() for token in self.tokens])
+
+    @property
+    def pos_tags(self) -> List[Tuple[str, str]]:
+        """NLTK (Penn Treebank) POS tags of ``tokens``."""
+        return self._get("pos_tags", lambda: ensure_nltk_data() or nltk.pos_tag(self.tokens))
+
+    @property
+    def sentences(self) -> List[str]:
+        return self._get("sentences", lambda: ensure_nltk_data() or sent_tokenize(self.text))
+
+    @property
+    def keyword_counts(self) -> Counter:
+        """Occurrences of the cognitive, temporal and sentiment keywords, from one scan."""
+        return self._get("keyword_counts", lambda: KEYWORD_SCANNER.count(self.text))
+
+
+def get_srl_spacy(input_query: "str | QueryAnalysis"):
+    analysis = QueryAnalysis.of(input_query)
 
     # Extract predicates (verbs) and arguments using dependency parsing
-    predicates = [token for token in doc if token.pos_ == "VERB"]
-    arguments = [chunk for chunk in doc.noun_chunks]
+    predicates = analysis.verbs
+    arguments = analysis.noun_chunks
 
     substeps = len(predicates)
     max_depth = len(arguments)
@@ -338,6 +581,7 @@ def remove_non_sentences(text: str) -> str:
     Returns:
         str: The cleaned text containing only full sentences.
     """
+    ensure_nltk_data()
     sentences = sent_tokenize(text)
     cleaned_sentences = []
     for sentence in sentences:
@@ -371,11 +615,13 @@ def is_text_readable(text, readability_threshold=60):
 
 def is_real_words(text) -> bool:
     # first tokenize each word
+    ensure_nltk_data()
     words = word_tokenize(text)
     real_words = []
     not_words = []
-    for word in words:
-        doc = nlp_spacy(word)
+    # Only lexical attributes are checked, so the tokenizer is enough
+    docs = get_nlp().tokenizer.pipe(words, batch_size=SPACY_BATCH_SIZE * 16)
+    for word, doc in zip(words, docs):
         if doc[0].is_alpha and doc[0].has_vector or wn.synsets(word):
             real_words.append(word)
         elif (
@@ -419,49 +665,16 @@ def generate_ngrams(text, n):
     :param n: Number of words in each n-gram.
     :return: List of n-grams as tuples.
     """
+    ensure_nltk_data()
     tokens = word_tokenize(text.lower())  # Tokenize and convert to lowercase
     return list(ngrams(tokens, n))
 
 
 # Initialize Machine Learning Model for Classification
 model_path_ml = "ml_complexity_model.pkl"
-if os.path.exists(model_path_ml):
-    with open(model_path_ml, "rb") as f:
-        pipeline_ml = pickle.load(f)
-else:
-    # Create and train a simple mock model
-    import pandas as pd
-
-    df_ml = pd.DataFrame(
-        {
-            "query": [
-                "What is the capital of France?",
-                "Explain the process of photosynthesis.",
-                "List the steps to bake a cake, including preparing the ingredients, mixing, baking, and decorating.",
-                "Solve the integral of x^2 dx.",
-                "Describe how to set up a machine learning pipeline involving data collection, preprocessing, model training, and evaluation.",
-                "Define Newton's second law of motion.",
-                "Provide a comprehensive guide to building a web application using Django.",
-                "What are the main causes of World War II?",
-                "Explain the theory of relativity.",
-                "Detail the process of software development lifecycle, including requirements gathering, design, implementation, testing, deployment, and maintenance.",
-            ],
-            "complex": [0, 0, 1, 0, 1, 0, 1, 0, 0, 1],
-        }
-    )
-    X_ml = df_ml["query"]
-    y_ml = df_ml["complex"]
-    vectorizer_ml = TfidfVectorizer()
-    pipeline_ml = Pipeline(
-        [("tfidf", TfidfVectorizer()), ("clf", LogisticRegression())]
-    )
-    pipeline_ml.fit(X_ml, y_ml)
-    with open(model_path_ml, "wb") as f:
-        pickle.dump(pipeline_ml, f)
 
-# Initialize TF-IDF Vectorizer for Statistical Analysis
-vectorizer_stat = TfidfVectorizer()
-df_stat = pd.DataFrame(
+# Labelled queries that seed the ML classifier and the statistical measure
+SEED_QUERIES = pd.DataFrame(
     {
         "query": [
             "What is the capital of France?",
@@ -478,30 +691,120 @@ df_stat = pd.DataFrame(
         "complex": [0, 0, 1, 0, 1, 0, 1, 0, 0, 1],
     }
 )
-tfidf_stat = vectorizer_stat.fit_transform(df_stat["query"])
+
+
+# Labelled queries scored by is_complex_final, appended for the background learner
+training_store_path = "complexity_training.jsonl"
+# History kept by earlier versions, imported into the training store once
+legacy_training_path = "df_data.pkl"
+
+
+def _load_ml_learner() -> ComplexityLearner:
+    store = TrainingStore(training_store_path)
+    if not os.path.exists(training_store_path) and os.path.exists(legacy_training_path):
+        with open(legacy_training_path, "rb") as f:
+            df_legacy = pickle.load(f)
+        store.extend(zip(df_legacy["query"], df_legacy["complex"]))
+    return ComplexityLearner(
+        store,
+        model_path=model_path_ml,
+        seed=list(zip(SEED_QUERIES["query"], SEED_QUERIES["complex"])),
+    )
+
+
+def get_ml_learner() -> ComplexityLearner:
+    """Learner that serves the ML classifier and trains it in the background."""
+    return _resource("ml", _load_ml_learner)
+
+
+def get_ml_pipeline() -> Pipeline:
+    """Complexity classifier currently served, loaded from model_path_ml or trained on SEED_QUERIES."""
+    return get_ml_learner().model
+
+
+def _load_stat_index() -> QueryIndex:
+    learner = get_ml_learner()
+    return learner.attach_index(QueryIndex(learner.store.rows(), seed=learner.seed))
+
+
+def get_stat_index() -> QueryIndex:
+    """kNN index of the labelled historical queries, grown by the background learner."""
+    return _resource("stat", _load_stat_index)
+
+
+# Loaders warmup() knows about; "srl" is only used by the optional is_complex_srl
+RESOURCE_LOADERS = {
+    "nltk": ensure_nltk_data,
+    "spacy": get_nlp,
+    "ml": get_ml_pipeline,
+    "stat": get_stat_index,
+    "cmudict": get_cmudict,
+    "lexicon": _warm_lexicon,
+    "srl": get_srl_pipeline,
+}
+WARMUP_RESOURCES = ["nltk", "spacy", "ml", "stat", "lexicon"]
+
+
+def warmup(resources: Optional[List[str]] = None) -> Dict[str, float]:
+    """
+    Loads heavy resources now instead of on the first query, e.g. at server startup.
+
+    Args:
+        resources (Optional[List[str]]): Names from RESOURCE_LOADERS; defaults to
+            WARMUP_RESOURCES, everything is_complex_final uses.
+
+    Returns:
+        Dict[str, float]: Seconds spent loading each resource (near 0 if already loaded).
+    """
+    seconds = {}
+    for name in WARMUP_RESOURCES if resources is None else resources:
+        started = time.perf_counter()
+        RESOURCE_LOADERS[name]()
+        seconds[name] = time.perf_counter() - started
+        printer.print_custom(f"[Warmup] {name} ready in {seconds[name]:.2f}s")
+    return seconds
+
+
+def __getattr__(name: str):
+    # Module attributes that used to be loaded at import time
+    if name == "nlp_spacy":
+        return get_nlp()
+    if name == "srl_pipeline":
+        return get_srl_pipeline()
+    if name == "pipeline_ml":
+        return get_ml_pipeline()
+    if name == "vectorizer_stat":
+        return get_stat_index().vectorizer
+    if name == "tfidf_stat":
+        return get_stat_index().matrix()
+    if name == "df_stat":
+        index = get_stat_index()
+        return pd.DataFrame({"query": index.queries[: len(index)], "complex": index.labels})
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Function Definitions
 
 
 # 1. Natural Language Processing (NLP) and Dependency Parsing
 def is_complex_nlp_dependency(
-    input_query: str, substep_threshold: int = 3, depth_threshold: int = 1
+    input_query: "str | QueryAnalysis", substep_threshold: int = 3, depth_threshold: int = 1
 ) -> float:
     """
     Determines complexity based on NLP dependency parsing.
 
     Args:
-        input_query (str): The problem to solve.
+        input_query (str | QueryAnalysis): The problem to solve.
         substep_threshold (int): Number of substeps to consider complex.
         depth_threshold (int): Depth of dependency tree to consider complex.
 
     Returns:
         float: Score between 0 and 1 indicating complexity.
     """
-    doc = nlp_spacy(input_query)
+    analysis = QueryAnalysis.of(input_query)
+    doc = analysis.doc
 
     # Count verbs as substeps
-    substeps = len([token for token in doc if token.pos_ == "VERB"])
+    substeps = len(analysis.verbs)
 
     # Determine the maximum depth of the dependency tree
     def get_depth(token, current_depth=0):
@@ -528,7 +831,7 @@ def is_complex_nlp_dependency(
 
 
 def is_complex_spacy_srl(
-    input_query: str, substep_threshold: int = 3, depth_threshold: int = 1
+    input_query: "str | QueryAnalysis", substep_threshold: int = 3, depth_threshold: int = 1
 ) -> float:
     substeps, max_depth = get_srl_spacy(input_query)
 
@@ -546,24 +849,25 @@ def is_complex_spacy_srl(
 
 # 2. Semantic Role Labeling (SRL)
 def is_complex_srl(
-    input_query: str, substep_threshold: int = 3, depth_threshold: int = 1
+    input_query: "str | QueryAnalysis", substep_threshold: int = 3, depth_threshold: int = 1
 ) -> float:
     """
     Determines complexity based on Semantic Role Labeling using Hugging Face.
 
     Args:
-        input_query (str): The problem to solve.
+        input_query (str | QueryAnalysis): The problem to solve.
         substep_threshold (int): Number of predicates to consider complex.
         depth_threshold (int): Depth of argument structures to consider complex.
 
     Returns:
         float: Score between 0 and 1 indicating complexity.
     """
+    srl_pipeline = get_srl_pipeline()
     if not srl_pipeline:
         printer.print_custom("[SRL] SRL Pipeline not available.")
         return 0.0
 
-    result = srl_pipeline(input_query)
+    result = srl_pipeline(str(input_query))
     printer.print_custom(f"[SRL] Result: {result}")
 
     # Extract predicates (verbs) and arguments from result
@@ -587,18 +891,18 @@ def is_complex_srl(
 
 
 # 3. Machine Learning Classification
-def is_complex_ml(input_query: str, threshold: float = 0.5) -> float:
+def is_complex_ml(input_query: "str | QueryAnalysis", threshold: float = 0.5) -> float:
     """
     Determines complexity using a machine learning classifier.
 
     Args:
-        input_query (str): The problem to solve.
+        input_query (str | QueryAnalysis): The problem to solve.
         threshold (float): Probability threshold to consider complex.
 
     Returns:
         float: Probability between 0 and 1 indicating complexity.
     """
-    prob = pipeline_ml.predict_proba([input_query])[0][
+    prob = get_ml_learner().predict_proba([str(input_query)])[0][
         1
     ]  # Probability of being complex
     printer.print_custom(f"[Machine Learning] Probability of Complexity: {prob}")
@@ -606,100 +910,11 @@ def is_complex_ml(input_query: str, threshold: float = 0.5) -> float:
     return prob
 
 
-def finetune_ml_model(df: pd.DataFrame, model_path: str):
-    """
-    Finetune the pipeline model using the input query and the results from other methods as labels.
-
-    Args:
-        df (pd.DataFrame): DataFrame containing the input queries and the results from other methods.
-        model_path (str): Path to save the finetuned model.
-        results (Dict[str, float]): Dictionary containing the results from other methods.
-
-    Returns:
-        Pipeline: Finetuned pipeline model.
-    """
-    # Create a copy of the DataFrame
-    df_finetune = df.copy()
-    df_load = None
-    if os.path.exists("df_data.pkl"):
-        with open("df_data.pkl", "rb") as f:
-            df_load = pickle.load(f)
-    if df_load is not None:
-        df_finetune = pd.concat([df_finetune, df_load], ignore_index=True)
-    with open("df_data.pkl", "wb") as f:
-        pickle.dump(df_finetune, f)
-
-    df_ml = pd.DataFrame(
-        {
-            "query": [
-                "What is the capital of France?",
-                "Explain the process of photosynthesis.",
-                "List the steps to bake a cake, including preparing the ingredients, mixing, baking, and decorating.",
-                "Solve the integral of x^2 dx.",
-                "Describe how to set up a machine learning pipeline involving data collection, preprocessing, model training, and evaluation.",
-                "Define Newton's second law of motion.",
-                "Provide a comprehensive guide to building a web application using Django.",
-                "What are the main causes of World War II?",
-                "Explain the theory of relativity.",
-                "Detail the process of software development lifecycle, including requirements gathering, design, implementation, testing, deployment, and maintenance.",
-            ],
-            "complex": [0, 0, 1, 0, 1, 0, 1, 0, 0, 1],
-        }
-    )
-    # combine df_ml and df_finetune
-    df_finetune = pd.concat([df_finetune, df_ml], ignore_index=True)
-    df_finetune["query"] = df_finetune["query"].apply(
-        lambda x: (x.strip().lower().replace("\n", " ").replace("\t", " "))
-    )
-    df_finetune = df_finetune.drop_duplicates(subset=["query"])
-    # Add the results from other methods as labels
-
-    # Split the data into features and labels
-    X_finetune = df_finetune["query"]
-    y_finetune = [1 if score >= 0.5 else 0 for score in df_finetune["complex"]]
-
-    # Load the existing pipeline model
-    with open(model_path, "rb") as f:
-        pipeline_finetuned = pickle.load(f)
-
-        # Add cross-validation
-
-    # try:
-    #     # Define parameter grid for your pipeline
-    #     param_grid = {
-    #         "vectorizer__max_features": [1000, 2000, 3000],
-    #         "classifier__max_depth": [10, 20, None],
-    #         "classifier__n_estimators": [100, 200, 300],
-    #     }
-
-    #     # Use GridSearchCV instead of simple cross_val_score
-    #     grid_search = GridSearchCV(
-    #         pipeline_finetuned,
-    #         param_grid,
-    #         cv=5,
-    #         scoring="accuracy",
-    #         n_jobs=-1,
-    #         verbose=1,
-    #     )
-    #     grid_search.fit(X_finetune, y_finetune)
-
-    #     printer.print_custom(f"Best parameters: {grid_search.best_params_}")
-    #     printer.print_custom(f"Best score: {grid_search.best_score_:.3f}")
-    # except Exception as e:
-    #     # Use the best model
-    #     pipeline_finetuned = grid_search.best_estimator_
-    #     cv_scores = cross_val_score(pipeline_finetuned, X_finetune, y_finetune, cv=5)
-    #     printer.print_custom(f"Cross-validation scores: {cv_scores}")
-    #     printer.print_custom(
-    #         f"Average CV score: {cv_scores.mean():.3f} (+/- {cv_scores.std() * 2:.3f})"
-    #     )
-    pipeline_finetuned.fit(X_finetune, y_finetune)
-
-    # Save the finetuned model
-    with open(model_path, "wb") as f:
-        pickle.dump(pipeline_finetuned, f)
-
-    return pipeline_finetuned
+def is_complex_ml_batch(input_queries: List["str | QueryAnalysis"]) -> List[float]:
+    """is_complex_ml for many queries with one predict_proba call."""
+    probs = get_ml_learner().predict_proba([str(query) for query in input_queries])[:, 1]
+    printer.print_custom(f"[Machine Learning] Scored {len(probs)} queries")
+    return [float(prob) for prob in probs]
 
 
 class Subtask(BaseModel):
@@ -780,7 +995,8 @@ def merge_steps(
     openai.api_key = openai_api_key
     if isinstance(step_obj, PlanStep):
         try:
-            response = client.chat.completions.create(
+            response = llm_gateway.chat_sync(
+                call_site="merge_steps",
                 model="gpt-4o-mini",
                 messages=[
                     {
@@ -833,7 +1049,8 @@ def merge_steps(
             return step_obj
     elif isinstance(step_obj, Subtask):
         try:
-            response = client.chat.completions.create(
+            response = llm_gateway.chat_sync(
+                call_site="merge_steps",
                 model="gpt-4o-mini",
                 messages=[
                     {
@@ -959,7 +1176,8 @@ def generate_plan(input_query: str) -> str:
     openai.api_key = openai_api_key
 
     try:
-        response = client.beta.chat.completions.parse(
+        response = llm_gateway.parse_sync(
+            call_site="generate_plan",
             model="gpt-4o-mini",
             messages=[
                 {
@@ -1558,7 +1776,8 @@ Respond only with a bool that is true for 'useful' and false for 'junk'. This bo
 
     try:
         # Make the API request with structured output
-        response = client.beta.chat.completions.parse(
+        response = llm_gateway.parse_sync(
+            call_site="classify_remaining_text_structured",
             model=model,
             messages=[
                 {"role": "system", "content": "You are a helpful assistant."},
@@ -1649,10 +1868,6 @@ def test_classify_remaining_text_structured():
     printer.print_custom("All tests passed!")
 
 
-# Call the test function
-test_classify_remaining_text_structured()
-
-
 def normalize_whitespace(text):
     return " ".join(text.split())
 
@@ -2511,7 +2726,8 @@ def convert_plan(
             + "If the plan is complete and there is no meaningful text to convert, please indicate that the conversion is complete by replying simply with the word 'Complete' and nothing else, rather than an empty response. Remember not to generate new steps or subtasks that are not present in the plan. Only convert the existing steps and subtasks that are part of the plan, simply replying with the word 'Complete' if there is no meaningful text to convert into steps and subtasks."
         )
     try:
-        response = client.beta.chat.completions.parse(
+        response = llm_gateway.parse_sync(
+            call_site="convert_plan",
             model=model,
             messages=[
                 {
@@ -3051,7 +3267,8 @@ def generate_plan_legacy(input_query: str) -> str:
     openai.api_key = openai_api_key
 
     try:
-        response = client.chat.completions.create(
+        response = llm_gateway.chat_sync(
+            call_site="generate_plan_legacy",
             model="gpt-4o-mini",
             messages=[
                 {
@@ -3077,7 +3294,7 @@ def generate_plan_legacy(input_query: str) -> str:
 
 
 def is_complex_llm(
-    input_query: str,
+    input_query: "str | QueryAnalysis",
     substep_threshold: int = 4,
     depth_threshold: int = 1,
     step_length_threshold: int = 12,
@@ -3092,7 +3309,7 @@ def is_complex_llm(
     Determines complexity using LLM-generated plan analysis.
 
     Args:
-        input_query (str): The problem to solve.
+        input_query (str | QueryAnalysis): The problem to solve.
         substep_threshold (int): Number of substeps to consider complex.
         depth_threshold (int): Depth of subtasks to consider complex.
         step_length_threshold (int): Average step length to consider complex.
@@ -3106,7 +3323,7 @@ def is_complex_llm(
     Returns:
         float: Score between 0 and 1 indicating complexity.
     """
-    plan_str = generate_plan_legacy(input_query)
+    plan_str = generate_plan_legacy(str(input_query))
     if not plan_str:
         return 0.0
     printer.print_custom(f"[Language Model] Generated Plan (Legacy):\n{plan_str} \n\n")
@@ -3129,12 +3346,11 @@ def is_complex_llm(
     substeps = len(steps)
 
     # Calculate average step length by tokenizing each step and summing the lengths. Tokenize using spaCy
-    total_length = 0
-
+    texts = []
     for step in steps:
-        total_length += len(nlp_spacy(step.step_full_text))
-        for subtask in step.subtasks:
-            total_length += len(nlp_spacy(subtask.subtask_full_text))
+        texts.append(step.step_full_text)
+        texts.extend(subtask.subtask_full_text for subtask in step.subtasks)
+    total_length = sum(count_spacy_tokens(texts))
     avg_step_length = total_length / substeps if substeps > 0 else 0
 
     # Collect all subtasks and count unique names
@@ -3293,33 +3509,32 @@ def is_complex_llm_legacy(
 
 # 6. Graph-Based Approach
 def is_complex_graph(
-    input_query: str, substep_threshold: int = 5, depth_threshold: int = 1
+    input_query: "str | QueryAnalysis", substep_threshold: int = 5, depth_threshold: int = 1
 ) -> float:
     """
     Determines complexity based on a graph representation of tasks.
 
     Args:
-        input_query (str): The problem to solve.
+        input_query (str | QueryAnalysis): The problem to solve.
         substep_threshold (int): Number of tasks to consider complex.
         depth_threshold (int): Depth of task dependencies to consider complex.
 
     Returns:
         float: Score between 0 and 1 indicating complexity.
     """
-    doc = nlp_spacy(input_query)
+    analysis = QueryAnalysis.of(input_query)
 
     G = nx.DiGraph()
 
     # Simple heuristic: Each verb is a task; dependencies based on subjects and objects
-    for token in doc:
-        if token.pos_ == "VERB":
-            task = token.lemma_
-            G.add_node(task)
-            for child in token.children:
-                if child.dep_ in ("nsubj", "dobj", "prep"):
-                    if child.pos_ == "NOUN":
-                        dependent = child.lemma_
-                        G.add_edge(task, dependent)
+    for token in analysis.verbs:
+        task = token.lemma_
+        G.add_node(task)
+        for child in token.children:
+            if child.dep_ in ("nsubj", "dobj", "prep"):
+                if child.pos_ == "NOUN":
+                    dependent = child.lemma_
+                    G.add_edge(task, dependent)
 
     substeps = G.number_of_nodes()
 
@@ -3348,7 +3563,7 @@ def is_complex_graph(
 
 # 7. Recursive Task Decomposition
 def is_complex_recursive(
-    input_query: str,
+    input_query: "str | QueryAnalysis",
     substep_threshold: int = 5,
     depth_threshold: int = 1,
     max_allowed_depth: int = 3,
@@ -3357,7 +3572,7 @@ def is_complex_recursive(
     Determines complexity using recursive task decomposition.
 
     Args:
-        input_query (str): The problem to solve.
+        input_query (str | QueryAnalysis): The problem to solve.
         substep_threshold (int): Number of tasks to consider complex.
         depth_threshold (int): Depth of task dependencies to consider complex.
         max_allowed_depth (int): Maximum recursion depth.
@@ -3365,12 +3580,10 @@ def is_complex_recursive(
     Returns:
         float: Score between 0 and 1 indicating complexity.
     """
-    doc = nlp_spacy(input_query)
-
     G = nx.DiGraph()
 
     # Identify main tasks
-    main_tasks = [token for token in doc if token.pos_ == "VERB"]
+    main_tasks = QueryAnalysis.of(input_query).verbs
 
     def decompose_task(token, current_depth, max_allowed_depth, G):
         """
@@ -3412,28 +3625,24 @@ def is_complex_recursive(
 
 
 # 8. Ontological Mapping
-def is_complex_ontology(input_query: str, max_depth_threshold: int = 3) -> float:
+def is_complex_ontology(input_query: "str | QueryAnalysis", max_depth_threshold: int = 3) -> float:
     """
     Determines complexity based on ontological mapping using WordNet.
 
     Args:
-        input_query (str): The problem to solve.
+        input_query (str | QueryAnalysis): The problem to solve.
         max_depth_threshold (int): Depth in ontology to consider complex.
 
     Returns:
         float: Score between 0 and 1 indicating complexity.
     """
-    tokens = nltk.word_tokenize(input_query)
-    nouns = [word for word, pos in nltk.pos_tag(tokens) if pos.startswith("NN")]
+    pos_tags = QueryAnalysis.of(input_query).pos_tags
+    nouns = [word for word, pos in pos_tags if pos.startswith("NN")]
 
     max_depth = 0
     for noun in nouns:
-        synsets = wn.synsets(noun, pos=wn.NOUN)
-        if not synsets:
-            continue
-        synset = synsets[0]
-        depth = synset.max_depth()
-        if depth > max_depth:
+        depth = hypernym_depth(noun)
+        if depth is not None and depth > max_depth:
             max_depth = depth
 
     # Normalize score using sigmoid function and threshold
@@ -3451,51 +3660,44 @@ def is_complex_ontology(input_query: str, max_depth_threshold: int = 3) -> float
 
 
 # 9. Cognitive Complexity Metrics
-def is_complex_cognitive(input_query: str, complexity_threshold: float = 5.0) -> float:
+COGNITIVE_RULES = {
+    "if": 1,
+    "while": 1,
+    "for": 1,
+    "else": 1,
+    "elif": 1,
+    "switch": 1,
+    "case": 1,
+    "when": 1,
+    "and": 0.5,
+    "or": 0.5,
+    "but": 0.5,
+    "first": 0.5,
+    "next": 0.5,
+    "then": 0.5,
+    "finally": 0.5,
+}
+
+
+def is_complex_cognitive(input_query: "str | QueryAnalysis", complexity_threshold: float = 5.0) -> float:
     """
     Determines complexity based on cognitive complexity metrics.
 
     Args:
-        input_query (str): The problem to solve.
+        input_query (str | QueryAnalysis): The problem to solve.
         complexity_threshold (float): Complexity score to consider complex.
 
     Returns:
         float: Score between 0 and 1 indicating complexity.
     """
     # Define rules: each occurrence adds to complexity
-    rules = {
-        "if": 1,
-        "while": 1,
-        "for": 1,
-        "else": 1,
-        "elif": 1,
-        "switch": 1,
-        "case": 1,
-        "when": 1,
-        "and": 0.5,
-        "or": 0.5,
-        "but": 0.5,
-        "first": 0.5,
-        "next": 0.5,
-        "then": 0.5,
-        "finally": 0.5,
-    }
+    rules = COGNITIVE_RULES
 
-    # Normalize input
-    input_lower = input_query.lower()
-
-    complexity_score = 0
-    for keyword, score in rules.items():
-        matches = re.findall(r"\b" + re.escape(keyword) + r"\b", input_lower)
-        count = len(matches)
-        complexity_score += count * score
-        printer.print_custom(
-            f"[Cognitive Metrics] Keyword '{keyword}' occurrences: {count}, adding {count * score} points."
-        )
-        with open(save_path, "a") as f:
-            f.write(
-                f"[Cognitive Metrics] Keyword '{keyword}' occurrences: {count}, adding {count * score} points."
-            )
+    counts = count_keywords(input_query, list(rules))
+    complexity_score = sum(counts[keyword] * score for keyword, score in rules.items())
+    printer.print_custom(f"[Cognitive Metrics] Keyword occurrences: {dict(counts)}")
+    with open(save_path, "a") as f:
+        f.write(f"[Cognitive Metrics] Keyword occurrences: {dict(counts)}")
 
     # Normalize score (assuming max possible score is, say, 15)
     normalized_score = min(complexity_score / complexity_threshold, 1.0)
@@ -3511,20 +3713,20 @@ def is_complex_cognitive(input_query: str, complexity_threshold: float = 5.0) ->
 
 # 10. Abstract Syntax Tree (AST) Generation
 def is_complex_ast(
-    input_query: str, substep_threshold: int = 8, depth_threshold: int = 2
+    input_query: "str | QueryAnalysis", substep_threshold: int = 8, depth_threshold: int = 2
 ) -> float:
     """
     Determines complexity based on AST-like structure of the query.
 
     Args:
-        input_query (str): The problem to solve.
+        input_query (str | QueryAnalysis): The problem to solve.
         substep_threshold (int): Number of nodes to consider complex.
         depth_threshold (int): Depth of AST to consider complex.
 
     Returns:
         float: Score between 0 and 1 indicating complexity.
     """
-    doc = nlp_spacy(input_query)
+    doc = QueryAnalysis.of(input_query).doc
 
     G = nx.DiGraph()
 
@@ -3559,34 +3761,20 @@ def is_complex_ast(
 
 
 # 11. Statistical Analysis of Historical Data
-def is_complex_statistical(input_query: str, threshold: float = 0.5) -> float:
+def is_complex_statistical(input_query: "str | QueryAnalysis", threshold: float = 0.5) -> float:
     """
     Determines complexity based on similarity to historical complex queries.
 
     Args:
-        input_query (str): The problem to solve.
+        input_query (str | QueryAnalysis): The problem to solve.
         threshold (float): Similarity threshold to consider complex.
 
     Returns:
         float: Weighted complexity score between 0 and 1.
     """
-    try:
-        # import cosine_similarity from sklearn.metrics.pairwise
-        from sklearn.metrics.pairwise import cosine_similarity
-    except ImportError:
-        printer.print_custom(
-            "scikit-learn is not installed. Please install scikit-learn to use this function."
-        )
-        return 0.0
-    input_vec = vectorizer_stat.transform([input_query])
-    printer.print_custom(f"input_vec dimensions: {len(input_vec.shape)}")
-    printer.print_custom(f"tfidf_stat dimensions: {len(tfidf_stat.shape)}")
-    similarities = cosine_similarity(input_vec, tfidf_stat).flatten()
-
     # Get top 3 similar queries
-    top_indices = np.argsort(similarities)[::-1][:3]
-    top_similarities = similarities[top_indices]
-    top_labels = df_stat["complex"].iloc[top_indices]
+    similarities, labels = get_stat_index().search([str(input_query)], k=3)
+    top_similarities, top_labels = similarities[0], labels[0]
 
     # Weighted average complexity
     if sum(top_similarities) == 0:
@@ -3608,6 +3796,15 @@ def is_complex_statistical(input_query: str, threshold: float = 0.5) -> float:
     return weighted_complexity
 
 
+def is_complex_statistical_batch(input_queries: List["str | QueryAnalysis"], top_k: int = 3) -> List[float]:
+    """is_complex_statistical for many queries: one sparse TF-IDF matrix and one similarity product."""
+    top_similarities, top_labels = get_stat_index().search([str(query) for query in input_queries], k=top_k)
+    totals = top_similarities.sum(axis=1)
+    weighted = (top_similarities * top_labels).sum(axis=1) / np.where(totals == 0, 1, totals)
+    printer.print_custom(f"[Statistical Analysis] Scored {len(weighted)} queries")
+    return [float(score) for score in weighted]
+
+
 # 13. Interactive Query Expansion
 def generate_follow_up_questions(input_query: str, num_questions: int = 3) -> list:
     """
@@ -3627,7 +3824,8 @@ def generate_follow_up_questions(input_query: str, num_questions: int = 3) -> li
     openai.api_key = openai_api_key
 
     try:
-        response = client.chat.completions.create(
+        response = llm_gateway.chat_sync(
+            call_site="generate_follow_up_questions",
             model="gpt-4o-mini",
             messages=[
                 {
@@ -3667,20 +3865,20 @@ def generate_follow_up_questions(input_query: str, num_questions: int = 3) -> li
 
 
 def is_complex_query_expansion(
-    input_query: str, substep_threshold: int = 5, depth_threshold: int = 2
+    input_query: "str | QueryAnalysis", substep_threshold: int = 5, depth_threshold: int = 2
 ) -> float:
     """
     Determines complexity using interactive query expansion.
 
     Args:
-        input_query (str): The problem to solve.
+        input_query (str | QueryAnalysis): The problem to solve.
         substep_threshold (int): Number of follow-up questions to consider complex.
         depth_threshold (int): Depth of follow-up questions to consider complex.
 
     Returns:
         float: Score between 0 and 1 indicating complexity.
     """
-    follow_up_questions = generate_follow_up_questions(input_query)
+    follow_up_questions = generate_follow_up_questions(str(input_query))
 
     # Simple heuristic: Number of follow-up questions indicates complexity
     substeps = len(follow_up_questions)
@@ -3703,30 +3901,20 @@ def is_complex_query_expansion(
 
 
 # 14. Psycholinguistic Metrics
-def flesch_kincaid_grade(text: str) -> float:
+def flesch_kincaid_grade(text: "str | QueryAnalysis") -> float:
     """
     Calculates the Flesch-Kincaid Grade Level for the given text.
 
     Args:
-        text (str): The text to analyze.
+        text (str | QueryAnalysis): The text to analyze.
 
     Returns:
         float: Flesch-Kincaid Grade Level.
     """
-    sentences = sent_tokenize(text)
-    words = word_tokenize(text)
-    syllables = 0
-    d = cmudict.dict()
-
-    for word in words:
-        word_lower = word.lower()
-        if word_lower in d:
-            syllables += [
-                len(list(y for y in x if y[-1].isdigit())) for x in d[word_lower]
-            ][0]
-        else:
-            # Fallback: count vowels as syllables
-            syllables += len(re.findall(r"[aeiouy]+", word_lower))
+    analysis = QueryAnalysis.of(text)
+    sentences = analysis.sentences
+    words = analysis.tokens
+    syllables = sum(count_syllables(word) for word in words)
 
     if len(words) == 0 or len(sentences) == 0:
         return 0.0
@@ -3739,13 +3927,13 @@ def flesch_kincaid_grade(text: str) -> float:
 
 
 def is_complex_psycholinguistic(
-    input_query: str, grade_threshold: float = 12.0
+    input_query: "str | QueryAnalysis", grade_threshold: float = 12.0
 ) -> float:
     """
     Determines complexity based on Flesch-Kincaid Grade Level.
 
     Args:
-        input_query (str): The problem to solve.
+        input_query (str | QueryAnalysis): The problem to solve.
         grade_threshold (float): Grade level to consider complex.
 
     Returns:
@@ -3765,14 +3953,25 @@ def is_complex_psycholinguistic(
 
 
 # 16. Emotional Sentiment Analysis
+SENTIMENT_KEYWORDS = [
+    "difficult",
+    "complex",
+    "challenging",
+    "complicated",
+    "intricate",
+    "elaborate",
+    "hard",
+]
+
+
 def is_complex_sentiment(
-    input_query: str, keywords: list = None, sentiment_threshold: float = 0.0
+    input_query: "str | QueryAnalysis", keywords: list = None, sentiment_threshold: float = 0.0
 ) -> float:
     """
     Determines complexity based on emotional sentiment analysis.
 
     Args:
-        input_query (str): The problem to solve.
+        input_query (str | QueryAnalysis): The problem to solve.
         keywords (list): List of sentiment-indicative keywords.
         sentiment_threshold (float): Sentiment polarity threshold to consider complex.
 
@@ -3780,51 +3979,34 @@ def is_complex_sentiment(
         float: Score between 0 and 1 indicating complexity.
     """
     if keywords is None:
-        keywords = [
-            "difficult",
-            "complex",
-            "challenging",
-            "complicated",
-            "intricate",
-            "elaborate",
-            "hard",
-        ]
+        keywords = SENTIMENT_KEYWORDS
+
+    # Check for indicative keywords
+    found = sorted(count_keywords(input_query, keywords))
 
     # Compute sentiment polarity
-    blob = TextBlob(input_query)
+    blob = TextBlob(str(input_query))
     sentiment = blob.sentiment.polarity  # Range [-1.0, 1.0]
-    printer.print_custom(f"[Sentiment Analysis] Sentiment Polarity: {sentiment}")
-    with open(save_path, "a") as f:
-        f.write(f"[Sentiment Analysis] Sentiment Polarity: {sentiment}")
-
-    # Check for indicative keywords
-    keyword_present = False
-    for kw in keywords:
-        if re.search(r"\b" + re.escape(kw) + r"\b", input_query.lower()):
-            keyword_present = True
-            printer.print_custom(f"[Sentiment Analysis] Keyword '{kw}' found.")
-            with open(save_path, "a") as f:
-                f.write(f"[Sentiment Analysis] Keyword '{kw}' found.")
-            break
 
     # Determine complexity
-    if sentiment < sentiment_threshold or keyword_present:
+    if sentiment < sentiment_threshold or found:
         score = 1.0
     else:
         score = 0.0
-    printer.print_custom(f"[Sentiment Analysis] Complexity Score: {score}")
+    message = f"[Sentiment Analysis] Sentiment Polarity: {sentiment}, Keywords found: {found}, Complexity Score: {score}"
+    printer.print_custom(message)
     with open(save_path, "a") as f:
-        f.write(f"[Sentiment Analysis] Complexity Score: {score}")
+        f.write(message)
     return score
 
 
 # 17. Automated Theorem Proving Techniques
-def is_complex_theorem_proving(input_query: str, step_threshold: int = 5) -> float:
+def is_complex_theorem_proving(input_query: "str | QueryAnalysis", step_threshold: int = 5) -> float:
     """
     Determines complexity based on automated theorem proving.
 
     Args:
-        input_query (str): The problem to solve (mathematical).
+        input_query (str | QueryAnalysis): The problem to solve (mathematical).
         step_threshold (int): Number of steps to consider complex.
 
     Returns:
@@ -3835,6 +4017,9 @@ def is_complex_theorem_proving(input_query: str, step_threshold: int = 5) -> flo
     # Ideally, NLP techniques would be used to parse the problem type
 
     # Example: "Solve the integral of x^2 dx."
+    import sympy
+
+    input_query = str(input_query)
     try:
         if "integral" in input_query.lower():
             # Extract the integrand
@@ -3874,17 +4059,17 @@ def is_complex_theorem_proving(input_query: str, step_threshold: int = 5) -> flo
 
 
 # 18. Computational Linguistics Complexity Measures
-def calculate_entropy(text: str) -> float:
+def calculate_entropy(text: "str | QueryAnalysis") -> float:
     """
     Calculates the Shannon entropy of the text.
 
     Args:
-        text (str): The text to analyze.
+        text (str | QueryAnalysis): The text to analyze.
 
     Returns:
         float: Entropy value.
     """
-    tokens = word_tokenize(text.lower())
+    tokens = QueryAnalysis.of(text).lower_tokens
     total_tokens = len(tokens)
     counts = Counter(tokens)
     probabilities = [count / total_tokens for count in counts.values()]
@@ -3892,12 +4077,12 @@ def calculate_entropy(text: str) -> float:
     return entropy
 
 
-def is_complex_entropy(input_query: str, entropy_threshold: float = 5.0) -> float:
+def is_complex_entropy(input_query: "str | QueryAnalysis", entropy_threshold: float = 5.0) -> float:
     """
     Determines complexity based on entropy.
 
     Args:
-        input_query (str): The problem to solve.
+        input_query (str | QueryAnalysis): The problem to solve.
         entropy_threshold (float): Entropy value to consider complex.
 
     Returns:
@@ -3912,14 +4097,26 @@ def is_complex_entropy(input_query: str, entropy_threshold: float = 5.0) -> floa
 
 
 # 19. Temporal Sequence Analysis
+TEMPORAL_KEYWORDS = [
+    "before",
+    "after",
+    "simultaneously",
+    "then",
+    "first",
+    "next",
+    "finally",
+    "subsequently",
+]
+
+
 def is_complex_temporal(
-    input_query: str, temporal_keywords: list = None, sequence_threshold: int = 3
+    input_query: "str | QueryAnalysis", temporal_keywords: list = None, sequence_threshold: int = 3
 ) -> float:
     """
     Determines complexity based on temporal sequence analysis.
 
     Args:
-        input_query (str): The problem to solve.
+        input_query (str | QueryAnalysis): The problem to solve.
         temporal_keywords (list): List of temporal connectors.
         sequence_threshold (int): Number of sequences to consider complex.
 
@@ -3927,29 +4124,13 @@ def is_complex_temporal(
         float: Score between 0 and 1 indicating complexity.
     """
     if temporal_keywords is None:
-        temporal_keywords = [
-            "before",
-            "after",
-            "simultaneously",
-            "then",
-            "first",
-            "next",
-            "finally",
-            "subsequently",
-        ]
+        temporal_keywords = TEMPORAL_KEYWORDS
 
-    input_lower = input_query.lower()
-    sequences = 0
-    for kw in temporal_keywords:
-        matches = re.findall(r"\b" + re.escape(kw) + r"\b", input_lower)
-        sequences += len(matches)
-        printer.print_custom(
-            f"[Temporal Analysis] Temporal keyword '{kw}' occurrences: {len(matches)}"
-        )
-        with open(save_path, "a") as f:
-            f.write(
-                f"[Temporal Analysis] Temporal keyword '{kw}' occurrences: {len(matches)}"
-            )
+    counts = count_keywords(input_query, temporal_keywords)
+    sequences = sum(counts.values())
+    printer.print_custom(f"[Temporal Analysis] Temporal keyword occurrences: {dict(counts)}")
+    with open(save_path, "a") as f:
+        f.write(f"[Temporal Analysis] Temporal keyword occurrences: {dict(counts)}")
 
     # Normalize score
     score = min(sequences / sequence_threshold, 1.0)
@@ -3963,217 +4144,567 @@ def is_complex_temporal(
     return score
 
 
-# Function to combine all methods
+class KeywordScanner:
+    """
+    Counts whole-word keyword occurrences with one precompiled alternation.
 
+    A single scan of the lowercased text counts every keyword, instead of one regex
+    search per keyword.
+    """
 
-def is_complex_final(
-    input_query: str, output_full_score: bool = False
-) -> Tuple[bool, Plan]:
+    def __init__(self, keywords: List[str]):
+        self.keywords = list(dict.fromkeys(keyword.lower() for keyword in keywords))
+        # Longest first, so a keyword never loses to one of its prefixes
+        alternation = "|".join(re.escape(keyword) for keyword in sorted(self.keywords, key=len, reverse=True))
+        self.pattern = re.compile(r"\b(?:" + alternation + r")\b")
+
+    def count(self, text: str) -> Counter:
+        return Counter(match.group(0) for match in self.pattern.finditer(text.lower()))
+
+
+# One scanner for every keyword the cognitive, temporal and sentiment measures look for
+KEYWORD_SCANNER = KeywordScanner(list(COGNITIVE_RULES) + TEMPORAL_KEYWORDS + SENTIMENT_KEYWORDS)
+
+
+@lru_cache(maxsize=32)
+def _keyword_scanner(keywords: Tuple[str, ...]) -> KeywordScanner:
+    return KeywordScanner(list(keywords))
+
+
+def count_keywords(input_query: "str | QueryAnalysis", keywords: List[str]) -> Counter:
     """
-    Determines complexity using a comprehensive hybrid approach.
+    Occurrences of each of ``keywords`` found in the query.
+
+    The standard keyword lists share the query's single KEYWORD_SCANNER pass; other
+    lists get their own compiled scanner.
 
     Args:
-        input_query (str): The problem to solve.
+        input_query (str | QueryAnalysis): The query to scan.
+        keywords (List[str]): Whole-word keywords, matched case-insensitively.
 
     Returns:
-        bool: True if complex, False otherwise.
+        Counter: Count of each keyword that occurs.
     """
-    # Method 1: NLP Dependency Parsing
-    score_nlp = is_complex_nlp_dependency(input_query)
-    with open(save_path, "a") as f:
-        f.write(f"\n[NLP Dependency Parsing] Score: {score_nlp}\n\n")
+    wanted = [keyword.lower() for keyword in keywords]
+    if set(wanted) <= set(KEYWORD_SCANNER.keywords):
+        counts = QueryAnalysis.of(input_query).keyword_counts
+    else:
+        counts = _keyword_scanner(tuple(wanted)).count(str(input_query))
+    return Counter({keyword: counts[keyword] for keyword in wanted if counts[keyword]})
 
-    # Method 2: Semantic Role Labeling
-    # score_srl = is_complex_srl(input_query)
-    score_srl = is_complex_spacy_srl(input_query)
-    with open(save_path, "a") as f:
-        f.write(f"[Semantic Role Labeling] Score: {score_srl}\n\n")
-    # Method 3: Machine Learning Classification
-    score_ml = is_complex_ml(input_query)
-    with open(save_path, "a") as f:
-        f.write(f"[Machine Learning Classification] Score: {score_ml}\n\n")
 
-    # Method 4: Language Model-Based Analysis
-    score_llm, plan = is_complex_llm(input_query)
-    with open(save_path, "a") as f:
-        f.write(f"[Language Model] Score: {score_llm}\n\n")
+def keyword_counts(input_queries: List["str | QueryAnalysis"], keywords: List[str]) -> np.ndarray:
+    """
+    Whole-word occurrences of each keyword in each query, from one sparse pass over the batch.
 
-    # Method 6: Graph-Based Approach
-    score_graph = is_complex_graph(input_query)
-    with open(save_path, "a") as f:
-        f.write(f"[Graph-Based Approach] Score: {score_graph}\n\n")
+    Args:
+        input_queries (List[str | QueryAnalysis]): Queries to scan.
+        keywords (List[str]): Single-word keywords, matched case-insensitively.
 
-    # Method 7: Recursive Task Decomposition
-    score_recursive = is_complex_recursive(input_query)
-    with open(save_path, "a") as f:
-        f.write(f"[Recursive Task Decomposition] Score: {score_recursive}\n\n")
+    Returns:
+        np.ndarray: Counts with one row per query and one column per keyword.
+    """
+    counter = CountVectorizer(vocabulary=list(dict.fromkeys(keywords)), token_pattern=r"(?u)\b\w+\b")
+    counts = counter.transform([str(query) for query in input_queries]).toarray()
+    return counts[:, [counter.vocabulary_[keyword] for keyword in keywords]]
+
+
+def is_complex_cognitive_batch(
+    input_queries: List["str | QueryAnalysis"], complexity_threshold: float = 5.0
+) -> List[float]:
+    """is_complex_cognitive for many queries, with the keyword rules applied as one matrix product."""
+    points = keyword_counts(input_queries, list(COGNITIVE_RULES)) @ np.array(list(COGNITIVE_RULES.values()))
+    return [min(score / complexity_threshold, 1.0) for score in points]
+
+
+def is_complex_temporal_batch(
+    input_queries: List["str | QueryAnalysis"], sequence_threshold: int = 3
+) -> List[float]:
+    """is_complex_temporal for many queries, counted in one pass."""
+    sequences = keyword_counts(input_queries, TEMPORAL_KEYWORDS).sum(axis=1)
+    return [min(count / sequence_threshold, 1.0) for count in sequences]
+
+
+# Measures of the is_complex_final ensemble, in reporting order. The spaCy measures
+# share one serial group so they take turns on the pipeline; is_complex_llm is
+# required because the plan it returns drives the rest of the run, and is bounded by
+# the LLM call timeouts rather than its own. cost is the expected runtime in seconds
+# (the first spaCy measure pays for the shared parse) and orders the cascade until
+# real durations are observed.
+COMPLEXITY_MEASURES = [
+    Measure("nlp", is_complex_nlp_dependency, pool="process", serial_group="spacy", label="NLP Dependency Parsing", cost=1.0),
+    Measure("srl", is_complex_spacy_srl, pool="process", serial_group="spacy", label="Semantic Role Labeling", cost=1.0, bounds=(-1.0, 1.0)),
+    Measure("ml", is_complex_ml, pool="inline", label="Machine Learning Classification", cost=0.05, batch=is_complex_ml_batch),
+    Measure("llm", is_complex_llm, pool="thread", timeout=None, required=True, label="Language Model", cost=30.0),
+    Measure("graph", is_complex_graph, pool="process", serial_group="spacy", label="Graph-Based Approach", cost=1.0),
+    Measure("recursive", is_complex_recursive, pool="process", serial_group="spacy", label="Recursive Task Decomposition", cost=1.0),
+    Measure("ontology", is_complex_ontology, pool="thread", timeout=15.0, label="Ontological Mapping", cost=0.5),
+    Measure("cognitive", is_complex_cognitive, pool="inline", label="Cognitive Complexity Metrics", cost=0.01, batch=is_complex_cognitive_batch),
+    Measure("ast", is_complex_ast, pool="process", serial_group="spacy", label="AST Generation", cost=1.0),
+    Measure("stat", is_complex_statistical, pool="inline", label="Statistical Analysis", cost=0.05, batch=is_complex_statistical_batch),
+    Measure("query_expansion", is_complex_query_expansion, pool="thread", timeout=45.0, label="Interactive Query Expansion", cost=5.0),
+    Measure("psycholinguistic", is_complex_psycholinguistic, pool="thread", timeout=15.0, label="Psycholinguistic Metrics", cost=2.0),
+    Measure("sentiment", is_complex_sentiment, pool="inline", label="Sentiment Analysis", cost=0.05),
+    Measure("theorem", is_complex_theorem_proving, pool="thread", timeout=10.0, label="Theorem Proving", cost=0.5),
+    Measure("entropy", is_complex_entropy, pool="inline", label="Entropy Measure", cost=0.01),
+    Measure("temporal", is_complex_temporal, pool="inline", label="Temporal Analysis", cost=0.01, batch=is_complex_temporal_batch),
+]
+
+# Weight of each measure in the total score; measures weighted 0 only run when requested
+COMPLEXITY_WEIGHTS = {
+    "nlp": 0.1,
+    "srl": 0.05,
+    "ml": 0.10,
+    "llm": 0.4,
+    "graph": 0.1,
+    "recursive": 0.00,
+    "ontology": 0.00,
+    "cognitive": 0.000,
+    "ast": 0.1,
+    "stat": 0.00,
+    "query_expansion": 0.05,
+    "psycholinguistic": 0.000,
+    "sentiment": 0.00,
+    "theorem": 0.000,
+    "entropy": 0.10,
+    "temporal": 0.000,
+}
+
+COMPLEXITY_THRESHOLD = 0.5
+
+# Per-measure latency profile, kept across runs for time-budgeted assessments
+latency_profile_path: Optional[str] = "complexity_latency_profile.json"
+
+measure_executor = MeasureExecutor()
+measure_executor.load_profile(latency_profile_path)
+
+
+def configure_measure_executor(
+    thread_workers: Optional[int] = None,
+    process_workers: Optional[int] = None,
+    profile_path: Optional[str] = "",
+) -> MeasureExecutor:
+    """
+    Replaces the executor used by is_complex_final, keeping its latency profile.
 
-    # Method 8: Ontological Mapping
-    score_ontology = is_complex_ontology(input_query)
-    with open(save_path, "a") as f:
-        f.write(f"[Ontological Mapping] Score: {score_ontology}\n\n")
+    Args:
+        thread_workers (Optional[int]): Thread pool size; None keeps the current one.
+        process_workers (Optional[int]): Process pool size for the spaCy measures; 0 runs them on threads.
+        profile_path (Optional[str]): File the latency profile is loaded from and saved to;
+            "" keeps the current one and None keeps the profile in memory only.
 
-    # Method 9: Cognitive Complexity Metrics
-    score_cognitive = is_complex_cognitive(input_query)
-    with open(save_path, "a") as f:
-        f.write(f"[Cognitive Complexity Metrics] Score: {score_cognitive}\n\n")
+    Returns:
+        MeasureExecutor: The new executor.
+    """
+    global measure_executor, latency_profile_path
+    previous = measure_executor
+    measure_executor = MeasureExecutor(
+        thread_workers=previous.thread_workers if thread_workers is None else thread_workers,
+        process_workers=previous.process_workers if process_workers is None else process_workers,
+    )
+    measure_executor.costs.update(previous.costs)
+    if profile_path != "" and profile_path != latency_profile_path:
+        latency_profile_path = profile_path
+        if profile_path:
+            measure_executor.load_profile(profile_path)
+    previous.shutdown()
+    return measure_executor
 
-    # Method 10: AST Generation
-    score_ast = is_complex_ast(input_query)
-    with open(save_path, "a") as f:
-        f.write(f"[AST Generation] Score: {score_ast}\n\n")
 
-    # Method 11: Statistical Analysis of Historical Data
-    score_stat = is_complex_statistical(input_query)
-    with open(save_path, "a") as f:
-        f.write(f"[Statistical Analysis] Score: {score_stat}\n\n")
+# Memo of finished assessments by normalized query (see complexity_cache); None turns it off
+complexity_cache_path: Optional[str] = DEFAULT_COMPLEXITY_CACHE_PATH
+complexity_cache_ttl_seconds: Optional[float] = DEFAULT_COMPLEXITY_CACHE_TTL_SECONDS
+# Bump when a change the source fingerprint cannot see (a prompt, a model route) should drop cached assessments
+COMPLEXITY_CACHE_VERSION = 1
 
-    # Method 13: Interactive Query Expansion
-    score_query_expansion = is_complex_query_expansion(input_query)
-    with open(save_path, "a") as f:
-        f.write(f"[Interactive Query Expansion] Score: {score_query_expansion}\n\n")
 
-    # Method 14: Psycholinguistic Metrics
-    score_psycholinguistic = is_complex_psycholinguistic(input_query)
-    with open(save_path, "a") as f:
-        f.write(f"[Psycholinguistic Metrics] Score: {score_psycholinguistic}\n\n")
+def configure_complexity_cache(
+    path: Optional[str] = "", ttl_seconds: Optional[float] = DEFAULT_COMPLEXITY_CACHE_TTL_SECONDS
+) -> None:
+    """
+    Points is_complex_final at another assessment cache, opened on first use.
 
-    # Method 16: Emotional Sentiment Analysis
-    score_sentiment = is_complex_sentiment(input_query)
-    with open(save_path, "a") as f:
-        f.write(f"[Sentiment Analysis] Score: {score_sentiment}\n\n")
+    Args:
+        path (Optional[str]): SQLite file of the cache; "" keeps the current one and None disables it.
+        ttl_seconds (Optional[float]): Entry lifetime; None keeps entries until the version changes.
+    """
+    global complexity_cache_path, complexity_cache_ttl_seconds
+    if path != "":
+        complexity_cache_path = path
+    complexity_cache_ttl_seconds = ttl_seconds
+    with _resources_lock:
+        previous = _resources.pop("complexity_cache", None)
+    if previous is not None:
+        previous.close()
+
+
+def _load_complexity_cache() -> Optional[ComplexityCache]:
+    if not complexity_cache_path:
+        return None
+    try:
+        cache = ComplexityCache(complexity_cache_path, ttl_seconds=complexity_cache_ttl_seconds)
+    except Exception as e:
+        logging.warning("Could not open complexity cache %s: %s", complexity_cache_path, e)
+        return None
+    cache.prune(complexity_cache_version())
+    return cache
 
-    # Method 17: Automated Theorem Proving Techniques
-    score_theorem = is_complex_theorem_proving(input_query)
-    with open(save_path, "a") as f:
-        f.write(f"[Theorem Proving] Score: {score_theorem}\n\n")
 
-    # Method 18: Computational Linguistics Complexity Measures
-    score_entropy = is_complex_entropy(input_query)
-    with open(save_path, "a") as f:
-        f.write(f"[Entropy Measure] Score: {score_entropy}\n\n")
+def get_complexity_cache() -> Optional[ComplexityCache]:
+    """The assessment cache is_complex_final reads first, or None if it is disabled."""
+    return _resource("complexity_cache", _load_complexity_cache)
 
-    # Method 19: Temporal Sequence Analysis
-    score_temporal = is_complex_temporal(input_query)
-    with open(save_path, "a") as f:
-        f.write(f"[Temporal Analysis] Score: {score_temporal}\n\n")
 
-    # average score_nlp, score_llm, and score_entropy
-    avg_nlp_llm_ent = (score_nlp + score_llm + score_entropy) / 3
-    printer.print_custom(
-        f"\n[Average NLP, LLM, Entropy] Average Score: {avg_nlp_llm_ent}\n\n"
-    )
-    with open(save_path, "a") as f:
-        f.write(f"\n[Average NLP, LLM, Entropy] Average Score: {avg_nlp_llm_ent}\n\n")
-
-    scores = {}
-    scores["nlp"] = score_nlp
-    scores["srl"] = score_srl
-    scores["ml"] = score_ml
-    scores["llm"] = score_llm
-    scores["graph"] = score_graph
-    scores["recursive"] = score_recursive
-    scores["ontology"] = score_ontology
-    scores["cognitive"] = score_cognitive
-    scores["ast"] = score_ast
-    scores["stat"] = score_stat
-    scores["query_expansion"] = score_query_expansion
-    scores["psycholinguistic"] = score_psycholinguistic
-    scores["sentiment"] = score_sentiment
-    scores["theorem"] = score_theorem
-    scores["entropy"] = score_entropy
-    scores["temporal"] = score_temporal
-
-    # average scores after removing outliers
-    raw_scores = [
-        score_nlp,
-        score_srl,
-        score_ml,
-        score_llm,
-        score_graph,
-        score_recursive,
-        score_ontology,
-        score_cognitive,
-        score_ast,
-        score_stat,
-        score_query_expansion,
-        score_psycholinguistic,
-        score_sentiment,
-        score_theorem,
-        score_entropy,
-        score_temporal,
-    ]
-    # remove outliers by the z-score method
-    z_scores = stats.zscore(raw_scores)
-    threshold = 2
-    scores_without_outliers = [
-        score for score, z_score in zip(raw_scores, z_scores) if z_score < threshold
+@lru_cache(maxsize=None)
+def _measure_sources() -> Tuple[str, ...]:
+    # The measures and everything they score with; helpers such as the plan conversion live in this module
+    modules = [sys.modules[__name__]] + [
+        inspect.getmodule(obj) for obj in (MeasureExecutor, ComplexityLearner, QueryIndex, LexiconTable)
     ]
-    avg_score_without_outliers = sum(scores_without_outliers) / len(
-        scores_without_outliers
-    )
+    sources = []
+    for module in modules:
+        try:
+            sources.append(inspect.getsource(module))
+        except (OSError, TypeError):
+            sources.append(module.__name__)
+    return tuple(sources)
+
 
-    df_finetune = pd.DataFrame(
+def complexity_cache_version() -> str:
+    """Version of cached assessments; changes with the measure code, weights, threshold or spaCy tier."""
+    return fingerprint(
+        _measure_sources(),
         {
-            "query": [input_query],
-            "complex": avg_score_without_outliers,
-        }
+            "version": COMPLEXITY_CACHE_VERSION,
+            "weights": COMPLEXITY_WEIGHTS,
+            "threshold": COMPLEXITY_THRESHOLD,
+            "spacy_tier": spacy_tier,
+            "measures": [(m.name, m.timeout, m.default, m.required) for m in COMPLEXITY_MEASURES],
+        },
     )
-    finetune_ml_model(df_finetune, model_path_ml)
-
-    # Assign weights to each method
-    weights = {
-        "nlp": 0.1,
-        "srl": 0.05,
-        "ml": 0.10,
-        "llm": 0.4,
-        "graph": 0.1,
-        "recursive": 0.00,
-        "ontology": 0.00,
-        "cognitive": 0.000,
-        "ast": 0.1,
-        "stat": 0.00,
-        "query_expansion": 0.05,
-        "psycholinguistic": 0.000,
-        "sentiment": 0.00,
-        "theorem": 0.000,
-        "entropy": 0.10,
-        "temporal": 0.000,
-    }
 
-    # Calculate total weighted score
-    total_score = (
-        score_nlp * weights["nlp"]
-        + score_srl * weights["srl"]
-        + score_ml * weights["ml"]
-        + score_llm * weights["llm"]
-        + score_graph * weights["graph"]
-        + score_recursive * weights["recursive"]
-        + score_ontology * weights["ontology"]
-        + score_cognitive * weights["cognitive"]
-        + score_ast * weights["ast"]
-        + score_stat * weights["stat"]
-        + score_query_expansion * weights["query_expansion"]
-        + score_psycholinguistic * weights["psycholinguistic"]
-        + score_sentiment * weights["sentiment"]
-        + score_theorem * weights["theorem"]
-        + score_entropy * weights["entropy"]
-        + score_temporal * weights["temporal"]
+
+class ComplexityAssessment(BaseModel):
+    """
+    Outcome of score_complexity."""
+
+    total_score: float = Field(..., description="Weighted score over the evaluated measures.")
+    is_complex: bool = Field(..., description="Whether total_score exceeds the complexity threshold.")
+    plan: Optional[Plan] = Field(None, description="Plan generated by is_complex_llm, if it ran.")
+    scores: Dict[str, float] = Field(..., description="Score of every evaluated measure.")
+    skipped: List[str] = Field(default_factory=list, description="Weighted measures left out of total_score.")
+    timings: List[str] = Field(default_factory=list, description="Per-measure durations, slowest first.")
+    measures_used: List[str] = Field(default_factory=list, description="Weighted measures behind total_score.")
+    confidence: float = Field(
+        1.0, description="Share of the ensemble's weight behind total_score (1.0 when every weighted measure ran)."
     )
+    time_budget: Optional[float] = Field(None, description="Latency budget in seconds, if one was given.")
 
+
+def _measure_score(value) -> float:
+    # is_complex_llm returns (score, plan)
+    return value[0] if isinstance(value, tuple) else value
+
+
+def _weighted_bounds(
+    results: Dict[str, MeasureResult], measures: List[Measure]
+) -> Tuple[float, float]:
+    """Lowest and highest total score still reachable given the results so far."""
+    known = sum(
+        COMPLEXITY_WEIGHTS[name] * _measure_score(result.value) for name, result in results.items()
+    )
+    pending = [measure for measure in measures if measure.name not in results]
+    low = known + sum(COMPLEXITY_WEIGHTS[m.name] * m.bounds[0] for m in pending)
+    high = known + sum(COMPLEXITY_WEIGHTS[m.name] * m.bounds[1] for m in pending)
+    return low, high
+
+
+def select_measures(time_budget: float) -> List[Measure]:
+    """
+    Picks the weighted measures expected to finish within time_budget seconds.
+
+    Measures are considered by weight, heaviest first, and added while the executor's
+    latency profile predicts the set still fits. If none fits, the cheapest one is used.
+
+    Args:
+        time_budget (float): Seconds available for the assessment.
+
+    Returns:
+        List[Measure]: The chosen measures, in COMPLEXITY_MEASURES order.
+    """
+    weighted = [measure for measure in COMPLEXITY_MEASURES if COMPLEXITY_WEIGHTS.get(measure.name)]
+    chosen: List[Measure] = []
+    for measure in sorted(weighted, key=lambda m: (-COMPLEXITY_WEIGHTS[m.name], measure_executor.cost(m))):
+        if measure_executor.estimate(chosen + [measure]) <= time_budget:
+            chosen.append(measure)
+    if not chosen and weighted:
+        chosen = [min(weighted, key=measure_executor.cost)]
+    return [measure for measure in weighted if measure in chosen]
+
+
+def score_complexity(
+    input_query: str,
+    early_exit: bool = True,
+    need_plan: bool = True,
+    extra_measures: Optional[List[str]] = None,
+    time_budget: Optional[float] = None,
+) -> ComplexityAssessment:
+    """
+    Scores the complexity of a query with the weighted COMPLEXITY_MEASURES.
+
+    Measures weighted 0 are skipped unless named in extra_measures. With early_exit
+    the weighted measures run cheapest first (by observed cost) and stop once the
+    unevaluated weight can no longer move the total across COMPLEXITY_THRESHOLD;
+    the total then only covers the evaluated measures.
+
+    With a time_budget, only the measures select_measures expects to fit are run,
+    each limited to the budget, and the total is renormalized over the weights of
+    those that succeeded. is_complex_llm only runs if it fits, so the plan may be None.
+
+    Args:
+        input_query (str): The problem to solve.
+        early_exit (bool): Stop once the decision is settled; False computes every weighted measure.
+        need_plan (bool): Always run is_complex_llm for its plan; False lets the cascade skip it.
+        extra_measures (Optional[List[str]]): Zero-weight measures to compute as well.
+        time_budget (Optional[float]): Seconds the assessment may take; None runs the full ensemble.
+
+    Returns:
+        ComplexityAssessment: Total score, decision, plan, per-measure scores, the measures
+            used and skipped, and the share of the ensemble weight behind the score.
+    """
+    weighted = [
+        measure if need_plan or measure.name != "llm" else dataclasses.replace(measure, required=False)
+        for measure in COMPLEXITY_MEASURES
+        if COMPLEXITY_WEIGHTS.get(measure.name)
+    ]
+    extras = [measure for measure in COMPLEXITY_MEASURES if measure.name in (extra_measures or [])]
+    extras = [measure for measure in extras if measure not in weighted]
+    analysis = QueryAnalysis(input_query, disable=spacy_disable_for([m.name for m in weighted + extras]))
+
+    def decided(results: Dict[str, MeasureResult]) -> bool:
+        low, high = _weighted_bounds(results, weighted)
+        return low > COMPLEXITY_THRESHOLD or high <= COMPLEXITY_THRESHOLD
+
+    if time_budget is not None:
+        budgeted = [
+            dataclasses.replace(
+                measure,
+                required=False,
+                timeout=time_budget if measure.timeout is None else min(measure.timeout, time_budget),
+            )
+            for measure in select_measures(time_budget)
+        ]
+        # Failed or late measures are left out rather than scored with their default
+        results = {name: result for name, result in measure_executor.run(budgeted, analysis).items() if result.ok}
+    elif early_exit:
+        results = measure_executor.run_cascade(weighted, analysis, decided)
+    else:
+        results = measure_executor.run(weighted, analysis)
+    if extras:
+        results.update(measure_executor.run(extras, analysis))
+    if latency_profile_path:
+        measure_executor.save_profile(latency_profile_path)
+
+    scores = {name: _measure_score(result.value) for name, result in results.items()}
+    plan = results["llm"].value[1] if "llm" in results and isinstance(results["llm"].value, tuple) else None
+    used = [measure.name for measure in weighted if measure.name in results]
+    used_weight = sum(COMPLEXITY_WEIGHTS[name] for name in used)
+    total_weight = sum(COMPLEXITY_WEIGHTS[measure.name] for measure in weighted)
+    total_score = sum(scores[name] * COMPLEXITY_WEIGHTS[name] for name in used)
+    if time_budget is not None:
+        total_score = total_score / used_weight if used_weight else 0.0
+    return ComplexityAssessment(
+        total_score=total_score,
+        is_complex=total_score > COMPLEXITY_THRESHOLD,
+        plan=plan,
+        scores=scores,
+        skipped=[measure.name for measure in weighted if measure.name not in results],
+        timings=timings(results),
+        measures_used=used,
+        confidence=used_weight / total_weight if total_weight else 0.0,
+        time_budget=time_budget,
+    )
+
+
+# Function to combine all methods
+def is_complex_final(
+    input_query: str,
+    output_full_score: bool = False,
+    label_measures: Optional[List[str]] = None,
+    time_budget: Optional[float] = None,
+    use_cache: bool = True,
+) -> Tuple[bool, Plan]:
+    """
+    Determines complexity using a comprehensive hybrid approach.
+
+    The measures run concurrently on measure_executor and share one QueryAnalysis,
+    so the query is parsed and tokenized once; a measure that fails or misses its
+    timeout contributes its default score. When only the decision is needed, the
+    cascade in score_complexity stops as soon as it is settled. With a time_budget
+    only the measures expected to fit are run (see score_complexity), and the plan
+    is None unless is_complex_llm fits the budget.
+
+    The complexity cache is read first. A query assessed before, ignoring case and
+    whitespace, returns its stored score and plan without running any measure or
+    queueing a training example. Full scores only come from entries that scored
+    every weighted measure; budgeted assessments are never stored.
+
+    Args:
+        input_query (str): The problem to solve.
+        output_full_score (bool): Return the total score instead of the decision.
+        label_measures (Optional[List[str]]): Zero-weight measures to compute for the
+            fine-tuning label; by default the label uses the weighted measures. Only
+            assessments that scored every weighted measure (output_full_score, or a
+            cascade that skipped nothing) become training examples.
+        time_budget (Optional[float]): Seconds the assessment may take, e.g. 0.3 for
+            interactive requests; None runs the full ensemble.
+        use_cache (bool): Read and fill the complexity cache.
+
+    Returns:
+        bool: True if complex, False otherwise.
+    """
+    cache = get_complexity_cache() if use_cache else None
+    version = complexity_cache_version() if cache is not None else None
+    cached = cache.get(input_query, version, complete=output_full_score) if cache is not None else None
+    if cached is not None:
+        assessment = ComplexityAssessment.model_validate(cached)
+        printer.print_custom(f"[Complexity Cache] Hit, Total Weighted Score: {assessment.total_score}")
+        with open(save_path, "a") as f:
+            f.write(f"[Complexity Cache] Hit, Total Weighted Score: {assessment.total_score}\n\n")
+        return (
+            (assessment.is_complex, assessment.plan)
+            if not output_full_score
+            else (assessment.total_score, assessment.plan)
+        )
+
+    assessment = score_complexity(
+        input_query,
+        early_exit=not output_full_score,
+        extra_measures=label_measures,
+        time_budget=time_budget,
+    )
+    scores = assessment.scores
+    plan = assessment.plan
+    with open(save_path, "a") as f:
+        for measure in COMPLEXITY_MEASURES:
+            if measure.name in scores:
+                f.write(f"[{measure.label}] Score: {scores[measure.name]}\n\n")
+        f.write("[Measure Timings] " + ", ".join(assessment.timings) + "\n\n")
+        if assessment.skipped:
+            f.write("[Skipped Measures] " + ", ".join(assessment.skipped) + "\n\n")
+        if time_budget is not None:
+            f.write(
+                f"[Time Budget] {time_budget}s, measures used: {', '.join(assessment.measures_used)}, "
+                f"confidence: {assessment.confidence:.2f}\n\n"
+            )
+
+    # average score_nlp, score_llm, and score_entropy
+    if all(name in scores for name in ("nlp", "llm", "entropy")):
+        avg_nlp_llm_ent = (scores["nlp"] + scores["llm"] + scores["entropy"]) / 3
+        printer.print_custom(
+            f"\n[Average NLP, LLM, Entropy] Average Score: {avg_nlp_llm_ent}\n\n"
+        )
+        with open(save_path, "a") as f:
+            f.write(f"\n[Average NLP, LLM, Entropy] Average Score: {avg_nlp_llm_ent}\n\n")
+
+    # Only a full ensemble labels a training example: budgeted and early-exit assessments
+    # score a subset that depends on cost order and timing, which would make the label noisy
+    if time_budget is None and not assessment.skipped:
+        # average scores after removing outliers
+        raw_scores = list(scores.values())
+        # remove outliers by the z-score method
+        z_scores = stats.zscore(raw_scores)
+        threshold = 2
+        scores_without_outliers = [
+            score for score, z_score in zip(raw_scores, z_scores) if z_score < threshold
+        ] or raw_scores  # identical scores have no z-score
+        avg_score_without_outliers = sum(scores_without_outliers) / len(
+            scores_without_outliers
+        )
+
+        # Learned on a background thread; this call only queues the example
+        get_ml_learner().submit(input_query, avg_score_without_outliers)
+
+    # A budgeted run's scores depend on timing, so it is not remembered; an early exit
+    # is, as a partial entry that only answers later yes/no questions
+    if cache is not None and time_budget is None:
+        cache.put(input_query, version, assessment.model_dump(mode="json"), complete=not assessment.skipped)
+
+    total_score = assessment.total_score
     printer.print_custom(f"[Final Assessment] Total Weighted Score: {total_score}")
     with open(save_path, "a") as f:
         f.write(f"[Final Assessment] Total Weighted Score: {total_score}")
 
-    # Define a threshold for complexity
-    complexity_threshold = 0.5
     return (
-        (total_score > complexity_threshold, plan)
+        (assessment.is_complex, plan)
         if not output_full_score
         else (total_score, plan)
     )
 
 
+def is_complex_final_batch(
+    input_queries: List[str],
+    need_plan: bool = True,
+    extra_measures: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """
+    Scores many queries with the weighted COMPLEXITY_MEASURES at once.
+
+    The queries are parsed with one batched spaCy pass. Measures with a batch function
+    (ML classifier, statistical similarity, keyword scans) score the whole batch in one
+    call; the others, including is_complex_llm, run once per query side by side on
+    measure_executor, so the LLM calls are paced by the gateway's rate limiter. Every
+    weighted measure runs (no early exit), and failed measures contribute their default.
+
+    Args:
+        input_queries (List[str]): Queries to score.
+        need_plan (bool): Run is_complex_llm and return its plans; False leaves it out
+            and renormalizes the weights over the other measures.
+        extra_measures (Optional[List[str]]): Zero-weight measures to compute as well.
+
+    Returns:
+        pd.DataFrame: One row per query with its text, a column per measure score, and
+            total_score, is_complex and plan.
+    """
+    # One failed plan should not fail the whole batch, so no measure is required here
+    measures = [
+        dataclasses.replace(measure, required=False)
+        for measure in COMPLEXITY_MEASURES
+        if (COMPLEXITY_WEIGHTS.get(measure.name) or measure.name in (extra_measures or []))
+        and (need_plan or measure.name != "llm")
+    ]
+    names = [measure.name for measure in measures]
+    analyses = QueryAnalysis.batch(
+        list(input_queries),
+        disable=spacy_disable_for(names),
+        parse=any(name in SPACY_MEASURE_DISABLE for name in names),
+    )
+    started = time.perf_counter()
+    results = measure_executor.run_batch(measures, analyses)
+    printer.print_custom(
+        f"[Batch Assessment] {len(analyses)} queries in {time.perf_counter() - started:.2f}s"
+    )
+
+    total_weight = sum(COMPLEXITY_WEIGHTS.get(name, 0.0) for name in names)
+    rows = []
+    for query, result in zip(input_queries, results):
+        scores = {name: _measure_score(result[name].value) for name in names}
+        total_score = sum(scores[name] * COMPLEXITY_WEIGHTS.get(name, 0.0) for name in names)
+        if not need_plan and total_weight:
+            total_score /= total_weight
+        llm_value = result["llm"].value if "llm" in result else None
+        rows.append(
+            {
+                "query": query,
+                **scores,
+                "total_score": total_score,
+                "is_complex": total_score > COMPLEXITY_THRESHOLD,
+                "plan": llm_value[1] if isinstance(llm_value, tuple) else None,
+            }
+        )
+    return pd.DataFrame(rows, columns=["query", *names, "total_score", "is_complex", "plan"])
+
+
 # Example Usage and Testing
 if __name__ == "__main__":
     debug_ind = DEBUG_INDICATOR if DEBUG_INDICATOR else False
@@ -13,6 +13,11 @@ import os
 import re
 import json
 
+import llm_deadline
+import llm_gateway
+import llm_ledger
+import llm_scheduler
+
 from assistant_personalities import assistant_personalities, assistant_instructions
 from schema import ConversationInput
 from pydantic import BaseModel, Field, ValidationError
@@ -63,9 +68,6 @@ class ErrorResult(BaseModel):
     error_details: Optional[str] = Field(None, description="Additional error details")
     timestamp: datetime = Field(default_factory=datetime.now, description="When the error occurred")
 
-# Default fallback values for type safety
-DEFAULT_OUTPUT_TYPE = OutputType(output_type="simple_text", file_extension="txt")
-
 # Configuration constants for output type matching
 DEFAULT_FALLBACK_OUTPUT_TYPE = "Simple Concise Answer"
 MINIMUM_SIMILARITY_THRESHOLD = 0.1
@@ -95,6 +97,10 @@ class OutputType(BaseModel):
     file_extension: str = Field(..., description="The file extension for the output.")
 
 
+# Default fallback values for type safety
+DEFAULT_OUTPUT_TYPE = OutputType(output_type="simple_text", file_extension="txt")
+
+
 output_functions = [
     {
         "name": "generate_simple_concise_answer_message",
@@ -220,7 +226,6 @@ output_type_experts = {
 
 # Set your OpenAI API key as an environment variable
 openai.api_key = os.getenv("OPENAI_API_KEY")
-client = openai.OpenAI()
 
 
 class ConversationMemory:
@@ -374,7 +379,8 @@ def summarize_conversation(conversation_history: List[Dict[str, str]]) -> str:
 
     # Use the OpenAI client to summarize the conversation
     try:
-        completion = client.chat.completions.create(
+        completion = llm_gateway.chat_sync(
+            call_site="summarize_conversation",
             model="gpt-4o-mini",  # Replace with the appropriate model
             messages=[
                 {
@@ -481,7 +487,8 @@ Please return the output as a JSON object with the following structure:
 
     try:
         # Make the API call to OpenAI's chat completions
-        completion = client.beta.chat.completions.parse(
+        completion = llm_gateway.parse_sync(
+            call_site="extract_information",
             model="gpt-4o-mini",  # Replace with the appropriate model if necessary
             messages=messages,
             response_format=ExtractFormat,
@@ -562,7 +569,8 @@ def cast_binary_vote(assistant_name: str, messages: List[Dict[str, str]], vote_p
     # Ask the assistant to cast a vote based on the messages
     messages.append({"role": "system", "content": vote_prompt})
     try:
-        response = client.beta.chat.completions.parse(
+        response = llm_gateway.parse_sync(
+            call_site="cast_binary_vote",
             model="gpt-4o-mini",  # Specify the model
             messages=messages,  # Pass the messages directly as a list of dicts
             response_format=BinaryVote,
@@ -587,7 +595,8 @@ def cast_confidence_vote(
     # Ask the assistant to cast a confidence vote based on the messages
     messages.append({"role": "system", "content": vote_prompt})
     try:
-        response = client.beta.chat.completions.parse(
+        response = llm_gateway.parse_sync(
+            call_site="cast_confidence_vote",
             model="gpt-4o-mini",  # Specify the model
             messages=messages,  # Pass the messages directly as a list of dicts
             response_format=ConfidenceVote,
@@ -621,7 +630,8 @@ def define_problem(problem_statement, selected_personalities, previous_def_round
             },
         ]
         try:
-            response = client.chat.completions.create(
+            response = llm_gateway.chat_sync(
+                call_site="define_problem",
                 model="gpt-4o-mini",  # Specify the model
                 messages=messages,  # Pass the messages directly as a list of dicts
             )
@@ -712,7 +722,8 @@ def define_problem(problem_statement, selected_personalities, previous_def_round
             else:
                 no_votes += 1
                 no_voters.append(assistant_name)
-                print(f"\nNo Vote from {assistant_name} on the consensus problem statement.\n")        else:
+                print(f"\nNo Vote from {assistant_name} on the consensus problem statement.\n")
+        else:
             # Handle binary vote errors more gracefully
             print(f"⚠️  Error getting vote from {assistant_name}: {binary_vote}")
             no_votes += 1  # Count errors as no votes for safety
@@ -974,7 +985,8 @@ def output_type_determination(response) -> Union[OutputType, ErrorResult]:
         },
     ]
     try:
-        response = client.beta.chat.completions.parse(
+        response = llm_gateway.parse_sync(
+            call_site="output_type_determination",
             model="gpt-4o-mini",  # Specify the model
             messages=messages,  # Pass the messages directly as a list of dicts
             response_format=OutputType,
@@ -1013,7 +1025,8 @@ def test_finalize_output(final_decision: str, output_type: str):
 
     # Make the API call with function calling
     try:
-        response = client.chat.completions.create(
+        response = llm_gateway.chat_sync(
+            call_site="test_finalize_output",
             model="gpt-4o-mini",
             messages=messages,
             tools=tools,
@@ -1095,7 +1108,8 @@ def finalize_output(final_decision: str, output_type: OutputType):
 
     # Make the API call with function calling
     try:
-        response = client.chat.completions.create(
+        response = llm_gateway.chat_sync(
+            call_site="finalize_output",
             model="gpt-4o-mini",
             messages=messages,
             tools=tools,
@@ -1786,7 +1800,8 @@ def final_output_correction(
 
     # Make the API call to correct the final output using structured outputs with beta.chat.completions.parse
     try:
-        response = client.beta.chat.completions.parse(
+        response = llm_gateway.parse_sync(
+            call_site="final_output_correction",
             model="gpt-4o" if version_counter <= 1 else "gpt-4o-mini",
             messages=messages,  # Pass the messages directly as a list of dicts
             response_format=FinalOutput,
@@ -1881,7 +1896,8 @@ def analyze_final_output(
         # Make the API call to analyze the final output using structured outputs with beta.chat.completions.parse
         try:
             model_ = "gpt-4o" if first_analysis else "gpt-4o-mini"
-            response = client.beta.chat.completions.parse(
+            response = llm_gateway.parse_sync(
+                call_site="analyze_final_output",
                 model=model_,  # Specify the model
                 messages=messages,  # Pass the messages directly as a list of dicts
                 response_format=FinalOutputAnalysis,
@@ -1891,6 +1907,10 @@ def analyze_final_output(
             print(
                 f"\nFinal Output: {final_output}\n, version_counter: {version_counter}\n"
             )
+        except llm_scheduler.LLMTimeoutError as e:
+            # Out of time: keep the latest version rather than analysing it again
+            print(f"Analysis of final output timed out in version {version_counter}: {e}")
+            return output_object.final_output
         except Exception as e:
             print(
                 f"Error in analyze_final_output: {str(e)} on line {e.__traceback__.tb_lineno} in version {version_counter}"
@@ -1997,7 +2017,8 @@ def analyze_to_do_list(conversation_memory, conversation_history):
     ]
     # Make the API call to analyze the to-do list using structured outputs with beta.chat.completions.parse
     try:
-        response = client.beta.chat.completions.parse(
+        response = llm_gateway.parse_sync(
+            call_site="analyze_to_do_list",
             model="gpt-4o-mini",  # Specify the model
             messages=messages,  # Pass the messages directly as a list of dicts
             response_format=TaskList,
@@ -2083,6 +2104,8 @@ def get_assistant_response(
 
     if memory_summary != "":
         messages.append(
+            {"role": "system", "content": f"Conversation Memory:\n{memory_summary}"}
+        )
     if initial_prompt:
         messages.append({"role": "user", "content": initial_prompt})
 
@@ -2110,7 +2133,8 @@ def get_assistant_response(
     # Update the OpenAI call to use the correct method
     try:
 
-        response = client.chat.completions.create(
+        response = llm_gateway.chat_sync(
+            call_site="get_assistant_response",
             model="gpt-4o-mini",  # Specify the model
             messages=messages,  # Pass the messages directly as a list of dicts
             max_completion_tokens=token_limit,
@@ -2136,8 +2160,14 @@ class MediatorReviseOrDecide(BaseModel):
 
 
 def run_conversation(
-    problem_statement, selected_personalities, lead_personality, num_rounds=3, context=None
+    problem_statement,
+    selected_personalities,
+    lead_personality,
+    num_rounds=3,
+    context=None,
+    timeout_seconds=None,
 ):
+    """Run the multi-assistant conversation; `timeout_seconds` bounds all of its LLM calls."""
     if isinstance(problem_statement, list) and problem_statement and isinstance(problem_statement[0], dict) and "content" in problem_statement[0]:
         original_prompt = problem_statement[0]["content"]
     elif isinstance(problem_statement, str):
@@ -2145,6 +2175,18 @@ def run_conversation(
     else:
         # Fallback or error handling if problem_statement is not in expected format
         original_prompt = str(problem_statement) # Or raise an error
+
+    ledger_start = llm_gateway.get_gateway().ledger.mark()
+    # Both are restored even if the run raises, so a spent deadline cannot leak into later runs
+    with llm_ledger.labels(task=original_prompt[:100], round=0), llm_deadline.deadline(timeout_seconds):
+        return _run_conversation(
+            original_prompt, selected_personalities, lead_personality, num_rounds, context, ledger_start
+        )
+
+
+def _run_conversation(
+    original_prompt, selected_personalities, lead_personality, num_rounds, context, ledger_start
+):
 
     original_prompt = (
         "The Primary User has provided the following prompt, from which the problem statement will be defined: "
@@ -2207,6 +2249,7 @@ def run_conversation(
 
     for rnd in range(num_rounds):
         print(f"Round {rnd + 1} of {num_rounds} \n")
+        llm_ledger.set_labels(round=rnd + 1)
 
         if rnd > 0:
             # Summarize the conversation so far
@@ -2265,7 +2308,8 @@ def run_conversation(
             )
             try:
                 # TODO: Make this votable by the assistants
-                response = client.beta.chat.completions.parse(
+                response = llm_gateway.parse_sync(
+                    call_site="run_conversation.mediator_output_type",
                     model="gpt-4o-mini",  # Specify the model
                     messages=[
                         {"role": "system", "content": mediator_prompt},
@@ -2278,7 +2322,8 @@ def run_conversation(
                 )
                 # Extract the output type from the response
                 output_type = response.choices[0].message.parsed
-                print(f"\nMediator Output Type Decision: {output_type}\n")            except Exception as e:
+                print(f"\nMediator Output Type Decision: {output_type}\n")
+            except Exception as e:
                 # TODO: Implement better fallback strategy for output type determination
                 print(f"\nError in Mediator Output Type Decision: {str(e)}\n")
                 output_type = DEFAULT_OUTPUT_TYPE  # Use safe fallback instead of error string
@@ -2649,7 +2694,8 @@ def run_conversation(
                             "role": "system",
                             "content": f"Final Decision: {safe_get_message_field(final_decision_response, 'content', 'No decision content')}",
                         },
-                    ]                    final_binary_vote = cast_binary_vote(
+                    ]
+                    final_binary_vote = cast_binary_vote(
                         assistant_name, final_vote_messages, final_vote_prompt
                     )
                     # Handle both successful votes and errors
@@ -2668,7 +2714,7 @@ def run_conversation(
                 # Calculate total participation for voting validation
                 total_votes = yes_votes + no_votes
                 total_assistants = len(assistant_priorities)
-                  print(f"📊 Final Vote Results: {yes_votes} YES, {no_votes} NO (Total: {total_votes}/{total_assistants} assistants)")
+                print(f"📊 Final Vote Results: {yes_votes} YES, {no_votes} NO (Total: {total_votes}/{total_assistants} assistants)")
                 
                 # Check if the final decision is confirmed - Enhanced with tie-breaking and edge case handling
                 
@@ -2689,7 +2735,8 @@ def run_conversation(
                         {"role": "user", "content": f"Problem Statement: {problem_definition}"}
                     ]
                     try:
-                        mediator_emergency_response = client.beta.chat.completions.parse(
+                        mediator_emergency_response = llm_gateway.parse_sync(
+                            call_site="run_conversation.mediator_emergency",
                             model="gpt-4o-mini",
                             messages=mediator_fallback_messages,
                             response_format=MediatorReviseOrDecide,
@@ -2723,7 +2770,8 @@ def run_conversation(
                         {"role": "user", "content": f"Vote was tied: {yes_votes} assistants voted YES, {no_votes} assistants voted NO"}
                     ]
                     try:
-                        tie_breaker_response = client.beta.chat.completions.parse(
+                        tie_breaker_response = llm_gateway.parse_sync(
+                            call_site="run_conversation.tie_breaker",
                             model="gpt-4o-mini",
                             messages=tie_breaker_messages,
                             response_format=MediatorReviseOrDecide,
@@ -2767,7 +2815,8 @@ def run_conversation(
                             {"role": "user", "content": f"Proposed Decision: {safe_get_message_field(final_decision_response, 'content', 'No decision content')}"}
                         ]
                         try:
-                            participation_response = client.beta.chat.completions.parse(
+                            participation_response = llm_gateway.parse_sync(
+                                call_site="run_conversation.participation",
                                 model="gpt-4o-mini",
                                 messages=participation_messages,
                                 response_format=MediatorReviseOrDecide,
@@ -2911,14 +2960,16 @@ def run_conversation(
                     ]
                     mediator_decision = ""
                     try:
-                        response = client.beta.chat.completions.parse(
+                        response = llm_gateway.parse_sync(
+                            call_site="run_conversation.mediator_decision",
                             model="gpt-4o-mini",  # Specify the model
                             messages=mediator_messages,  # Pass the messages directly as a list of dicts
                             response_format=MediatorReviseOrDecide,
                         )
                         # Extract the decision from the response
                         mediator_decision = response.choices[0].message.parsed
-                        print(f"\nMediator Decision: {mediator_decision}\n")                    except Exception as e:
+                        print(f"\nMediator Decision: {mediator_decision}\n")
+                    except Exception as e:
                         # TODO: Implement better fallback strategy for mediator decisions
                         print(f"\nError in Mediator Decision: {str(e)}\n")
                         # Create a safe fallback MediatorReviseOrDecide object
@@ -2935,7 +2986,8 @@ def run_conversation(
                             final_decision="Fallback decision due to type error.",
                             keep_output=True
                         )
-                    if mediator_decision.keep_output:                        conversation_history.append(
+                    if mediator_decision.keep_output:
+                        conversation_history.append(
                             {
                                 "role": "system",
                                 "name": mediator_name,
@@ -3091,5 +3143,12 @@ def run_conversation(
         print(f"✗ Unexpected error saving final conversation history: {e}")
         print("⚠️  Final conversation data may be lost.")
     
+    try:
+        usage_prefix = f"llm_usage_{str(datetime.now()).replace(':', '-').replace(' ', '_')}"
+        paths = llm_gateway.get_gateway().ledger.export(usage_prefix, since=ledger_start)
+        print(f"✓ LLM usage ledger saved to {', '.join(paths)}")
+    except (IOError, OSError, PermissionError) as e:
+        print(f"✗ Error saving LLM usage ledger: {e}")
+
     # print("Conversation History in manager: ", conversation_history, "Type: ", type(conversation_history), "Type Content: ", type(conversation_history[0]["content"]))
     return (conversation_history, questions_asked, final_output)
@@ -0,0 +1,204 @@
+# lexicon_pack.py
+"""
+Precomputed lexical tables for the psycholinguistic and ontology measures.
+
+``flesch_kincaid_grade`` needs the syllable count of every word, and
+``is_complex_ontology`` the WordNet hypernym depth of every noun. Looking
+these up in NLTK means building the ~130k-entry CMU dictionary and loading
+WordNet in every process. A lexicon pack stores both answers as precomputed
+tables instead:
+
+* ``syllables``: word -> syllable count of its first CMU pronunciation
+* ``hypernym_depth``: noun -> ``max_depth()`` of its first WordNet noun
+  synset. Regular plurals and WordNet's irregular forms are included, so
+  ``synsets()``'s morphological lookup is not needed at request time.
+
+Each table is an open-addressing hash table kept in two ``.npy`` files: the
+64-bit BLAKE2 hashes of the words (0 marks an empty slot) and the ``uint8``
+values. ``load_pack`` memory-maps them read-only, so a lookup is one hash and
+a probe or two. Worker processes share the same pages through the OS page cache.
+
+Build a pack once per environment::
+
+    python lexicon_pack.py --out lexicon_pack
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, Mapping, Optional
+
+import numpy as np
+
+DEFAULT_PACK_DIR = "lexicon_pack"
+PACK_VERSION = 1
+TABLES = ("syllables", "hypernym_depth")
+MAX_LOAD_FACTOR = 0.5
+
+# Inverse of WordNet's noun detachment rules (morphy): lemma ending -> inflected ending
+NOUN_INFLECTIONS = (
+    ("", "s"),
+    ("s", "ses"),
+    ("x", "xes"),
+    ("z", "zes"),
+    ("ch", "ches"),
+    ("sh", "shes"),
+    ("man", "men"),
+    ("y", "ies"),
+)
+
+
+def stable_hash(word: str) -> int:
+    """64-bit hash of ``word`` that is the same in every process; never 0."""
+    return int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little") or 1
+
+
+class LexiconTable:
+    """Read-only word -> small integer table with O(1) lookups.
+
+    Attributes:
+        keys (np.ndarray): uint64 word hashes, 0 for empty slots; length is a power of two.
+        values (np.ndarray): uint8 value of each slot.
+    """
+
+    def __init__(self, keys: np.ndarray, values: np.ndarray):
+        self.keys = keys
+        self.values = values
+        self._mask = len(keys) - 1
+        self._size = int(np.count_nonzero(keys))
+
+    @classmethod
+    def build(cls, mapping: Mapping[str, int]) -> "LexiconTable":
+        """Table of ``mapping``; raises ValueError on a hash collision or a value above 255."""
+        slots = 1
+        while slots * MAX_LOAD_FACTOR < max(1, len(mapping)):
+            slots *= 2
+        keys = np.zeros(slots, dtype=np.uint64)
+        values = np.zeros(slots, dtype=np.uint8)
+        mask = slots - 1
+        for word, value in mapping.items():
+            if not 0 <= value <= 255:
+                raise ValueError(f"Value {value} of {word!r} does not fit in a byte")
+            key = stable_hash(word)
+            index = key & mask
+            while int(keys[index]):
+                if int(keys[index]) == key:
+                    raise ValueError(f"Hash collision for {word!r}")
+                index = (index + 1) & mask
+            keys[index] = key
+            values[index] = value
+        return cls(keys, values)
+
+    def get(self, word: str, default: Optional[int] = None) -> Optional[int]:
+        key = stable_hash(word)
+        index = key & self._mask
+        while True:
+            slot = int(self.keys[index])
+            if slot == key:
+                return int(self.values[index])
+            if slot == 0:
+                return default
+            index = (index + 1) & self._mask
+
+    def __contains__(self, word: str) -> bool:
+        return self.get(word) is not None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def save(self, directory: str, name: str) -> None:
+        np.save(os.path.join(directory, f"{name}.keys.npy"), self.keys)
+        np.save(os.path.join(directory, f"{name}.values.npy"), self.values)
+
+    @classmethod
+    def load(cls, directory: str, name: str) -> "LexiconTable":
+        """Memory-maps a saved table read-only."""
+        return cls(
+            np.load(os.path.join(directory, f"{name}.keys.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, f"{name}.values.npy"), mmap_mode="r"),
+        )
+
+
+def syllable_counts() -> Dict[str, int]:
+    """Syllables of the first pronunciation of every CMU dictionary word."""
+    from nltk.corpus import cmudict
+
+    return {
+        word: sum(1 for phone in pronunciations[0] if phone[-1].isdigit())
+        for word, pronunciations in cmudict.dict().items()
+    }
+
+
+def noun_forms(lemmas: Iterable[str], exceptions: Mapping[str, Iterable[str]]) -> Iterable[str]:
+    """Lemmas, their regular plurals, and irregular forms; WordNet decides which are nouns."""
+    yield from exceptions
+    for lemma in lemmas:
+        yield lemma
+        for ending, inflected in NOUN_INFLECTIONS:
+            if lemma.endswith(ending):
+                yield lemma[: len(lemma) - len(ending)] + inflected
+
+
+def hypernym_depths() -> Dict[str, int]:
+    """max_depth() of the first noun synset of every noun form WordNet recognizes."""
+    from nltk.corpus import wordnet as wn
+
+    lemmas = [lemma for lemma in wn.all_lemma_names(pos=wn.NOUN) if "_" not in lemma]
+    exceptions = wn._exception_map[wn.NOUN]
+    depths = {}
+    for form in noun_forms(lemmas, exceptions):
+        if form in depths:
+            continue
+        synsets = wn.synsets(form, pos=wn.NOUN)
+        if synsets:
+            depths[form] = synsets[0].max_depth()
+    return depths
+
+
+def build_pack(directory: str = DEFAULT_PACK_DIR) -> Dict[str, int]:
+    """
+    Builds the syllable and hypernym-depth tables from NLTK's corpora into ``directory``.
+
+    Args:
+        directory (str): Output directory, created if missing.
+
+    Returns:
+        Dict[str, int]: Entries per table.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, "manifest.json")
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    sizes = {}
+    for name, mapping in (("syllables", syllable_counts()), ("hypernym_depth", hypernym_depths())):
+        LexiconTable.build(mapping).save(directory, name)
+        sizes[name] = len(mapping)
+    # Written last, so a pack is only loaded once every table is complete
+    with open(manifest_path, "w") as f:
+        json.dump({"version": PACK_VERSION, "tables": sizes}, f, indent=2)
+    return sizes
+
+
+def load_pack(directory: str = DEFAULT_PACK_DIR) -> Optional[Dict[str, LexiconTable]]:
+    """Memory-mapped tables of the pack in ``directory``, or None if there is no complete pack."""
+    try:
+        with open(os.path.join(directory, "manifest.json")) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != PACK_VERSION or set(manifest.get("tables", {})) != set(TABLES):
+        return None
+    return {name: LexiconTable.load(directory, name) for name in TABLES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the lexicon pack used by complexity_measures.")
+    parser.add_argument("--out", default=DEFAULT_PACK_DIR, help="Output directory")
+    args = parser.parse_args()
+    for name, size in build_pack(args.out).items():
+        print(f"{name}: {size} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# llm_cache.py
+"""
+Persistent, content-addressed cache for LLM responses.
+
+Entries are keyed by a SHA-256 hash of the request kind, model, messages,
+response_format schema and sampling parameters, and stored in a SQLite file so
+they survive across runs. The cache is bounded both by total payload size
+(least recently used entries are evicted first) and by a per-entry TTL.
+
+Caching is opt-in per call site: the gateway only consults the cache for call
+sites that have a ``CachePolicy`` (see ``PromptEngineeringConfig.cache_policies``).
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from openai.types import CreateEmbeddingResponse
+from openai.types.chat import ChatCompletion, ParsedChatCompletion
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = "llm_cache.sqlite3"
+DEFAULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# Call sites whose inputs recur across reruns and whose outputs are (close to) deterministic.
+# judge_step, task_into_prompt and name_project are sampled on purpose, so a cached reply
+# would replay one frozen sample; opt them in with a max_temperature if that is wanted.
+DEFAULT_CACHE_POLICIES = {
+    "extract_information": {},
+    "output_type_determination": {},
+    "generate_plan": {},
+}
+
+
+@dataclass
+class CachePolicy:
+    """Per-call-site caching rules.
+
+    Attributes:
+        ttl_seconds (Optional[float]): Entry lifetime; ``None`` uses the cache default.
+        max_temperature (Optional[float]): Skip the cache for requests sampled above
+            this temperature; ``None`` caches regardless of temperature.
+    """
+
+    ttl_seconds: Optional[float] = None
+    max_temperature: Optional[float] = None
+
+    def allows(self, params: Dict[str, Any]) -> bool:
+        if self.max_temperature is None:
+            return True
+        temperature = params.get("temperature")
+        return temperature is None or temperature <= self.max_temperature
+
+
+def _canonical(value: Any) -> Any:
+    if isinstance(value, type) and issubclass(value, BaseModel):
+        return {"name": value.__name__, "schema": value.model_json_schema()}
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return repr(value)
+
+
+def cache_key(kind: str, params: Dict[str, Any]) -> str:
+    """Content hash of a request; ``None``-valued parameters are ignored."""
+    normalized = {k: _canonical(v) for k, v in params.items() if v is not None}
+    blob = json.dumps({"kind": kind, "params": normalized}, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def encode_response(response: Any) -> str:
+    return json.dumps(response.model_dump(mode="json"))
+
+
+def decode_response(kind: str, payload: str, response_format: Any = None) -> Any:
+    data = json.loads(payload)
+    if kind == "embed":
+        return CreateEmbeddingResponse.model_validate(data)
+    if kind == "parse" and isinstance(response_format, type) and issubclass(response_format, BaseModel):
+        return ParsedChatCompletion[response_format].model_validate(data)
+    return ChatCompletion.model_validate(data)
+
+
+class LLMResponseCache:
+    """SQLite-backed response store with LRU size bound and TTL expiry.
+
+    Attributes:
+        path (str): Location of the SQLite database file.
+        max_bytes (int): Total payload size kept before LRU eviction kicks in.
+        ttl_seconds (Optional[float]): Default entry lifetime.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+        ttl_seconds: Optional[float] = DEFAULT_CACHE_TTL_SECONDS,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                call_site TEXT,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the stored payload for ``key``, or ``None`` on a miss or expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, size, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            payload, size, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self._total_bytes -= size
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return payload
+
+    def put(
+        self,
+        key: str,
+        kind: str,
+        payload: str,
+        call_site: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+    ) -> None:
+        """Store ``payload`` under ``key`` and evict LRU entries past ``max_bytes``."""
+        now = time.time()
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        size = len(payload.encode("utf-8"))
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, call_site, payload, size, now + ttl if ttl else None, now),
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self) -> None:
+        self._conn.execute(
+            "DELETE FROM responses WHERE expires_at IS NOT NULL AND expires_at <= ?",
+            (time.time(),),
+        )
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        while self._total_bytes > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access ASC LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            self._total_bytes -= row[1]
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            "entries": entries,
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,89 @@
+# llm_deadline.py
+"""
+Request timeouts and run-wide deadlines for LLM calls.
+
+An entry point (``AdvancedPromptEngineer.main``, ``run_conversation``) opens a
+deadline with ``set_deadline(seconds)`` or ``with deadline(seconds):``. The
+deadline lives in a ``contextvars.ContextVar`` as an absolute
+``time.monotonic()`` value, so nested entry points can only shorten it. The
+gateway captures the active deadline whenever a request is made.
+
+Every request also has its own timeout, looked up per call site in
+``DEFAULT_CALL_SITE_TIMEOUTS``. The scheduler gives each attempt the smaller
+of that timeout and the time left until the deadline. It stops retrying once
+the backoff would overrun the deadline and raises
+``llm_scheduler.LLMTimeoutError``, which callers can catch to degrade.
+"""
+
+import contextlib
+import contextvars
+import time
+from typing import Dict, Iterator, Optional
+
+DEFAULT_REQUEST_TIMEOUT = 120.0
+
+DEFAULT_CALL_SITE_TIMEOUTS: Dict[str, float] = {
+    "default": DEFAULT_REQUEST_TIMEOUT,
+    # Short structured answers
+    "judge_step_completion": 30.0,
+    "judge_subtask_completion": 30.0,
+    "cast_binary_vote": 30.0,
+    "cast_confidence_vote": 30.0,
+    "output_type_determination": 30.0,
+    "get_embedding": 30.0,
+    "name_project": 30.0,
+    "name_file": 30.0,
+    # Long structured generations
+    "merge_steps": 90.0,
+    "convert_plan": 180.0,
+    "analyze_final_output": 180.0,
+    "finalize_output": 180.0,
+}
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_deadline", default=None)
+
+
+def current_deadline() -> Optional[float]:
+    """Absolute ``time.monotonic()`` deadline of the current context, or ``None``."""
+    return _deadline.get()
+
+
+def remaining(deadline: Optional[float] = None) -> Optional[float]:
+    """Seconds left until ``deadline`` (default: the current one); ``None`` if unbounded."""
+    deadline = current_deadline() if deadline is None else deadline
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def set_deadline_at(at: Optional[float]) -> contextvars.Token:
+    """Use the absolute deadline ``at``, or the current one if that is earlier."""
+    current = current_deadline()
+    if at is None or (current is not None and current <= at):
+        at = current
+    return _deadline.set(at)
+
+
+def set_deadline(seconds: Optional[float]) -> contextvars.Token:
+    """Require LLM calls from this context to finish within ``seconds``; ``None`` keeps the current deadline.
+
+    Returns a token that ``reset_deadline`` accepts to restore the previous deadline.
+    """
+    return set_deadline_at(None if seconds is None else time.monotonic() + seconds)
+
+
+def reset_deadline(token: contextvars.Token) -> None:
+    _deadline.reset(token)
+
+
+@contextlib.contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """Bound every LLM call made inside the ``with`` block by ``seconds`` from now."""
+    token = set_deadline(seconds)
+    try:
+        yield
+    finally:
+        reset_deadline(token)
+
+
+def timeout_for(call_site: Optional[str], timeouts: Dict[str, float]) -> Optional[float]:
+    """Per-request timeout of ``call_site``, falling back to the ``"default"`` entry."""
+    return timeouts.get(call_site or "", timeouts.get("default"))
@@ -0,0 +1,588 @@
+# llm_gateway.py
+"""
+Single asyncio-based entry point for every LLM request made by the engine.
+
+The gateway owns one pooled ``openai.AsyncOpenAI`` client that lives on a
+dedicated event loop thread. Coroutine callers ``await gateway.chat(...)``,
+``await gateway.parse(...)`` or ``await gateway.embed(...)``; synchronous call
+sites use the ``*_sync`` shims, which block on the same loop. Because all I/O
+happens on one loop, fan-out (agents, self-consistency paths, votes) can be
+expressed with ``gather_sync`` and share the connection pool.
+
+The keyword arguments of ``chat``/``parse``/``embed`` are passed straight to
+``chat.completions.create``, ``beta.chat.completions.parse`` and
+``embeddings.create`` respectively, so the responses have exactly the shape the
+call sites already expect (``response.choices[0].message.content`` etc.).
+
+Upstream requests pass through an ``llm_scheduler.LLMScheduler`` that applies
+per-model rate limits, priority classes, retries (honouring ``Retry-After``)
+and a circuit breaker; the OpenAI client's own retries are disabled so that
+backoff never blocks a thread.
+
+Identical requests from opted-in call sites that arrive while one is in
+flight (or just finished) share a single upstream call, see
+``llm_singleflight.SingleFlight``.
+
+Per-call-site latency is tracked by ``llm_hedging.Hedger``, which can race a
+duplicate request once a call exceeds that call site's observed p95.
+
+``chat_stream`` streams a completion and hangs up as soon as a caller-supplied
+boundary (e.g. ``</step>``) appears, so no tokens are paid for past it.
+
+Both ``chat`` and ``chat_stream`` return every choice when ``n > 1``;
+``choice_texts`` lists their contents, so k candidates can share one prompt.
+
+Before anything else, ``llm_routing.ModelRouter`` picks the model per call
+site (and escalates low-reward step revisions to a bigger one); callers may
+pass ``step_reward=`` for that purpose.
+
+Each request is bounded by its call site's timeout and by the deadline of
+the ``llm_deadline`` context it was made in; overruns raise
+``llm_scheduler.LLMTimeoutError``.
+
+Completion lengths are tracked per call site by ``llm_limits.CompletionSizer``,
+which shrinks ``max_completion_tokens`` to what the call site actually needs;
+truncated responses are retried with the original limit.
+
+Every upstream request and cache hit is recorded in ``gateway.ledger`` (an
+``llm_ledger.LLMLedger``) with its token usage, latency, retries and cost,
+labelled with the ``llm_ledger`` labels active where the request was made.
+
+An optional ``llm_cache.LLMResponseCache`` can be attached with
+``configure_cache``; requests from call sites that have a ``CachePolicy`` are
+then answered from disk when an identical request was seen before.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Dict, List, Optional
+
+import httpx
+import openai
+from openai.types.chat import ChatCompletion
+
+from llm_cache import CachePolicy, LLMResponseCache, cache_key, decode_response, encode_response
+from llm_deadline import DEFAULT_CALL_SITE_TIMEOUTS, current_deadline, reset_deadline, set_deadline_at, timeout_for
+from llm_hedging import Hedger
+from llm_ledger import LLMLedger, current_labels, reset_labels, set_labels, usage_tokens
+from llm_limits import CompletionSizer, is_truncated
+from llm_routing import ModelRouter
+from llm_scheduler import LLMScheduler, estimate_request_tokens
+from llm_singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = 32
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 16
+DEFAULT_CONNECT_TIMEOUT = 10.0
+# Sent with every request so proxies (e.g. llm_standin.py) can tell call sites apart
+CALL_SITE_HEADER = "X-LLM-Call-Site"
+
+
+class LLMGatewayError(Exception):
+    """Base exception for errors raised by the LLM gateway itself."""
+
+    pass
+
+
+class LLMGateway:
+    """Owns the pooled async OpenAI client and the loop it runs on.
+
+    Attributes:
+        max_connections (int): Upper bound on concurrent HTTP connections.
+        max_keepalive_connections (int): Idle connections kept in the pool.
+    """
+
+    def __init__(
+        self,
+        client: Optional[openai.AsyncOpenAI] = None,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+        scheduler: Optional[LLMScheduler] = None,
+    ):
+        """Create a gateway.
+
+        Args:
+            client: Pre-built async client. When omitted one is created lazily on
+                first use from ``OPENAI_API_KEY`` / ``OPENAI_BASE_URL``.
+            max_connections: Upper bound on concurrent HTTP connections.
+            max_keepalive_connections: Idle connections kept in the pool.
+            scheduler: Rate limiter / retry policy; defaults to one without limits.
+        """
+        self._client = client
+        self.scheduler = scheduler or LLMScheduler()
+        self.single_flight: Optional[SingleFlight] = SingleFlight()
+        self.hedger = Hedger()
+        self.ledger = LLMLedger()
+        self.router = ModelRouter()
+        self.timeouts: Dict[str, float] = dict(DEFAULT_CALL_SITE_TIMEOUTS)
+        self.sizer: Optional[CompletionSizer] = CompletionSizer()
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.cache: Optional[LLMResponseCache] = None
+        self.cache_policies: Dict[str, CachePolicy] = {}
+
+    def configure_cache(
+        self,
+        cache: Optional[LLMResponseCache],
+        policies: Optional[Dict[str, CachePolicy]] = None,
+    ) -> None:
+        """Attach (or detach, with ``None``) a response cache and its per-call-site policies."""
+        self.cache = cache
+        self.cache_policies = dict(policies or {})
+
+    def configure_scheduler(self, scheduler: LLMScheduler) -> None:
+        """Replace the rate limiter / retry policy used for upstream requests."""
+        self.scheduler = scheduler
+
+    def configure_hedging(self, hedger: Hedger) -> None:
+        """Replace the latency tracker / hedging policy used for upstream requests."""
+        self.hedger = hedger
+
+    def configure_single_flight(self, single_flight: Optional[SingleFlight]) -> None:
+        """Replace (or disable, with ``None``) coalescing of identical requests."""
+        self.single_flight = single_flight
+
+    def configure_routing(self, router: ModelRouter) -> None:
+        """Replace the per-call-site model routing table."""
+        self.router = router
+
+    def configure_timeouts(self, timeouts: Dict[str, float]) -> None:
+        """Replace the per-call-site request timeouts (``"default"`` covers the rest)."""
+        self.timeouts = dict(timeouts)
+
+    def configure_completion_limits(self, sizer: Optional[CompletionSizer]) -> None:
+        """Replace (or disable, with ``None``) adaptive ``max_completion_tokens``."""
+        self.sizer = sizer
+
+    def configure_ledger(self, ledger: LLMLedger) -> None:
+        """Replace the token/cost ledger that records every request."""
+        self.ledger = ledger
+
+    # -------------------------------
+    # Client and loop management
+    # -------------------------------
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = openai.AsyncOpenAI(
+                        api_key=os.getenv("OPENAI_API_KEY"),
+                        base_url=os.getenv("OPENAI_BASE_URL") or None,
+                        max_retries=0,
+                        http_client=httpx.AsyncClient(
+                            limits=httpx.Limits(
+                                max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_keepalive_connections,
+                            ),
+                            timeout=httpx.Timeout(None, connect=DEFAULT_CONNECT_TIMEOUT),
+                        ),
+                    )
+        return self._client
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="llm-gateway", daemon=True
+                )
+                thread.start()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    def _on_gateway_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    async def _dispatch(self, coro: Awaitable[Any]) -> Any:
+        """Await ``coro`` on the gateway loop, whichever loop the caller is on."""
+        loop = self._ensure_loop()
+        if self._on_gateway_loop():
+            return await coro
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        return await asyncio.wrap_future(future)
+
+    def run(self, coro: Awaitable[Any]) -> Any:
+        """Block the calling thread until ``coro`` finishes on the gateway loop."""
+        loop = self._ensure_loop()
+        if self._on_gateway_loop():
+            coro.close()
+            raise LLMGatewayError(
+                "Synchronous gateway call made from the gateway loop; await the async method instead."
+            )
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def gather_sync(self, *coros: Awaitable[Any], return_exceptions: bool = False) -> List[Any]:
+        """Run several gateway coroutines concurrently and return their results in order."""
+
+        async def _gather():
+            return await asyncio.gather(*coros, return_exceptions=return_exceptions)
+
+        return self.run(_gather())
+
+    def close(self) -> None:
+        """Close the pooled client and stop the gateway loop."""
+        with self._lock:
+            loop, thread, client = self._loop, self._thread, self._client
+            self._loop, self._thread, self._client = None, None, None
+        if loop is None:
+            return
+        if client is not None:
+            asyncio.run_coroutine_threadsafe(client.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    # -------------------------------
+    # Request pipeline
+    # -------------------------------
+    def _endpoint(self, kind: str):
+        if kind in ("chat", "stream"):
+            return self.client.chat.completions.create
+        if kind == "parse":
+            return self.client.beta.chat.completions.parse
+        if kind == "embed":
+            return self.client.embeddings.create
+        raise LLMGatewayError(f"Unknown request kind: {kind}")
+
+    async def _send(self, kind: str, call_site: Optional[str], params: Dict[str, Any]) -> Any:
+        if call_site:
+            headers = {**(params.get("extra_headers") or {}), CALL_SITE_HEADER: call_site}
+            params = {**params, "extra_headers": headers}
+        endpoint = self._endpoint(kind)
+        attempts = 0
+
+        async def call():
+            nonlocal attempts
+            attempts += 1
+            if kind == "stream":
+                return await consume_stream(endpoint, params)
+            return await endpoint(**params)
+
+        model = params.get("model", "default")
+        started = time.monotonic()
+        try:
+            response = await self.scheduler.execute(
+                call,
+                model=model,
+                tokens=estimate_request_tokens(params),
+                call_site=call_site,
+                timeout=timeout_for(call_site, self.timeouts),
+                deadline=current_deadline(),
+            )
+        except Exception as e:
+            self.ledger.record(
+                kind, call_site, model,
+                latency_seconds=time.monotonic() - started,
+                retries=max(0, attempts - 1),
+                error=type(e).__name__,
+            )
+            raise
+        self._record_usage(kind, call_site, params, response, time.monotonic() - started, max(0, attempts - 1))
+        return response
+
+    def _record_usage(
+        self,
+        kind: str,
+        call_site: Optional[str],
+        params: Dict[str, Any],
+        response: Any,
+        latency: float,
+        retries: int,
+    ) -> None:
+        tokens = usage_tokens(response)
+        estimated = tokens is None
+        if estimated:
+            # Streams we hung up on never receive their usage chunk
+            text = "".join(
+                choice.message.content or "" for choice in getattr(response, "choices", None) or []
+            )
+            prompt = params.get("input", params.get("messages", []))
+            tokens = {
+                "prompt_tokens": len(json.dumps(prompt, default=str)) // 4,
+                "completion_tokens": len(text) // 4,
+                "cached_tokens": 0,
+            }
+        self.ledger.record(
+            kind,
+            call_site,
+            getattr(response, "model", None) or params.get("model", "default"),
+            latency_seconds=latency,
+            retries=retries,
+            estimated=estimated,
+            **tokens,
+        )
+
+    async def _upstream(self, kind: str, call_site: Optional[str], params: Dict[str, Any]) -> Any:
+        """Send the request, hedging it with a duplicate if the call site's policy says so.
+
+        With a ``CompletionSizer`` attached the request goes out with the call
+        site's adaptive completion limit; a response truncated by that limit is
+        requested again with the call site's own limit.
+        """
+        limited = self.sizer.apply(kind, call_site, params) if self.sizer is not None else params
+        try:
+            response = await self.hedger.run(lambda: self._send(kind, call_site, limited), call_site)
+            truncated = limited is not params and is_truncated(response)
+        except openai.LengthFinishReasonError:
+            if limited is params:
+                raise
+            truncated = True
+        if truncated:
+            logger.info(f"[LLM Gateway] {call_site or 'unknown'} hit its adaptive completion limit; retrying")
+            self.sizer.stats["truncated_retries"] += 1
+            response = await self.hedger.run(lambda: self._send(kind, call_site, params), call_site)
+        if self.sizer is not None:
+            self.sizer.observe(call_site, response)
+        return response
+
+    def _call(self, kind: str, call_site: Optional[str], params: Dict[str, Any]) -> Awaitable[Any]:
+        """Build the request coroutine, capturing the caller's ledger labels and deadline now.
+
+        The coroutine runs on the gateway loop, whose context does not see the
+        caller's ``llm_ledger`` labels or ``llm_deadline`` deadline, so they are
+        captured here and re-applied.
+        """
+        params = self.router.apply(kind, call_site, params)
+        return self._request(kind, call_site, params, current_labels(), current_deadline())
+
+    async def _request(
+        self,
+        kind: str,
+        call_site: Optional[str],
+        params: Dict[str, Any],
+        labels: Optional[Dict[str, Any]] = None,
+        deadline: Optional[float] = None,
+    ) -> Any:
+        logger.debug(f"[LLM Gateway] {kind} request from {call_site or 'unknown'}")
+        token = set_labels(**labels) if labels else None
+        deadline_token = set_deadline_at(deadline)
+        try:
+            if self.single_flight is not None and self.single_flight.applies_to(call_site):
+                return await self.single_flight.do(
+                    cache_key(kind, params),
+                    lambda: self._fetch(kind, call_site, params),
+                    call_site,
+                )
+            return await self._fetch(kind, call_site, params)
+        finally:
+            reset_deadline(deadline_token)
+            if token is not None:
+                reset_labels(token)
+
+    async def _fetch(self, kind: str, call_site: Optional[str], params: Dict[str, Any]) -> Any:
+        """Answer from the response cache when the call site's policy allows, else go upstream."""
+        policy = self.cache_policies.get(call_site) if self.cache is not None else None
+        if policy is None or not policy.allows(params):
+            return await self._upstream(kind, call_site, params)
+
+        key = cache_key(kind, params)
+        payload = await asyncio.to_thread(self.cache.get, key)
+        if payload is not None:
+            try:
+                logger.debug(f"[LLM Gateway] cache hit for {call_site}")
+                response = decode_response(kind, payload, params.get("response_format"))
+                self.ledger.record(kind, call_site, params.get("model", "default"), source="cache")
+                return response
+            except Exception as e:
+                logger.warning(f"[LLM Gateway] Discarding unreadable cache entry for {call_site}: {e}")
+
+        response = await self._upstream(kind, call_site, params)
+        try:
+            await asyncio.to_thread(
+                self.cache.put, key, kind, encode_response(response), call_site, policy.ttl_seconds
+            )
+        except Exception as e:
+            logger.warning(f"[LLM Gateway] Could not cache response for {call_site}: {e}")
+        return response
+
+    # -------------------------------
+    # Public API
+    # -------------------------------
+    def chat(self, *, call_site: Optional[str] = None, **params: Any) -> Awaitable[Any]:
+        """Awaitable ``chat.completions.create``."""
+        return self._dispatch(self._call("chat", call_site, params))
+
+    def parse(self, *, call_site: Optional[str] = None, **params: Any) -> Awaitable[Any]:
+        """Awaitable ``beta.chat.completions.parse``; pass ``response_format=``."""
+        return self._dispatch(self._call("parse", call_site, params))
+
+    def embed(self, *, call_site: Optional[str] = None, **params: Any) -> Awaitable[Any]:
+        """Awaitable ``embeddings.create``."""
+        return self._dispatch(self._call("embed", call_site, params))
+
+    def chat_stream(
+        self, *, stop_at: List[str], call_site: Optional[str] = None, **params: Any
+    ) -> Awaitable[ChatCompletion]:
+        """Stream a completion and abort it once any of ``stop_at`` appears.
+
+        The returned completion holds the text before the first marker, i.e. the
+        same shape ``stop=stop_at`` would give, but the markers may be any text
+        and there is no limit on how many there are. ``n`` is honoured; each
+        choice is cut at its own marker.
+        """
+        return self._dispatch(self._call("stream", call_site, {**params, "stream_until": list(stop_at)}))
+
+    def chat_sync(self, *, call_site: Optional[str] = None, **params: Any) -> Any:
+        return self.run(self._call("chat", call_site, params))
+
+    def parse_sync(self, *, call_site: Optional[str] = None, **params: Any) -> Any:
+        return self.run(self._call("parse", call_site, params))
+
+    def embed_sync(self, *, call_site: Optional[str] = None, **params: Any) -> Any:
+        return self.run(self._call("embed", call_site, params))
+
+    def chat_stream_sync(
+        self, *, stop_at: List[str], call_site: Optional[str] = None, **params: Any
+    ) -> ChatCompletion:
+        return self.run(self._call("stream", call_site, {**params, "stream_until": list(stop_at)}))
+
+
+def find_stop_marker(text: str, markers: List[str], start: int = 0) -> int:
+    """Index of the earliest marker occurrence at or after ``start``, or -1."""
+    positions = [i for i in (text.find(m, start) for m in markers) if i >= 0]
+    return min(positions) if positions else -1
+
+
+async def consume_stream(endpoint, params: Dict[str, Any]) -> ChatCompletion:
+    """Read a streamed completion until a ``stream_until`` marker shows up, then hang up.
+
+    Returns a ``ChatCompletion`` whose content stops right before the marker and
+    whose ``finish_reason`` is ``"stop"`` when the stream was cut short. With
+    ``n > 1`` every choice is cut at its own first marker and the connection is
+    closed once all of them have reached one (or finished).
+    """
+    params = dict(params)
+    markers = params.pop("stream_until")
+    n = params.get("n") or 1
+    longest = max((len(m) for m in markers), default=0)
+    stream = await endpoint(**params, stream=True, stream_options={"include_usage": True})
+    contents: Dict[int, str] = {}
+    finish_reasons: Dict[int, Optional[str]] = {}
+    done = set()
+    cut_short = False
+    usage = None
+    completion_id, model, created = "", params.get("model", ""), 0
+    try:
+        async for chunk in stream:
+            completion_id, model, created = chunk.id, chunk.model, chunk.created
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage.model_dump()
+            for choice in chunk.choices:
+                index = choice.index
+                if index in done:
+                    continue
+                content = contents.setdefault(index, "")
+                if choice.finish_reason:
+                    finish_reasons[index] = choice.finish_reason
+                    done.add(index)
+                delta = choice.delta.content or ""
+                if not delta:
+                    continue
+                search_from = max(0, len(content) - longest)
+                content += delta
+                cut = find_stop_marker(content, markers, search_from)
+                if cut >= 0:
+                    content = content[:cut]
+                    finish_reasons[index] = "stop"
+                    done.add(index)
+                    cut_short = True
+                contents[index] = content
+            # A naturally finished stream is read to the end for its usage chunk
+            if cut_short and len(done) >= n:
+                break
+    finally:
+        await stream.close()
+    return ChatCompletion.model_validate(
+        {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [
+                {
+                    "index": index,
+                    "finish_reason": finish_reasons.get(index) or "stop",
+                    "message": {"role": "assistant", "content": contents.get(index, "")},
+                }
+                for index in range(n)
+            ],
+            "usage": usage,
+        }
+    )
+
+
+def choice_texts(response: Any) -> List[str]:
+    """Contents of every choice of a chat completion, in index order, skipping empty ones."""
+    choices = sorted(response.choices, key=lambda choice: choice.index)
+    return [choice.message.content for choice in choices if choice.message.content]
+
+
+_default_gateway: Optional[LLMGateway] = None
+_default_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """Return the process-wide gateway, creating it on first use."""
+    global _default_gateway
+    if _default_gateway is None:
+        with _default_gateway_lock:
+            if _default_gateway is None:
+                _default_gateway = LLMGateway()
+    return _default_gateway
+
+
+def set_gateway(gateway: Optional[LLMGateway]) -> Optional[LLMGateway]:
+    """Replace the process-wide gateway (e.g. for tests) and return the previous one."""
+    global _default_gateway
+    with _default_gateway_lock:
+        previous, _default_gateway = _default_gateway, gateway
+    return previous
+
+
+# Module-level shortcuts bound to the process-wide gateway
+def chat(**params: Any) -> Awaitable[Any]:
+    return get_gateway().chat(**params)
+
+
+def parse(**params: Any) -> Awaitable[Any]:
+    return get_gateway().parse(**params)
+
+
+def embed(**params: Any) -> Awaitable[Any]:
+    return get_gateway().embed(**params)
+
+
+def chat_sync(**params: Any) -> Any:
+    return get_gateway().chat_sync(**params)
+
+
+def parse_sync(**params: Any) -> Any:
+    return get_gateway().parse_sync(**params)
+
+
+def embed_sync(**params: Any) -> Any:
+    return get_gateway().embed_sync(**params)
+
+
+def chat_stream(**params: Any) -> Awaitable[ChatCompletion]:
+    return get_gateway().chat_stream(**params)
+
+
+def chat_stream_sync(**params: Any) -> ChatCompletion:
+    return get_gateway().chat_stream_sync(**params)
+
+
+def gather_sync(*coros: Awaitable[Any], return_exceptions: bool = False) -> List[Any]:
+    return get_gateway().gather_sync(*coros, return_exceptions=return_exceptions)
@@ -0,0 +1,148 @@
+# llm_hedging.py
+"""
+Hedged LLM requests to cut tail latency.
+
+Every upstream request's latency is recorded per call site. For call sites
+with a ``HedgePolicy``, once enough samples exist, a request that has not
+returned by the observed latency percentile (p95 by default) gets a duplicate;
+whichever finishes first wins and the other is cancelled. Duplicates cost
+money, so each call site may only hedge ``budget_fraction`` of its requests.
+
+``Hedger.metrics()`` reports, per call site, delivered latency percentiles
+and how many hedges were fired and won, i.e. how much of the tail hedging
+removed and what it cost.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEDGE_PERCENTILE = 0.95
+DEFAULT_HEDGE_BUDGET_FRACTION = 0.05
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 500
+
+
+@dataclass
+class HedgePolicy:
+    """Per-call-site hedging rules.
+
+    Attributes:
+        percentile (float): Latency percentile after which a duplicate is fired.
+        budget_fraction (float): Maximum share of requests that may be hedged.
+        min_samples (int): Latencies observed before hedging starts.
+    """
+
+    percentile: float = DEFAULT_HEDGE_PERCENTILE
+    budget_fraction: float = DEFAULT_HEDGE_BUDGET_FRACTION
+    min_samples: int = DEFAULT_HEDGE_MIN_SAMPLES
+
+
+def percentile(values, fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class _SiteStats:
+    def __init__(self):
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+
+class Hedger:
+    """Tracks per-call-site latency and races duplicates for slow requests.
+
+    Attributes:
+        policies (Dict[str, HedgePolicy]): Hedged call sites; a ``"default"``
+            entry applies to every call site without its own policy.
+    """
+
+    def __init__(self, policies: Optional[Dict[str, HedgePolicy]] = None):
+        self.policies = dict(policies or {})
+        self._sites: Dict[str, _SiteStats] = {}
+
+    def _site(self, call_site: Optional[str]) -> _SiteStats:
+        return self._sites.setdefault(call_site or "unknown", _SiteStats())
+
+    def policy_for(self, call_site: Optional[str]) -> Optional[HedgePolicy]:
+        return self.policies.get(call_site or "") or self.policies.get("default")
+
+    def hedge_delay(self, call_site: Optional[str]) -> Optional[float]:
+        """Seconds to wait before hedging, or ``None`` if this request may not be hedged."""
+        policy = self.policy_for(call_site)
+        stats = self._site(call_site)
+        if policy is None or len(stats.latencies) < policy.min_samples:
+            return None
+        if stats.hedged + 1 > policy.budget_fraction * (stats.requests + 1):
+            return None
+        return percentile(stats.latencies, policy.percentile)
+
+    async def run(self, call: Callable[[], Awaitable[Any]], call_site: Optional[str] = None) -> Any:
+        """Await ``call()``, racing a second ``call()`` if the first is slower than the hedge delay."""
+        stats = self._site(call_site)
+        delay = self.hedge_delay(call_site)
+        stats.requests += 1
+        started = time.monotonic()
+        if delay is None:
+            result = await call()
+            stats.latencies.append(time.monotonic() - started)
+            return result
+
+        primary = asyncio.ensure_future(call())
+        hedge: Optional[asyncio.Future] = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                stats.latencies.append(time.monotonic() - started)
+                return primary.result()
+
+            stats.hedged += 1
+            logger.debug(f"[Hedging] {call_site} exceeded {delay:.2f}s; firing hedge")
+            hedge = asyncio.ensure_future(call())
+            pending = {primary, hedge}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            stats.hedge_wins += 1
+                        stats.latencies.append(time.monotonic() - started)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Cancel the loser (or both, if our caller gave up)
+            for task in (primary, hedge):
+                if task is None:
+                    continue
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # mark retrieved; a loser's failure is expected
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Per-call-site latency percentiles plus hedge count, wins and cost fraction."""
+        report = {}
+        for call_site, stats in self._sites.items():
+            latencies = list(stats.latencies)
+            report[call_site] = {
+                "requests": stats.requests,
+                "hedged": stats.hedged,
+                "hedge_wins": stats.hedge_wins,
+                "hedge_cost_fraction": stats.hedged / stats.requests if stats.requests else 0.0,
+                "p50": percentile(latencies, 0.50),
+                "p95": percentile(latencies, 0.95),
+                "p99": percentile(latencies, 0.99),
+            }
+        return report
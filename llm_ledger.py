@@ -0,0 +1,321 @@
+# llm_ledger.py
+"""
+Per-call token and cost ledger for LLM traffic.
+
+The gateway records one ``LedgerEntry`` per upstream request (hedged
+duplicates included) and per response-cache hit: model, call site, prompt /
+completion / cached tokens from the response's ``usage``, latency, retries
+and the estimated cost.
+
+Each entry also carries the labels that were active when the request was
+made. Callers set them with ``set_labels(task=..., plan_step=...)`` or the
+``labels(...)`` context manager; they live in a ``contextvars.ContextVar``,
+so concurrent reasoning paths keep their own. An entry's ``phase`` comes from
+the ``phase`` label when one is set and otherwise from
+``DEFAULT_CALL_SITE_PHASES``.
+
+``LLMLedger.rollup("task" | "plan_step" | "round" | "phase" | "call_site" |
+"model")`` sums entries per label value. ``export_json`` / ``export_csv``
+write the entries (and, for JSON, every rollup) to disk.
+"""
+
+import contextlib
+import contextvars
+import csv
+import json
+import threading
+import time
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Dict, Iterator, List, Optional
+
+# USD per million tokens: input, cached input, output
+DEFAULT_MODEL_PRICES: Dict[str, Dict[str, float]] = {
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+    "text-embedding-3-small": {"input": 0.02, "cached_input": 0.02, "output": 0.0},
+    "text-embedding-3-large": {"input": 0.13, "cached_input": 0.13, "output": 0.0},
+}
+
+PHASES = ("complexity", "planning", "reasoning", "judging", "finalization", "conversation")
+
+DEFAULT_CALL_SITE_PHASES: Dict[str, str] = {
+    # Task analysis and complexity scoring
+    "task_into_prompt": "complexity",
+    "get_embedding": "complexity",
+    "classify_remaining_text_structured": "complexity",
+    "define_problem": "complexity",
+    "output_type_determination": "complexity",
+    # Plan generation and prompt construction
+    "generate_plan": "planning",
+    "generate_plan_legacy": "planning",
+    "convert_plan": "planning",
+    "merge_steps": "planning",
+    "generate_follow_up_questions": "planning",
+    "convert_planstep_to_prompt": "planning",
+    "name_project": "planning",
+    "place_step": "planning",
+    "component_decision": "planning",
+    "refine_prompt_via_meta_prompt": "planning",
+    "apply_prompt_modifications": "planning",
+    # Step generation
+    "call_openai": "reasoning",
+    "self_consistency": "reasoning",
+    "collaborative_reasoning": "reasoning",
+    "revise_step": "reasoning",
+    # Evaluation
+    "judge_step": "judging",
+    "choose_best_response": "judging",
+    "judge_step_completion": "judging",
+    "judge_subtask_completion": "judging",
+    "judge_final_answer": "judging",
+    "cast_binary_vote": "judging",
+    "cast_confidence_vote": "judging",
+    # Output assembly
+    "finalize_output": "finalization",
+    "final_output_correction": "finalization",
+    "analyze_final_output": "finalization",
+    "name_file": "finalization",
+    # Multi-assistant conversation
+    "get_assistant_response": "conversation",
+    "summarize_conversation": "conversation",
+    "extract_information": "conversation",
+    "analyze_to_do_list": "conversation",
+}
+
+ROLLUP_KEYS = ("task", "plan_step", "round", "phase", "call_site", "model")
+
+_labels: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("llm_ledger_labels", default={})
+
+
+def current_labels() -> Dict[str, Any]:
+    """Labels that will be attached to LLM requests made from the current context."""
+    return dict(_labels.get())
+
+
+def set_labels(**labels: Any) -> contextvars.Token:
+    """Merge ``labels`` into the current context's labels; ``None`` removes a label.
+
+    Returns a token that ``reset_labels`` accepts to restore the previous labels.
+    """
+    merged = {**_labels.get(), **labels}
+    return _labels.set({key: value for key, value in merged.items() if value is not None})
+
+
+def reset_labels(token: contextvars.Token) -> None:
+    _labels.reset(token)
+
+
+@contextlib.contextmanager
+def labels(**new_labels: Any) -> Iterator[None]:
+    """Attach ``new_labels`` to every LLM request made inside the ``with`` block."""
+    token = set_labels(**new_labels)
+    try:
+        yield
+    finally:
+        reset_labels(token)
+
+
+@dataclass
+class LedgerEntry:
+    """One upstream LLM request (or cache hit) and what it cost.
+
+    Attributes:
+        timestamp (float): Wall-clock time the request finished.
+        kind (str): "chat", "parse", "stream" or "embed".
+        call_site (str): Engine function that made the request.
+        model (str): Model name the request was sent to.
+        prompt_tokens (int): Prompt tokens billed (including cached ones).
+        completion_tokens (int): Completion tokens billed.
+        cached_tokens (int): Prompt tokens served from the provider's prompt cache.
+        latency_seconds (float): Time from dispatch to response, retries included.
+        retries (int): Attempts beyond the first made by the scheduler.
+        cost_usd (float): Estimated cost from the price table.
+        source (str): "upstream" or "cache" (answered by the local response cache).
+        estimated (bool): True when the response carried no usage and tokens were estimated.
+        error (str): Exception type name if the request failed, else "".
+        task (str): ``task`` label, if set.
+        plan_step (str): ``plan_step`` label, if set.
+        round (str): ``round`` label, if set.
+        phase (str): ``phase`` label, or the call site's default phase.
+    """
+
+    timestamp: float
+    kind: str
+    call_site: str
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    latency_seconds: float = 0.0
+    retries: int = 0
+    cost_usd: float = 0.0
+    source: str = "upstream"
+    estimated: bool = False
+    error: str = ""
+    task: str = ""
+    plan_step: str = ""
+    round: str = ""
+    phase: str = ""
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+def usage_tokens(response: Any) -> Optional[Dict[str, int]]:
+    """Prompt, completion and cached token counts from a response's ``usage``, if present."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "cached_tokens": (getattr(details, "cached_tokens", 0) or 0) if details else 0,
+    }
+
+
+def _price_for(prices: Dict[str, Dict[str, float]], model: str) -> Optional[Dict[str, float]]:
+    if model in prices:
+        return prices[model]
+    # Dated snapshots ("gpt-4o-mini-2024-07-18") price like their base model
+    matches = [name for name in prices if model.startswith(name)]
+    return prices[max(matches, key=len)] if matches else None
+
+
+class LLMLedger:
+    """Thread-safe, append-only record of LLM requests with rollups and export.
+
+    Attributes:
+        prices (Dict[str, Dict[str, float]]): USD per million tokens per model.
+        call_site_phases (Dict[str, str]): Phase used when no ``phase`` label is set.
+    """
+
+    def __init__(
+        self,
+        prices: Optional[Dict[str, Dict[str, float]]] = None,
+        call_site_phases: Optional[Dict[str, str]] = None,
+    ):
+        self.prices = dict(DEFAULT_MODEL_PRICES if prices is None else prices)
+        self.call_site_phases = dict(DEFAULT_CALL_SITE_PHASES if call_site_phases is None else call_site_phases)
+        self.entries: List[LedgerEntry] = []
+        self._lock = threading.Lock()
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+        price = _price_for(self.prices, model)
+        if price is None:
+            return 0.0
+        uncached = max(0, prompt_tokens - cached_tokens)
+        return (
+            uncached * price.get("input", 0.0)
+            + cached_tokens * price.get("cached_input", price.get("input", 0.0))
+            + completion_tokens * price.get("output", 0.0)
+        ) / 1_000_000
+
+    def record(
+        self,
+        kind: str,
+        call_site: Optional[str],
+        model: str,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        cached_tokens: int = 0,
+        latency_seconds: float = 0.0,
+        retries: int = 0,
+        source: str = "upstream",
+        estimated: bool = False,
+        error: str = "",
+        labels: Optional[Dict[str, Any]] = None,
+    ) -> LedgerEntry:
+        """Append one entry; labels default to the current context's labels."""
+        labels = current_labels() if labels is None else labels
+        call_site = call_site or "unknown"
+        billed = source == "upstream"
+        entry = LedgerEntry(
+            timestamp=time.time(),
+            kind=kind,
+            call_site=call_site,
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached_tokens=cached_tokens,
+            latency_seconds=latency_seconds,
+            retries=retries,
+            cost_usd=self.cost(model, prompt_tokens, completion_tokens, cached_tokens) if billed else 0.0,
+            source=source,
+            estimated=estimated,
+            error=error,
+            task=str(labels.get("task", "")),
+            plan_step=str(labels.get("plan_step", "")),
+            round=str(labels.get("round", "")),
+            phase=str(labels.get("phase") or self.call_site_phases.get(call_site, "other")),
+        )
+        with self._lock:
+            self.entries.append(entry)
+        return entry
+
+    def mark(self) -> int:
+        """Position to pass as ``since`` to only report entries recorded after now."""
+        with self._lock:
+            return len(self.entries)
+
+    def snapshot(self, since: int = 0) -> List[LedgerEntry]:
+        with self._lock:
+            return list(self.entries[since:])
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+
+    def totals(self, since: int = 0) -> Dict[str, Any]:
+        return _summarize(self.snapshot(since))
+
+    def rollup(self, key: str, since: int = 0) -> Dict[str, Dict[str, Any]]:
+        """Totals per value of ``key`` (one of ``ROLLUP_KEYS``); unlabelled entries group under ""."""
+        if key not in ROLLUP_KEYS:
+            raise ValueError(f"Unknown rollup key {key!r}; expected one of {ROLLUP_KEYS}")
+        groups: Dict[str, List[LedgerEntry]] = {}
+        for entry in self.snapshot(since):
+            groups.setdefault(getattr(entry, key), []).append(entry)
+        return {value: _summarize(entries) for value, entries in groups.items()}
+
+    def report(self, since: int = 0) -> Dict[str, Any]:
+        """Totals plus every rollup, as plain JSON-serialisable data."""
+        return {
+            "totals": self.totals(since),
+            "rollups": {key: self.rollup(key, since) for key in ROLLUP_KEYS},
+        }
+
+    def export_json(self, path: str, since: int = 0) -> str:
+        data = self.report(since)
+        data["entries"] = [asdict(entry) for entry in self.snapshot(since)]
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+        return path
+
+    def export_csv(self, path: str, since: int = 0) -> str:
+        columns = [field.name for field in fields(LedgerEntry)]
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            for entry in self.snapshot(since):
+                writer.writerow(asdict(entry))
+        return path
+
+    def export(self, prefix: str, since: int = 0) -> List[str]:
+        """Write ``<prefix>.json`` and ``<prefix>.csv``; returns both paths."""
+        return [self.export_json(f"{prefix}.json", since), self.export_csv(f"{prefix}.csv", since)]
+
+
+def _summarize(entries: List[LedgerEntry]) -> Dict[str, Any]:
+    return {
+        "requests": sum(1 for e in entries if e.source == "upstream"),
+        "cache_hits": sum(1 for e in entries if e.source == "cache"),
+        "errors": sum(1 for e in entries if e.error),
+        "retries": sum(e.retries for e in entries),
+        "prompt_tokens": sum(e.prompt_tokens for e in entries if e.source == "upstream"),
+        "completion_tokens": sum(e.completion_tokens for e in entries if e.source == "upstream"),
+        "cached_tokens": sum(e.cached_tokens for e in entries if e.source == "upstream"),
+        "cost_usd": round(sum(e.cost_usd for e in entries), 6),
+        "latency_seconds": round(sum(e.latency_seconds for e in entries if e.source == "upstream"), 3),
+    }
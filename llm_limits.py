@@ -0,0 +1,119 @@
+# llm_limits.py
+"""
+Adaptive ``max_completion_tokens`` from observed completion lengths.
+
+Call sites tend to ask for far more output than they use (``merge_steps``
+reserves 2500 tokens, ``convert_plan`` whatever is left of a 16k window, many
+set no limit at all). Every reserved token counts against the provider's
+tokens-per-minute quota and against our own scheduler's TPM bucket until the
+response settles.
+
+``CompletionSizer`` keeps a window of completion lengths per call site. Once
+``min_samples`` are known, requests from that call site are sent with
+``max_completion_tokens`` set to the observed ``percentile`` times
+``headroom`` plus ``extra_tokens``, never above what the call site asked for.
+If a response is cut short anyway (``finish_reason == "length"``, or the SDK's
+``LengthFinishReasonError`` for structured outputs), the gateway repeats the
+request once with the call site's original limit.
+"""
+
+import math
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from llm_hedging import percentile
+
+DEFAULT_LIMIT_PERCENTILE = 0.99
+DEFAULT_LIMIT_HEADROOM = 1.25
+DEFAULT_LIMIT_EXTRA_TOKENS = 32
+DEFAULT_LIMIT_MIN_SAMPLES = 20
+COMPLETION_WINDOW = 200
+
+
+def limit_param(params: Dict[str, Any]) -> str:
+    """Name of the completion limit parameter a request uses (``max_completion_tokens`` by default)."""
+    return "max_tokens" if "max_tokens" in params and "max_completion_tokens" not in params else "max_completion_tokens"
+
+
+def is_truncated(response: Any) -> bool:
+    return any(getattr(choice, "finish_reason", None) == "length" for choice in getattr(response, "choices", None) or [])
+
+
+def completion_tokens_per_choice(response: Any) -> Optional[int]:
+    """Completion tokens of the longest choice, from ``usage`` or estimated from the text.
+
+    ``usage`` only totals all ``n`` choices, and the limit has to fit the longest
+    of them, so the total is split in proportion to each choice's text length.
+    """
+    choices = getattr(response, "choices", None) or []
+    usage = getattr(response, "usage", None)
+    tokens = getattr(usage, "completion_tokens", None) if usage is not None else None
+    lengths = [len(getattr(getattr(choice, "message", None), "content", None) or "") for choice in choices]
+    if isinstance(tokens, int):
+        if len(lengths) > 1 and sum(lengths):
+            return math.ceil(tokens * max(lengths) / sum(lengths))
+        return math.ceil(tokens / max(1, len(choices)))
+    if not any(lengths):
+        return None
+    return max(lengths) // 4
+
+
+class CompletionSizer:
+    """Per-call-site completion length histograms and the limits derived from them.
+
+    Attributes:
+        percentile (float): Observed completion-length percentile the limit covers.
+        headroom (float): Multiplier applied to that percentile.
+        extra_tokens (int): Tokens added on top, so short outputs keep some slack.
+        min_samples (int): Completions observed before a call site is limited.
+        stats (Dict[str, int]): Requests limited, and retried after truncation.
+    """
+
+    def __init__(
+        self,
+        percentile: float = DEFAULT_LIMIT_PERCENTILE,
+        headroom: float = DEFAULT_LIMIT_HEADROOM,
+        extra_tokens: int = DEFAULT_LIMIT_EXTRA_TOKENS,
+        min_samples: int = DEFAULT_LIMIT_MIN_SAMPLES,
+    ):
+        self.percentile = percentile
+        self.headroom = headroom
+        self.extra_tokens = extra_tokens
+        self.min_samples = min_samples
+        self.stats = {"limited": 0, "truncated_retries": 0}
+        self._lengths: Dict[str, Deque[int]] = {}
+
+    def observe(self, call_site: Optional[str], response: Any) -> None:
+        tokens = completion_tokens_per_choice(response)
+        if tokens is not None:
+            self._lengths.setdefault(call_site or "unknown", deque(maxlen=COMPLETION_WINDOW)).append(tokens)
+
+    def limit_for(self, call_site: Optional[str], requested: Optional[int] = None) -> Optional[int]:
+        """Adaptive limit for ``call_site``, or ``requested`` while too few samples exist."""
+        lengths = self._lengths.get(call_site or "unknown")
+        if not lengths or len(lengths) < self.min_samples:
+            return requested
+        limit = math.ceil(percentile(lengths, self.percentile) * self.headroom) + self.extra_tokens
+        return limit if requested is None else min(limit, requested)
+
+    def apply(self, kind: str, call_site: Optional[str], params: Dict[str, Any]) -> Dict[str, Any]:
+        """``params`` with the adaptive limit, or ``params`` itself when nothing changes."""
+        if kind == "embed":
+            return params
+        key = limit_param(params)
+        requested = params.get(key)
+        limit = self.limit_for(call_site, requested)
+        if limit is None or limit == requested:
+            return params
+        self.stats["limited"] += 1
+        return {**params, key: limit}
+
+    def histogram(self, call_site: str) -> Dict[str, Optional[int]]:
+        lengths = list(self._lengths.get(call_site, []))
+        return {
+            "samples": len(lengths),
+            "p50": percentile(lengths, 0.50),
+            "p95": percentile(lengths, 0.95),
+            "p99": percentile(lengths, 0.99),
+            "limit": self.limit_for(call_site),
+        }
@@ -0,0 +1,99 @@
+# llm_routing.py
+"""
+Per-call-site model routing with reward-based escalation.
+
+Call sites pass whatever model they were written with (often a hardcoded
+``"gpt-4o-mini"``). The gateway asks ``ModelRouter.apply`` to rewrite it
+before the request is sent:
+
+* ``routes`` maps a call site to the model it should use, so cheap boolean
+  judges (``judge_step_completion``, ``cast_binary_vote``, ...) can go to the
+  smallest model while generation keeps the configured one. A ``"default"``
+  route applies to call sites without their own entry; call sites with no
+  route keep the model they asked for.
+* ``escalations`` maps a call site to an ``EscalationRule``. When the caller
+  passes ``step_reward=`` (the reflection reward of the step being revised)
+  and it is below the rule's threshold, the request goes to the rule's bigger
+  model instead. ``step_reward`` is consumed here and never sent upstream.
+
+Embedding requests are never rerouted by the ``"default"`` route.
+
+Routing is opt-in: there are no default routes or escalations, so every call
+site keeps the model it was written with until the config says otherwise.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# The judges already ask for gpt-4o-mini themselves, so routes only matter once configured
+DEFAULT_MODEL_ROUTES: Dict[str, str] = {}
+
+REWARD_PARAM = "step_reward"
+
+
+@dataclass
+class EscalationRule:
+    """Send a call site's request to ``model`` when the step reward is below ``below_reward``.
+
+    Attributes:
+        model (str): Bigger model used for low-reward steps.
+        below_reward (float): Reflection reward under which the request escalates.
+    """
+
+    model: str
+    below_reward: float = 0.5
+
+
+class ModelRouter:
+    """Chooses the model for each request from its call site and step reward.
+
+    Attributes:
+        routes (Dict[str, str]): Model per call site; ``"default"`` covers the rest.
+        escalations (Dict[str, EscalationRule]): Reward-based escalation per call site.
+        stats (Dict[str, int]): Counts of rerouted and escalated requests.
+    """
+
+    def __init__(
+        self,
+        routes: Optional[Dict[str, str]] = None,
+        escalations: Optional[Dict[str, EscalationRule]] = None,
+    ):
+        self.routes = dict(routes or {})
+        self.escalations = dict(escalations or {})
+        self.stats = {"rerouted": 0, "escalated": 0}
+
+    def route(
+        self,
+        call_site: Optional[str],
+        requested: Optional[str],
+        reward: Optional[float] = None,
+        kind: str = "chat",
+    ) -> Optional[str]:
+        """Model to use for a request that asked for ``requested``."""
+        rule = self.escalations.get(call_site or "")
+        if rule is not None and reward is not None and reward < rule.below_reward:
+            return rule.model
+        if call_site in self.routes:
+            return self.routes[call_site]
+        if kind != "embed" and "default" in self.routes:
+            return self.routes["default"]
+        return requested
+
+    def apply(self, kind: str, call_site: Optional[str], params: Dict[str, Any]) -> Dict[str, Any]:
+        """Return ``params`` with the routed model and without ``step_reward``."""
+        reward = params.get(REWARD_PARAM)
+        if REWARD_PARAM in params:
+            params = {key: value for key, value in params.items() if key != REWARD_PARAM}
+        requested = params.get("model")
+        model = self.route(call_site, requested, reward, kind)
+        if model is None or model == requested:
+            return params
+        if call_site in self.escalations and reward is not None and reward < self.escalations[call_site].below_reward:
+            self.stats["escalated"] += 1
+            logger.debug(f"[Model Router] {call_site} escalated to {model} (step reward {reward:.2f})")
+        else:
+            self.stats["rerouted"] += 1
+        return {**params, "model": model}
@@ -0,0 +1,425 @@
+# llm_scheduler.py
+"""
+Rate limiting, prioritisation, retries and circuit breaking for LLM traffic.
+
+The gateway hands every upstream request to ``LLMScheduler.execute``, which
+
+1. fails fast while the circuit breaker is open (provider incident); once
+   it half-opens, a single probe request goes through and the rest keep
+   failing fast until the probe succeeds,
+2. waits for room in the model's requests/min and tokens/min token buckets,
+   serving queued requests in priority order (``critical`` before ``normal``
+   before ``background``; background work also leaves a reserve untouched),
+3. retries rate-limit, timeout, connection and 5xx errors with non-blocking
+   ``asyncio.sleep`` backoff, honouring ``Retry-After`` and pausing the whole
+   model bucket on a 429 so workers do not retry in lock-step,
+4. bounds each attempt by the request timeout and the caller's deadline, and
+   raises ``LLMTimeoutError`` once the deadline cannot be met. Running out of
+   the caller's deadline says nothing about the provider, so it never counts
+   towards the circuit breaker.
+
+All methods run on the gateway's event loop.
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import random
+import time
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE_LIMITS = {"default": {"rpm": 500, "tpm": 200_000}}
+DEFAULT_CALL_SITE_PRIORITIES = {
+    "self_consistency": "critical",
+    "choose_best_response": "critical",
+    "name_file": "background",
+    "name_project": "background",
+    "summarize_conversation": "background",
+}
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30.0
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_RESET_SECONDS = 30.0
+DEFAULT_BACKGROUND_RESERVE = 0.2
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+class Priority(IntEnum):
+    CRITICAL = 0
+    NORMAL = 1
+    BACKGROUND = 2
+
+    @classmethod
+    def parse(cls, value: Any) -> "Priority":
+        if isinstance(value, Priority):
+            return value
+        return cls[str(value).upper()]
+
+
+class SchedulerError(Exception):
+    """Base exception for errors raised by the LLM scheduler."""
+
+    pass
+
+
+class CircuitOpenError(SchedulerError):
+    """Raised instead of calling the provider while the circuit breaker is open."""
+
+    pass
+
+
+class LLMTimeoutError(SchedulerError, TimeoutError):
+    """Raised when an LLM request times out or its deadline cannot be met.
+
+    Attributes:
+        call_site (Optional[str]): Call site whose request timed out.
+        timeout (Optional[float]): Seconds the request was allowed, if known.
+        expired (bool): The caller's deadline ran out, rather than the request timeout.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        call_site: Optional[str] = None,
+        timeout: Optional[float] = None,
+        expired: bool = False,
+    ):
+        super().__init__(message)
+        self.call_site = call_site
+        self.timeout = timeout
+        self.expired = expired
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding at most ``per_minute`` units."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, reserve: float = 0.0) -> float:
+        """Seconds until ``amount`` units can be taken while keeping ``reserve`` units."""
+        self._refill()
+        amount = min(amount, self.capacity * (1.0 - reserve))
+        missing = amount + reserve * self.capacity - self.level
+        return max(0.0, missing / self.rate) if missing > 0 else 0.0
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+    def give(self, amount: float) -> None:
+        """Return (or, if negative, additionally charge) units after the real cost is known."""
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive provider failures, half-opens after ``reset_seconds``.
+
+    A half-open breaker admits one probe request at a time; its outcome closes or reopens it.
+    """
+
+    def __init__(self, threshold: int = DEFAULT_BREAKER_THRESHOLD, reset_seconds: float = DEFAULT_BREAKER_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def check(self) -> bool:
+        """Raise ``CircuitOpenError`` unless a request may go out; True if it is the half-open probe."""
+        state = self.state
+        if state == "open":
+            raise CircuitOpenError(
+                f"LLM provider circuit open after {self.failures} consecutive failures; "
+                f"retrying in {self.reset_seconds - (time.monotonic() - self.opened_at):.1f}s"
+            )
+        if state == "half-open":
+            if self.probing:
+                raise CircuitOpenError("LLM provider circuit half-open; waiting for the probe request")
+            self.probing = True
+            return True
+        return False
+
+    def release_probe(self) -> None:
+        """Let another request probe; for probes that ended without a provider verdict."""
+        self.probing = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.probing = False
+        self.failures += 1
+        if self.state == "half-open" or self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning(f"[LLM Scheduler] Circuit opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+
+
+class _ModelLane:
+    """Buckets and priority queue of waiting requests for one model."""
+
+    def __init__(self, rpm: Optional[float], tpm: Optional[float]):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.paused_until = 0.0
+        self.waiting: List[tuple] = []
+
+    def wait_time(self, tokens: float, reserve: float) -> float:
+        wait = max(0.0, self.paused_until - time.monotonic())
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(1, reserve))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(tokens, reserve))
+        return wait
+
+    def take(self, tokens: float) -> None:
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+
+
+def estimate_request_tokens(params: Dict[str, Any]) -> int:
+    """Rough prompt + completion token estimate used to reserve TPM capacity."""
+    if "input" in params:
+        return max(1, len(json.dumps(params["input"], default=str)) // 4)
+    prompt = len(json.dumps(params.get("messages", []), default=str)) // 4
+    completion = params.get("max_completion_tokens") or params.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+    return max(1, prompt + completion * (params.get("n") or 1))
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read ``retry-after-ms`` / ``retry-after`` from an API error's response headers."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, timeouts, connection failures and 5xx responses are worth retrying."""
+    if isinstance(error, (openai.APIConnectionError, LLMTimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+class LLMScheduler:
+    """Per-model RPM/TPM buckets with priority queueing, retries and a circuit breaker.
+
+    Attributes:
+        rate_limits (Dict[str, dict]): ``{model: {"rpm": ..., "tpm": ...}}``; the
+            ``"default"`` entry applies to models without their own entry.
+        priorities (Dict[str, Priority]): Priority class per call site (default normal).
+        max_retries (int): Retries of transient provider errors per request.
+        background_reserve (float): Fraction of each bucket background work may not use.
+        stats (Dict[str, int]): Counters for requests, retries, 429s and fast failures.
+    """
+
+    def __init__(
+        self,
+        rate_limits: Optional[Dict[str, dict]] = None,
+        priorities: Optional[Dict[str, Any]] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        breaker_threshold: int = DEFAULT_BREAKER_THRESHOLD,
+        breaker_reset_seconds: float = DEFAULT_BREAKER_RESET_SECONDS,
+        background_reserve: float = DEFAULT_BACKGROUND_RESERVE,
+    ):
+        self.rate_limits = dict(rate_limits or {})
+        self.priorities = {site: Priority.parse(p) for site, p in (priorities or {}).items()}
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.background_reserve = background_reserve
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset_seconds)
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "failed_fast": 0, "timeouts": 0}
+        self._lanes: Dict[str, _ModelLane] = {}
+        self._sequence = itertools.count()
+        self._changed: Optional[asyncio.Event] = None
+        self._changed_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def priority_for(self, call_site: Optional[str]) -> Priority:
+        return self.priorities.get(call_site or "", Priority.NORMAL)
+
+    def _lane(self, model: str) -> _ModelLane:
+        if model not in self._lanes:
+            limits = self.rate_limits.get(model) or self.rate_limits.get("default") or {}
+            self._lanes[model] = _ModelLane(limits.get("rpm"), limits.get("tpm"))
+        return self._lanes[model]
+
+    def _notify(self) -> None:
+        if self._changed is not None:
+            self._changed.set()
+
+    async def acquire(self, model: str, tokens: int, priority: Priority = Priority.NORMAL) -> None:
+        """Wait until this request is first in line for ``model`` and the buckets allow it."""
+        lane = self._lane(model)
+        if self._changed_loop is not asyncio.get_running_loop():
+            self._changed, self._changed_loop = asyncio.Event(), asyncio.get_running_loop()
+        ticket = (int(priority), next(self._sequence))
+        heapq.heappush(lane.waiting, ticket)
+        reserve = self.background_reserve if priority == Priority.BACKGROUND else 0.0
+        try:
+            while True:
+                wait = None
+                if lane.waiting[0] == ticket:
+                    wait = lane.wait_time(tokens, reserve)
+                    if wait <= 0:
+                        lane.take(tokens)
+                        return
+                self._changed.clear()
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            lane.waiting.remove(ticket)
+            heapq.heapify(lane.waiting)
+            self._notify()
+
+    def _settle(self, model: str, estimated: int, response: Any) -> None:
+        usage = getattr(response, "usage", None)
+        actual = getattr(usage, "total_tokens", None)
+        lane = self._lane(model)
+        if isinstance(actual, int) and lane.tokens is not None:
+            lane.tokens.give(estimated - actual)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        hinted = retry_after_seconds(error)
+        if hinted is not None:
+            return min(hinted, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2**attempt)))
+
+    async def execute(
+        self,
+        call: Callable[[], Awaitable[Any]],
+        model: str,
+        tokens: int,
+        call_site: Optional[str] = None,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> Any:
+        """Run ``call`` under the rate limits, retrying transient provider errors.
+
+        Each attempt may take at most ``timeout`` seconds and must finish before
+        ``deadline`` (a ``time.monotonic()`` value); ``LLMTimeoutError`` is raised
+        when an attempt overruns and no retry can finish in time.
+        """
+        priority = self.priority_for(call_site)
+        for attempt in range(self.max_retries + 1):
+            try:
+                probe = self.breaker.check()
+            except CircuitOpenError:
+                self.stats["failed_fast"] += 1
+                raise
+            try:
+                await self._bounded(self.acquire(model, tokens, priority), None, deadline, call_site)
+                self.stats["requests"] += 1
+                try:
+                    response = await self._bounded(call(), timeout, deadline, call_site)
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    delay = self._backoff(attempt, e)
+                    if getattr(e, "status_code", None) == 429:
+                        self.stats["rate_limited"] += 1
+                        lane = self._lane(model)
+                        lane.paused_until = max(lane.paused_until, time.monotonic() + delay)
+                    elif not getattr(e, "expired", False):
+                        self.breaker.record_failure()
+                    if attempt >= self.max_retries:
+                        raise
+                    if deadline is not None and time.monotonic() + delay >= deadline:
+                        self.stats["timeouts"] += 1
+                        raise LLMTimeoutError(
+                            f"Deadline for {call_site or 'unknown'} leaves no time to retry after {type(e).__name__}",
+                            call_site,
+                            timeout,
+                            expired=True,
+                        ) from e
+                    self.stats["retries"] += 1
+                    logger.info(
+                        f"[LLM Scheduler] {type(e).__name__} from {call_site or 'unknown'}; "
+                        f"retry {attempt + 1}/{self.max_retries} in {delay:.2f}s"
+                    )
+                    if probe:
+                        self.breaker.release_probe()
+                        probe = False
+                    await asyncio.sleep(delay)
+                    continue
+                self.breaker.record_success()
+                self._settle(model, tokens, response)
+                return response
+            finally:
+                # Rate limits, deadlines and bad requests say nothing about the provider
+                if probe and self.breaker.probing:
+                    self.breaker.release_probe()
+
+    async def _bounded(
+        self,
+        awaitable: Awaitable[Any],
+        timeout: Optional[float],
+        deadline: Optional[float],
+        call_site: Optional[str],
+    ) -> Any:
+        """Await ``awaitable`` for at most ``timeout`` seconds and no later than ``deadline``."""
+        limit = timeout
+        if deadline is not None:
+            left = deadline - time.monotonic()
+            limit = left if limit is None else min(limit, left)
+        if limit is None:
+            return await awaitable
+        if limit <= 0:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            self.stats["timeouts"] += 1
+            raise LLMTimeoutError(
+                f"Deadline for {call_site or 'unknown'} has already passed", call_site, timeout, expired=True
+            )
+        try:
+            return await asyncio.wait_for(awaitable, limit)
+        except asyncio.TimeoutError as e:
+            self.stats["timeouts"] += 1
+            raise LLMTimeoutError(
+                f"LLM request from {call_site or 'unknown'} timed out after {limit:.1f}s",
+                call_site,
+                limit,
+                expired=limit != timeout,
+            ) from e
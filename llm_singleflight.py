@@ -0,0 +1,93 @@
+# llm_singleflight.py
+"""
+Single-flight coalescing of identical LLM requests.
+
+When several callers issue the same request (same kind and parameters, see
+``llm_cache.cache_key``) while one is already in flight, or within
+``linger_seconds`` after it finished, they all receive the result of that one
+upstream call instead of paying for their own. Failures are shared with the
+callers that were waiting but are not remembered afterwards.
+
+Coalescing changes semantics for sampled requests (identical prompts would no
+longer produce independent samples), so it is opt-in per call site.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LINGER_SECONDS = 5.0
+# Call sites that repeatedly send identical requests within one run. Sampled
+# ones such as judge_step and name_project are left for callers to opt into.
+DEFAULT_SINGLE_FLIGHT_CALL_SITES = (
+    "output_type_determination",
+    "task_into_prompt",
+    "extract_information",
+    "generate_plan",
+    "define_problem",
+)
+
+
+class SingleFlight:
+    """Shares one upstream call between identical concurrent requests.
+
+    Attributes:
+        call_sites (set): Call sites whose requests may be coalesced.
+        linger_seconds (float): How long a finished result keeps answering
+            identical requests.
+        stats (Dict[str, int]): ``leaders`` (upstream calls made), ``collapsed``
+            (joined an in-flight call) and ``lingered`` (served a just-finished result).
+    """
+
+    def __init__(
+        self,
+        call_sites: Iterable[str] = DEFAULT_SINGLE_FLIGHT_CALL_SITES,
+        linger_seconds: float = DEFAULT_LINGER_SECONDS,
+    ):
+        self.call_sites = set(call_sites)
+        self.linger_seconds = linger_seconds
+        self.stats = {"leaders": 0, "collapsed": 0, "lingered": 0}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._recent: Dict[str, Tuple[float, Any]] = {}
+
+    @property
+    def collapsed_calls(self) -> int:
+        """Number of requests that did not need their own upstream call."""
+        return self.stats["collapsed"] + self.stats["lingered"]
+
+    def applies_to(self, call_site: Optional[str]) -> bool:
+        return call_site in self.call_sites
+
+    def _prune(self, now: float) -> None:
+        expired = [k for k, (finished, _) in self._recent.items() if now - finished > self.linger_seconds]
+        for key in expired:
+            del self._recent[key]
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]], call_site: Optional[str] = None) -> Any:
+        """Return the result for ``key``, running ``call`` only if no identical request is pending."""
+        now = time.monotonic()
+        self._prune(now)
+        if key in self._recent:
+            self.stats["lingered"] += 1
+            logger.debug(f"[Single-flight] Reusing just-finished result for {call_site}")
+            return self._recent[key][1]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["collapsed"] += 1
+            logger.debug(f"[Single-flight] Joining in-flight request for {call_site}")
+        else:
+            self.stats["leaders"] += 1
+            task = asyncio.get_running_loop().create_task(call())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        # Shielded so that one caller giving up does not cancel the shared call
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None and self.linger_seconds > 0:
+            self._recent[key] = (time.monotonic(), task.result())
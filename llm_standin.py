@@ -0,0 +1,574 @@
+# llm_standin.py
+"""
+Local stand-in for the OpenAI HTTP API, for offline runs and benchmarks.
+
+The server implements the two routes the engine uses:
+
+* ``POST /v1/chat/completions`` -- serves both ``chat.completions.create`` and
+  ``beta.chat.completions.parse`` (the latter sends a ``json_schema``
+  ``response_format``).
+* ``POST /v1/embeddings`` -- serves ``embeddings.create``.
+
+It runs in one of three modes:
+
+* ``synth``  -- synthesize responses: tag-formatted text (``<count>``,
+  ``<thinking>``, ``<step>``, ``<reflection>``, ``<reward>``,
+  ``<agent_response>`` ...) for the tags the prompt asks for, JSON that
+  validates against the requested schema (``CompletionStatus``,
+  ``StepNumber``, ``ExtractFormat``, ``OutputType`` ...), and deterministic
+  pseudo-random embeddings.
+* ``replay`` -- answer from a recorded JSONL transcript, falling back to
+  ``synth`` for requests that were never recorded (unless ``strict``).
+* ``record`` -- forward every request to the real API and append the exchange
+  to the transcript.
+
+Requests with ``stream=True`` get the same completion as server-sent events,
+with the latency spread across the chunks, so clients that hang up early (see
+``llm_gateway.chat_stream``) save time here just as they would upstream.
+
+Each route can be given a latency distribution, optionally per call site (the
+gateway sends the call site in the ``X-LLM-Call-Site`` header). Point the
+engine at the server with ``OPENAI_BASE_URL=http://127.0.0.1:<port>/v1``.
+
+Usage:
+    python llm_standin.py --mode synth --latency chat=lognormal:-1.6,0.5
+    python llm_standin.py --mode record --transcript runs/task1.jsonl
+    python llm_standin.py --mode replay --transcript runs/task1.jsonl
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from llm_gateway import CALL_SITE_HEADER
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_UPSTREAM = "https://api.openai.com/v1"
+DEFAULT_EMBEDDING_DIMENSIONS = 1536
+MODES = ("synth", "replay", "record")
+
+ROUTES = {
+    "/v1/chat/completions": "chat",
+    "/chat/completions": "chat",
+    "/v1/embeddings": "embeddings",
+    "/embeddings": "embeddings",
+}
+
+# Order in which synthesized tags are emitted when the prompt mentions them
+RESPONSE_TAGS = ("count", "thinking", "step", "reflection", "reward", "answer", "final_reward", "agent_response")
+
+
+class LatencyModel:
+    """Samples a response delay (seconds) from a named distribution.
+
+    Specs are ``"<dist>:<a>[,<b>]"``: ``fixed:0.2``, ``uniform:0.1,0.5``,
+    ``normal:0.3,0.05`` or ``lognormal:-1.6,0.5`` (parameters of the
+    underlying normal). Negative samples are clipped to zero.
+    """
+
+    DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+    def __init__(self, spec: str = "fixed:0", seed: Optional[int] = None):
+        name, _, args = spec.partition(":")
+        if name not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{name}' in '{spec}'")
+        self.spec = spec
+        self.name = name
+        self.params = [float(a) for a in args.split(",") if a.strip()] or [0.0]
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.name == "fixed":
+                value = self.params[0]
+            elif self.name == "uniform":
+                value = self._rng.uniform(self.params[0], self.params[-1])
+            elif self.name == "normal":
+                value = self._rng.gauss(self.params[0], self.params[-1])
+            else:
+                value = self._rng.lognormvariate(self.params[0], self.params[-1])
+        return max(0.0, value)
+
+
+def request_key(route: str, body: Dict[str, Any]) -> str:
+    """Hash of a request body, used to match replays to recordings."""
+    blob = json.dumps({"route": route, "body": body}, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _message_text(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for message in messages or []:
+        content = message.get("content")
+        if isinstance(content, list):
+            content = " ".join(str(p.get("text", "")) for p in content if isinstance(p, dict))
+        parts.append(str(content or ""))
+    return "\n".join(parts)
+
+
+class ResponseSynthesizer:
+    """Builds plausible, parseable responses without calling a model."""
+
+    def __init__(self, seed: Optional[int] = None, embedding_dimensions: int = DEFAULT_EMBEDDING_DIMENSIONS):
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.embedding_dimensions = embedding_dimensions
+
+    def _reward(self) -> str:
+        with self._lock:
+            return f"{self._rng.uniform(0.55, 0.95):.2f}"
+
+    # -------------------------------
+    # Chat
+    # -------------------------------
+    def chat_content(self, body: Dict[str, Any]) -> str:
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            schema = response_format.get("json_schema", {}).get("schema", {})
+            return json.dumps(self.from_schema(schema, schema))
+        if response_format.get("type") == "json_object":
+            return json.dumps({"result": "stand-in"})
+        return self.tagged_text(_message_text(body.get("messages", [])))
+
+    def tagged_text(self, prompt: str) -> str:
+        requested = [tag for tag in RESPONSE_TAGS if f"<{tag}>" in prompt]
+        if not requested:
+            last_line = prompt.strip().splitlines()[-1] if prompt.strip() else ""
+            return f"Stand-in response to: {last_line[:200]}"
+
+        counts = [int(c) for c in re.findall(r"<count>\s*(\d+)", prompt)]
+        count = max(counts[-1] - 1, 0) if counts else 5
+        parts = []
+        for tag in requested:
+            if tag == "count":
+                body = str(count)
+            elif tag in ("reward", "final_reward"):
+                body = self._reward()
+            elif tag == "answer" and count > 1:
+                continue
+            elif tag == "thinking":
+                body = "Considering the task and the previous steps before acting."
+            elif tag == "step":
+                body = "Carry out the next part of the plan and record the result."
+            elif tag == "reflection":
+                body = "The step is relevant and clear; the next step should add detail."
+            elif tag == "answer":
+                body = "Stand-in final answer summarizing the completed steps."
+            else:
+                body = "Stand-in agent contribution to the discussion."
+            parts.append(f"<{tag}>{body}</{tag}>")
+        return "\n".join(parts)
+
+    def from_schema(self, schema: Dict[str, Any], root: Dict[str, Any], name: str = "") -> Any:
+        """Produce a value that validates against a (pydantic-generated) JSON schema."""
+        if "$ref" in schema:
+            ref = schema["$ref"].split("/")[-1]
+            return self.from_schema(root.get("$defs", {}).get(ref, {}), root, name)
+        for combinator in ("anyOf", "oneOf", "allOf"):
+            if combinator in schema:
+                options = [s for s in schema[combinator] if s.get("type") != "null"] or schema[combinator]
+                return self.from_schema(options[0], root, name)
+        if "const" in schema:
+            return schema["const"]
+        if "enum" in schema:
+            return schema["enum"][0]
+        if "default" in schema and schema.get("type") not in ("object", "array"):
+            return schema["default"]
+
+        kind = schema.get("type")
+        if isinstance(kind, list):
+            kind = next((k for k in kind if k != "null"), "null")
+        if kind == "object" or "properties" in schema:
+            return {
+                key: self.from_schema(sub, root, key)
+                for key, sub in schema.get("properties", {}).items()
+            }
+        if kind == "array":
+            return [self.from_schema(schema.get("items", {}), root, name)]
+        if kind == "boolean":
+            return True
+        if kind == "integer":
+            return max(int(schema.get("minimum", 1)), 1)
+        if kind == "number":
+            return float(self._reward())
+        if kind == "null":
+            return None
+        return f"stand-in {name or 'text'}"
+
+    # -------------------------------
+    # Embeddings
+    # -------------------------------
+    def embedding(self, text: str, dimensions: Optional[int] = None) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        rng = random.Random(seed)
+        vector = [rng.gauss(0.0, 1.0) for _ in range(dimensions or self.embedding_dimensions)]
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    # -------------------------------
+    # Full response bodies
+    # -------------------------------
+    def chat_completion(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        prompt_tokens = estimate_tokens(_message_text(body.get("messages", [])))
+        choices = []
+        for index in range(body.get("n") or 1):
+            content = self.chat_content(body)
+            choices.append(
+                {
+                    "index": index,
+                    "finish_reason": "stop",
+                    "logprobs": None,
+                    "message": {"role": "assistant", "content": content, "refusal": None},
+                }
+            )
+        completion_tokens = sum(estimate_tokens(c["message"]["content"]) for c in choices)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stand-in"),
+            "choices": choices,
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def embeddings(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        inputs = body.get("input", "")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        tokens = sum(estimate_tokens(str(i)) for i in inputs)
+        return {
+            "object": "list",
+            "model": body.get("model", "stand-in"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": self.embedding(str(text), body.get("dimensions"))}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+
+def stream_chunks(completion: Dict[str, Any], include_usage: bool = False, words_per_chunk: int = 4) -> List[Dict[str, Any]]:
+    """Split a chat completion into ``chat.completion.chunk`` payloads."""
+    base = {
+        "id": completion.get("id", ""),
+        "object": "chat.completion.chunk",
+        "created": completion.get("created", 0),
+        "model": completion.get("model", ""),
+    }
+    # One list of chunks per choice, interleaved like the API does for n > 1
+    per_choice = []
+    for choice in completion.get("choices", []):
+        index = choice.get("index", 0)
+        content = (choice.get("message") or {}).get("content") or ""
+        pieces = re.findall(r"\S+\s*|\s+", content)
+        own = [
+            {
+                **base,
+                "choices": [
+                    {
+                        "index": index,
+                        "delta": {"content": "".join(pieces[start : start + words_per_chunk])},
+                        "finish_reason": None,
+                    }
+                ],
+            }
+            for start in range(0, len(pieces), words_per_chunk)
+        ]
+        own.append({**base, "choices": [{"index": index, "delta": {}, "finish_reason": choice.get("finish_reason", "stop")}]})
+        per_choice.append(own)
+    chunks = []
+    for position in range(max((len(own) for own in per_choice), default=0)):
+        chunks.extend(own[position] for own in per_choice if position < len(own))
+    if include_usage and completion.get("usage"):
+        chunks.append({**base, "choices": [], "usage": completion["usage"]})
+    return chunks
+
+
+class Transcript:
+    """Append-only JSONL store of recorded exchanges, indexed by request key."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursor: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries.setdefault(entry["key"], []).append(entry)
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._entries.values())
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the next recording for ``key``; repeated requests cycle through their recordings."""
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+            return entries[index % len(entries)]
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries.setdefault(entry["key"], []).append(entry)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+
+
+class StandinServer:
+    """Threaded HTTP server answering OpenAI-style requests locally.
+
+    Attributes:
+        mode (str): One of ``synth``, ``replay`` or ``record``.
+        transcript (Transcript): Recorded exchanges used by ``replay``/``record``.
+        latencies (Dict[str, LatencyModel]): Delay models keyed by call site,
+            route (``chat``/``embeddings``) or ``default``.
+        stats (Dict[str, int]): Request counters by outcome.
+    """
+
+    def __init__(
+        self,
+        mode: str = "synth",
+        transcript_path: Optional[str] = None,
+        latency: Optional[Dict[str, str]] = None,
+        host: str = DEFAULT_HOST,
+        port: int = 0,
+        upstream: str = DEFAULT_UPSTREAM,
+        strict: bool = False,
+        seed: Optional[int] = None,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, got '{mode}'")
+        self.mode = mode
+        self.strict = strict
+        self.upstream = upstream.rstrip("/")
+        self.transcript = Transcript(transcript_path)
+        self.synthesizer = ResponseSynthesizer(seed=seed)
+        self.latencies = {key: LatencyModel(spec, seed) for key, spec in (latency or {}).items()}
+        self.stats = {"requests": 0, "replayed": 0, "synthesized": 0, "recorded": 0, "errors": 0, "streams_aborted": 0}
+        self._stats_lock = threading.Lock()
+        self._upstream_client: Optional[httpx.Client] = None
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _count(self, outcome: str) -> None:
+        with self._stats_lock:
+            self.stats["requests"] += outcome != "errors"
+            self.stats[outcome] += 1
+
+    def _delay(self, route: str, call_site: Optional[str]) -> float:
+        model = self.latencies.get(call_site or "") or self.latencies.get(route) or self.latencies.get("default")
+        return model.sample() if model is not None else 0.0
+
+    def _forward(self, path: str, body: Dict[str, Any], authorization: Optional[str]) -> Tuple[int, Dict[str, Any]]:
+        if self._upstream_client is None:
+            self._upstream_client = httpx.Client(timeout=httpx.Timeout(600.0, connect=10.0))
+        headers = {"Authorization": authorization or f"Bearer {os.getenv('OPENAI_API_KEY', '')}"}
+        route_path = path[len("/v1"):] if path.startswith("/v1") else path
+        response = self._upstream_client.post(self.upstream + route_path, json=body, headers=headers)
+        return response.status_code, response.json()
+
+    def handle(
+        self, path: str, body: Dict[str, Any], call_site: Optional[str], authorization: Optional[str]
+    ) -> Tuple[int, Dict[str, Any], float]:
+        """Produce ``(status, json_body, delay_seconds)`` for one request according to the mode.
+
+        Streaming is handled by the HTTP layer, so ``stream``/``stream_options``
+        are ignored here: recordings and replays always hold full completions.
+        """
+        route = ROUTES.get(path)
+        if route is None:
+            return 404, {"error": {"message": f"Unknown route {path}", "type": "invalid_request_error"}}, 0.0
+        body = {k: v for k, v in body.items() if k not in ("stream", "stream_options")}
+        key = request_key(route, body)
+
+        if self.mode == "record":
+            started = time.monotonic()
+            status, payload = self._forward(path, body, authorization)
+            if status == 200:
+                self.transcript.append(
+                    {
+                        "key": key,
+                        "route": route,
+                        "call_site": call_site,
+                        "latency": time.monotonic() - started,
+                        "request": body,
+                        "response": payload,
+                    }
+                )
+                self._count("recorded")
+            return status, payload, 0.0
+
+        delay = self._delay(route, call_site)
+        if self.mode == "replay":
+            entry = self.transcript.lookup(key)
+            if entry is not None:
+                self._count("replayed")
+                return 200, entry["response"], delay
+            if self.strict:
+                return 404, {"error": {"message": f"No recording for request {key}", "type": "not_found"}}, 0.0
+            logger.info(f"[Stand-in] No recording for {route} request from {call_site}; synthesizing")
+
+        self._count("synthesized")
+        if route == "embeddings":
+            return 200, self.synthesizer.embeddings(body), delay
+        return 200, self.synthesizer.chat_completion(body), delay
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = {}
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    status, payload, delay = server.handle(
+                        self.path.split("?")[0],
+                        body,
+                        self.headers.get(CALL_SITE_HEADER),
+                        self.headers.get("Authorization"),
+                    )
+                except Exception as e:
+                    logger.exception("[Stand-in] Request failed")
+                    server._count("errors")
+                    status, payload, delay = 500, {"error": {"message": str(e), "type": "server_error"}}, 0.0
+                if status == 200 and body.get("stream"):
+                    self.send_stream(payload, delay, (body.get("stream_options") or {}).get("include_usage"))
+                    return
+                time.sleep(delay)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_stream(self, completion: Dict[str, Any], delay: float, include_usage: bool):
+                """Replay a full completion as server-sent events, spreading ``delay`` over the chunks."""
+                chunks = stream_chunks(completion, include_usage)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                try:
+                    for chunk in chunks:
+                        time.sleep(delay / len(chunks))
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                    self.wfile.write(b"data: [DONE]\n\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    with server._stats_lock:
+                        server.stats["streams_aborted"] += 1
+
+            def log_message(self, format, *args):
+                logger.debug("[Stand-in] " + format % args)
+
+        return Handler
+
+    def start(self) -> "StandinServer":
+        """Serve on a background thread; returns ``self`` so ``base_url`` can be read."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="llm-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._httpd.serve_forever()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+        if self._upstream_client is not None:
+            self._upstream_client.close()
+
+
+def parse_latency_args(values: List[str]) -> Dict[str, str]:
+    """Turn ``["chat=lognormal:-1.6,0.5", "fixed:0.1"]`` into a latency mapping."""
+    latency = {}
+    for value in values or []:
+        target, sep, spec = value.partition("=")
+        if not sep:
+            target, spec = "default", value
+        latency[target] = spec
+    return latency
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI API.")
+    parser.add_argument("--mode", choices=MODES, default="synth")
+    parser.add_argument("--transcript", help="JSONL transcript to replay from or record to")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--upstream", default=os.getenv("LLM_STANDIN_UPSTREAM", DEFAULT_UPSTREAM))
+    parser.add_argument(
+        "--latency",
+        action="append",
+        help="[call_site|chat|embeddings=]<dist>:<params>, e.g. chat=lognormal:-1.6,0.5 (repeatable)",
+    )
+    parser.add_argument("--strict", action="store_true", help="In replay mode, 404 on unrecorded requests")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    server = StandinServer(
+        mode=args.mode,
+        transcript_path=args.transcript,
+        latency=parse_latency_args(args.latency),
+        host=args.host,
+        port=args.port,
+        upstream=args.upstream,
+        strict=args.strict,
+        seed=args.seed,
+    )
+    print(f"LLM stand-in ({args.mode}) listening; export OPENAI_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(json.dumps(server.stats))
+
+
+if __name__ == "__main__":
+    main()
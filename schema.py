@@ -52,6 +52,15 @@ class RunConversationResponse:
 class FeedbackResponse:
     success: str
 
+# Define the response type for a time-budgeted complexity assessment
+@strawberry.type
+class ComplexityResponse:
+    score: float
+    is_complex: bool
+    measures_used: List[str]
+    skipped: List[str]
+    confidence: float
+
 # Define the root Query class
 @strawberry.type
 class Query:
@@ -59,6 +68,20 @@ class Query:
     def hello(self) -> str:
         return "Hello, World!"
 
+    @strawberry.field
+    def complexity(self, query: str, time_budget_ms: int = 300) -> ComplexityResponse:
+        from complexity_measures import score_complexity
+
+        # Interactive requests only run the measures that fit the budget
+        assessment = score_complexity(query, need_plan=False, time_budget=time_budget_ms / 1000)
+        return ComplexityResponse(
+            score=assessment.total_score,
+            is_complex=assessment.is_complex,
+            measures_used=assessment.measures_used,
+            skipped=assessment.skipped,
+            confidence=assessment.confidence,
+        )
+
 # Define the root Mutation class
 @strawberry.type
 class Mutation:
@@ -17,7 +17,14 @@ from advanced_prompting import (
     ComponentType # Ensure ComponentType is imported
 )
 import re
+import tempfile
+import complexity_measures
+import conversation_manager
+import llm_deadline
+import llm_gateway
+import llm_ledger
 from complexity_measures import Plan, PlanStep
+from llm_scheduler import LLMTimeoutError
 import test_c # These seem to be related to the custom config, might not be needed for new tests
 import test_b # These seem to be related to the custom config, might not be needed for new tests
 from pydantic import BaseModel
@@ -669,6 +676,97 @@ class TestAdvancedPromptEngineer(unittest.TestCase):
             output_type=self.output_type,
         )
 
+    def test_failed_run_does_not_leak_its_deadline(self):
+        self.engineer.config.run_timeout_seconds = 0.01
+        with patch.object(
+            self.engineer, "retrieve_information", side_effect=LLMTimeoutError("deadline passed")
+        ):
+            with self.assertRaises(LLMTimeoutError):
+                self.engineer.main("Write a function to calculate factorial")
+        self.assertIsNone(llm_deadline.current_deadline())
+        self.assertEqual(llm_ledger.current_labels(), {})
+        with llm_deadline.deadline(60):
+            self.assertGreater(llm_deadline.remaining(), 59)
+
+    def test_failed_conversation_does_not_leak_its_deadline(self):
+        with patch.object(
+            conversation_manager, "define_problem", side_effect=LLMTimeoutError("deadline passed")
+        ):
+            with self.assertRaises(LLMTimeoutError):
+                conversation_manager.run_conversation(
+                    "Write a function to calculate factorial", [], "Mediator", timeout_seconds=0.01
+                )
+        self.assertIsNone(llm_deadline.current_deadline())
+        self.assertEqual(llm_ledger.current_labels(), {})
+
+    def test_complexity_is_served_from_the_cache(self):
+        calls = []
+
+        def llm(query):
+            calls.append(query)
+            return (0.8, self.sample_task.plan)
+
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        for target, value in (
+            ("COMPLEXITY_MEASURES", [complexity_measures.Measure("llm", llm, required=True)]),
+            ("COMPLEXITY_WEIGHTS", {"llm": 1.0}),
+            ("latency_profile_path", None),
+            ("save_path", os.path.join(tmpdir.name, "complexity.log")),
+            ("get_ml_learner", MagicMock()),
+            ("complexity_cache_path", None),
+            ("complexity_cache_ttl_seconds", None),
+        ):
+            patcher = patch.object(complexity_measures, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.dict(complexity_measures._resources)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        complexity_measures.configure_complexity_cache(os.path.join(tmpdir.name, "cache.sqlite3"), None)
+        self.addCleanup(complexity_measures.configure_complexity_cache, None)
+
+        complexity, plan = self.engineer.assess_complexity("Calculate the factorial of 10")
+        budget, cached_plan = self.engineer.adjust_step_budget("  calculate THE factorial\tof 10 ", 0)
+        self.assertEqual(len(calls), 1)
+        self.assertAlmostEqual(complexity, 0.8)
+        config = self.config_container.config
+        self.assertEqual(budget, int(config.initial_budget + 0.8 * config.complexity_factor))
+        self.assertEqual(cached_plan, plan)
+
+    def test_streamed_step_keeps_its_inline_reward(self):
+        generation = (
+            "<count>1</count><thinking>Recursion fits.</thinking>"
+            "<step>Define factorial(n) with a base case for 0.</step>"
+            "<reflection>Correct and minimal.</reflection><reward>0.9</reward>"
+            "<count>0</count><thinking>Next I would test it.</thinking>"
+        )
+        stop_markers = []
+
+        def stream(stop_at, **request):
+            # Hang up at the first marker, the way the gateway's stream does
+            stop_markers.append(stop_at)
+            cut = llm_gateway.find_stop_marker(generation, stop_at)
+            content = generation if cut < 0 else generation[:cut]
+            return SimpleNamespace(choices=[SimpleNamespace(index=0, message=SimpleNamespace(content=content))])
+
+        with patch.object(self.engineer.config, "agents", 1), patch.object(
+            llm_gateway, "chat_stream_sync", side_effect=stream
+        ), patch.object(self.engineer, "judge_step") as judge_step, patch.object(
+            self.engineer, "judge_step_completion", return_value=(True, 2)
+        ):
+            responses = self.engineer.collaborative_reasoning(
+                self.sample_task, "Calculate factorial.", None, self.output_type,
+                step_budget=1, step_number=0, plan_step_num=1,
+            )
+
+        self.assertEqual(stop_markers, [["</reward>", "</agent_response>"]])
+        judge_step.assert_not_called()
+        step = responses[0].steps[0]
+        self.assertEqual(step.description, "Define factorial(n) with a base case for 0.")
+        self.assertEqual(step.reflection.content, "Correct and minimal.")
+        self.assertAlmostEqual(step.reflection.reward, 0.9)
+
     def test_count_tokens(self):
         text = ["Hello world", "Testing tokens"]
         token_count = self.engineer.count_tokens(text)
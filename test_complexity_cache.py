@@ -0,0 +1,72 @@
+import os
+import tempfile
+import time
+import unittest
+
+from complexity_cache import ComplexityCache, fingerprint, query_key
+
+ASSESSMENT = {
+    "total_score": 0.72,
+    "is_complex": True,
+    "plan": {"steps": []},
+    "scores": {"nlp": 0.8, "llm": 0.7},
+}
+
+
+class TestComplexityCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, "complexity.sqlite3")
+        self.cache = ComplexityCache(self.path)
+        self.addCleanup(self.cache.close)
+
+    def test_key_ignores_case_and_whitespace(self):
+        self.assertEqual(query_key("Plan a  Migration.\n"), query_key(" plan a migration."))
+        self.assertNotEqual(query_key("Plan a migration."), query_key("Plan a migration!"))
+
+    def test_round_trip_survives_reopen(self):
+        self.cache.put("Plan a migration.", "v1", ASSESSMENT)
+        self.cache.close()
+        reopened = ComplexityCache(self.path)
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.get("  PLAN a migration. ", "v1"), ASSESSMENT)
+
+    def test_other_version_is_a_miss_and_is_dropped(self):
+        self.cache.put("Plan a migration.", "v1", ASSESSMENT)
+        self.assertIsNone(self.cache.get("Plan a migration.", "v2"))
+        self.assertIsNone(self.cache.get("Plan a migration.", "v1"))
+        self.assertEqual(self.cache.stats()["invalidations"], 1)
+
+    def test_partial_entries_only_answer_decisions(self):
+        self.cache.put("Name a color.", "v1", ASSESSMENT, complete=False)
+        self.assertIsNone(self.cache.get("Name a color.", "v1", complete=True))
+        self.assertEqual(self.cache.get("Name a color.", "v1"), ASSESSMENT)
+
+        complete = dict(ASSESSMENT, total_score=0.3)
+        self.cache.put("Name a color.", "v1", complete)
+        self.cache.put("Name a color.", "v1", ASSESSMENT, complete=False)
+        self.assertEqual(self.cache.get("Name a color.", "v1", complete=True), complete)
+
+    def test_expired_entries_are_misses(self):
+        cache = ComplexityCache(self.path, ttl_seconds=0.01)
+        self.addCleanup(cache.close)
+        cache.put("Name a color.", "v1", ASSESSMENT)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("Name a color.", "v1"))
+
+    def test_prune_keeps_only_the_current_version(self):
+        self.cache.put("Name a color.", "v1", ASSESSMENT)
+        self.cache.put("Plan a migration.", "v2", ASSESSMENT)
+        self.assertEqual(self.cache.prune("v2"), 1)
+        self.assertEqual(self.cache.stats()["entries"], 1)
+
+    def test_fingerprint_tracks_sources_and_settings(self):
+        base = fingerprint(["def f(): return 1"], {"weights": {"nlp": 0.1}})
+        self.assertEqual(base, fingerprint(["def f(): return 1"], {"weights": {"nlp": 0.1}}))
+        self.assertNotEqual(base, fingerprint(["def f(): return 2"], {"weights": {"nlp": 0.1}}))
+        self.assertNotEqual(base, fingerprint(["def f(): return 1"], {"weights": {"nlp": 0.2}}))
+
+
+if __name__ == "__main__":
+    unittest.main()
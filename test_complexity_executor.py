@@ -0,0 +1,191 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import llm_ledger
+from complexity_executor import Measure, MeasureExecutor, timings
+
+
+def slow(seconds, value=1.0):
+    def measure(query):
+        time.sleep(seconds)
+        return value
+
+    return measure
+
+
+def fail(query):
+    raise ValueError("no parse")
+
+
+class TestMeasureExecutor(unittest.TestCase):
+    def setUp(self):
+        self.executor = MeasureExecutor(thread_workers=4)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_measures_overlap_and_keep_their_order(self):
+        measures = [
+            Measure("a", slow(0.2, 0.1)),
+            Measure("b", slow(0.2, 0.2)),
+            Measure("c", lambda query: len(query), pool="inline"),
+        ]
+        started = time.monotonic()
+        results = self.executor.run(measures, "query")
+        self.assertLess(time.monotonic() - started, 0.35)
+        self.assertEqual(list(results), ["a", "b", "c"])
+        self.assertEqual([result.value for result in results.values()], [0.1, 0.2, 5])
+
+    def test_failures_and_timeouts_use_defaults(self):
+        results = self.executor.run(
+            [Measure("broken", fail, default=0.25), Measure("stuck", slow(1.0), timeout=0.05, default=0.5)],
+            "query",
+        )
+        self.assertEqual((results["broken"].value, results["broken"].error), (0.25, "ValueError"))
+        self.assertEqual((results["stuck"].value, results["stuck"].timed_out), (0.5, True))
+        self.assertEqual(self.executor.stats, {"runs": 1, "failures": 1, "timeouts": 1, "skipped": 0})
+        self.assertEqual(timings(results)[0], f"stuck: {results['stuck'].seconds:.2f}s (timeout)")
+
+    def test_required_measure_raises(self):
+        with self.assertRaises(ValueError):
+            self.executor.run([Measure("llm", fail, required=True)], "query")
+
+    def test_serial_group_runs_one_at_a_time(self):
+        active, peak = [0], [0]
+        lock = threading.Lock()
+
+        def parse(query):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return 0.0
+
+        self.executor.run([Measure(str(i), parse, serial_group="spacy") for i in range(3)], "query")
+        self.assertEqual(peak[0], 1)
+
+    def test_serial_group_waiter_gives_up_at_its_timeout(self):
+        calls = []
+
+        def parse(query):
+            calls.append(query)
+            return 0.0
+
+        results = self.executor.run(
+            [Measure("hold", slow(0.3), serial_group="spacy"), Measure("wait", parse, serial_group="spacy", timeout=0.1)],
+            "query",
+        )
+        time.sleep(0.1)
+        self.assertTrue(results["wait"].timed_out)
+        self.assertEqual(calls, [])
+
+    def test_threads_keep_caller_labels(self):
+        with llm_ledger.labels(task="demo"):
+            results = self.executor.run([Measure("labels", lambda query: llm_ledger.current_labels())], "query")
+        self.assertEqual(results["labels"].value, {"task": "demo"})
+
+    def test_process_pool(self):
+        executor = MeasureExecutor(process_workers=1)
+        try:
+            results = executor.run([Measure("len", len, pool="process")], "query")
+        finally:
+            executor.shutdown()
+        self.assertEqual(results["len"].value, 5)
+
+    def test_cascade_runs_cheapest_first_and_stops_when_decided(self):
+        order = []
+
+        def measure(name, value):
+            def run(query):
+                order.append(name)
+                return value
+
+            return run
+
+        measures = [
+            Measure("slow", measure("slow", 0.0), cost=5.0),
+            Measure("plan", measure("plan", 0.5), required=True, cost=10.0),
+            Measure("cheap", measure("cheap", 1.0), pool="inline", cost=0.01),
+            Measure("medium", measure("medium", 0.0), cost=1.0),
+        ]
+        results = self.executor.run_cascade(measures, "query", lambda results: "cheap" in results)
+        self.assertEqual(list(results), ["plan", "cheap"])
+        self.assertNotIn("slow", order)
+        self.assertEqual(self.executor.stats["skipped"], 2)
+
+        self.executor.costs["slow"] = 0.0
+        results = self.executor.run_cascade(measures, "query", lambda results: "slow" in results)
+        self.assertEqual(list(results)[:2], ["slow", "plan"])
+
+    def test_cascade_measures_overlap_and_time_out_from_their_own_start(self):
+        measures = [Measure("a", slow(0.3), timeout=0.5, cost=1.0), Measure("b", slow(0.3), timeout=0.5, cost=2.0)]
+        started = time.monotonic()
+        results = self.executor.run_cascade(measures, "query", lambda results: False)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual([(result.value, result.timed_out) for result in results.values()], [(1.0, False), (1.0, False)])
+
+    def test_cascade_drops_unfinished_measures_once_decided(self):
+        measures = [Measure("quick", slow(0.05), cost=0.1), Measure("long", slow(1.0), cost=5.0)]
+        started = time.monotonic()
+        results = self.executor.run_cascade(measures, "query", lambda results: "quick" in results)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(list(results), ["quick"])
+        self.assertEqual(self.executor.stats["skipped"], 1)
+
+    def test_estimate_and_profile(self):
+        measures = [
+            Measure("regex", len, pool="inline", cost=0.1),
+            Measure("parse", len, serial_group="spacy", cost=1.0),
+            Measure("graph", len, serial_group="spacy", cost=0.5),
+            Measure("llm", len, cost=1.2),
+        ]
+        self.assertAlmostEqual(self.executor.estimate(measures), 1.5)
+        self.executor.costs["llm"] = 2.0
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "profile.json")
+            self.executor.save_profile(path)
+            executor = MeasureExecutor()
+            self.assertTrue(executor.load_profile(path))
+            self.assertFalse(executor.load_profile(os.path.join(tmpdir, "missing.json")))
+        self.assertEqual(executor.cost(measures[3]), 2.0)
+        self.assertEqual(executor.estimate(measures), 2.0)
+
+    def test_batch_calls_batch_functions_once_and_fans_out_the_rest(self):
+        calls = []
+
+        def lengths(queries):
+            calls.append(list(queries))
+            return [len(query) for query in queries]
+
+        measures = [
+            Measure("len", len, batch=lengths),
+            Measure("inline_len", len, pool="inline", batch=lengths),
+            Measure("upper", str.upper),
+            Measure("broken", len, batch=lambda queries: [1.0], default=0.5),
+        ]
+        started = time.monotonic()
+        results = self.executor.run_batch(measures, ["ab", "cde", "f"])
+        self.assertEqual(calls, [["ab", "cde", "f"]] * 2)
+        self.assertEqual([result["len"].value for result in results], [2, 3, 1])
+        self.assertEqual([result["inline_len"].value for result in results], [2, 3, 1])
+        self.assertEqual([result["upper"].value for result in results], ["AB", "CDE", "F"])
+        self.assertEqual([(result["broken"].value, result["broken"].error) for result in results], [(0.5, "ValueError")] * 3)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(self.executor.costs, {})
+
+    def test_batch_timeout_covers_the_whole_batch(self):
+        results = self.executor.run_batch([Measure("slow", slow(0.05), timeout=0.04, default=0.0)], ["a"] * 4)
+        self.assertTrue(all(result["slow"].ok for result in results))
+
+    def test_unknown_pool(self):
+        with self.assertRaises(ValueError):
+            Measure("x", len, pool="gpu")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# Budgets for a bare ``import complexity_measures``; models load on first use or in warmup()
+IMPORT_SECONDS_BUDGET = 5.0
+IMPORT_RSS_MB_BUDGET = 400
+
+IMPORT_SCRIPT = """
+import resource, sys, time
+started = time.perf_counter()
+import complexity_measures
+seconds = time.perf_counter() - started
+rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+heavy = sorted(name for name in ("spacy", "transformers", "torch", "tkinter", "cv2", "flask") if name in sys.modules)
+print(seconds, rss_mb, ",".join(heavy))
+"""
+
+
+def run_python(script):
+    env = dict(os.environ, OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "sk-test"))
+    return subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=600,
+    )
+
+
+class TestImportCost(unittest.TestCase):
+    def test_import_stays_within_budget(self):
+        result = run_python(IMPORT_SCRIPT)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        seconds, rss_mb, *heavy = result.stdout.strip().splitlines()[-1].split(" ")
+        self.assertLess(float(seconds), IMPORT_SECONDS_BUDGET)
+        self.assertLess(float(rss_mb), IMPORT_RSS_MB_BUDGET)
+        self.assertEqual([name for name in heavy if name], [])
+
+    def test_warmup_loads_each_resource_once(self):
+        result = run_python(
+            "import complexity_measures as cm\n"
+            "cm.warmup(['ml', 'stat'])\n"
+            "print(sorted(cm._resources), cm.get_ml_pipeline() is cm.pipeline_ml, max(cm.warmup(['ml', 'stat']).values()) < 0.01)\n"
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip().splitlines()[-1], "['ml', 'stat'] True True")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from complexity_index import QueryIndex
+from complexity_learner import ComplexityLearner, TrainingStore
+
+SEED = [
+    ("What is the capital of France?", 0),
+    ("Build and deploy a web application with a database backend.", 1),
+    ("Explain the theory of relativity.", 0),
+    ("Design a data pipeline with collection, cleaning, training and evaluation.", 1),
+]
+
+
+class TestQueryIndex(unittest.TestCase):
+    def test_search_matches_brute_force_cosine(self):
+        index = QueryIndex(seed=SEED)
+        query = "deploy a web application and a data pipeline"
+        similarities, labels = index.search([query], k=3)
+        expected = (index.vectorizer.transform([query]) @ index.matrix().T).toarray()[0]
+        top = np.argsort(-expected, kind="stable")[:3]
+        np.testing.assert_allclose(similarities[0], expected[top])
+        np.testing.assert_array_equal(labels[0], index.labels[top])
+
+    def test_added_queries_are_searchable_before_a_rebuild(self):
+        index = QueryIndex(seed=SEED, rebuild_growth=10.0)
+        for i in range(40):
+            index.add(f"Explain the capital of country {i}", 0.0)
+        index.add("Build a web application with a database", 0.9)
+        self.assertEqual(len(index), 45)
+        self.assertLessEqual(len(index._state.segments), 7)
+        self.assertEqual(index.matrix().shape[0], 45)
+        similarities, labels = index.search(["build a web application with a database"], k=1)
+        self.assertAlmostEqual(similarities[0, 0], 1.0)
+        self.assertEqual(labels[0, 0], 1.0)
+
+    def test_rebuild_is_due_after_growth(self):
+        index = QueryIndex(seed=SEED, rebuild_growth=0.5)
+        index.add("Plan a migration.", 1.0)
+        index.add("Say hello.", 0.0)
+        self.assertFalse(index.needs_rebuild)
+        index.add("Write a compiler.", 1.0)
+        self.assertTrue(index.needs_rebuild)
+        index.rebuild([("Plan a migration.", 1.0), ("Say hello.", 0.0), ("Write a compiler.", 1.0)])
+        self.assertFalse(index.needs_rebuild)
+        self.assertIn("migration", index.vectorizer.vocabulary_)
+
+    def test_empty_index_finds_nothing(self):
+        similarities, labels = QueryIndex().search(["anything"], k=2)
+        self.assertEqual(similarities.tolist(), [[0.0, 0.0]])
+
+
+class TestLearnerIndex(unittest.TestCase):
+    def test_learner_feeds_and_rebuilds_the_index(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = TrainingStore(os.path.join(tmpdir, "training.jsonl"))
+            learner = ComplexityLearner(store, seed=SEED, refit_every=0)
+            index = learner.attach_index(QueryIndex(store.rows(), seed=SEED, rebuild_growth=0.5))
+            for text in ("Refactor the billing service.", "Migrate the orders database.", "Audit the access logs."):
+                learner.submit(text, 1.0)
+            learner.flush()
+            learner.shutdown()
+        self.assertEqual(len(index), 7)
+        self.assertIn("billing", index.vectorizer.vocabulary_)
+
+
+if __name__ == "__main__":
+    unittest.main()
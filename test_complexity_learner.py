@@ -0,0 +1,86 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+
+from complexity_learner import ComplexityLearner, TrainingStore, supports_partial_fit, training_set
+
+SEED = [
+    ("What is the capital of France?", 0),
+    ("Define Newton's second law of motion.", 0),
+    ("Provide a comprehensive guide to building a web application using Django.", 1),
+    ("Describe how to set up a machine learning pipeline with preprocessing, training and evaluation.", 1),
+]
+
+
+class TestTrainingStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, "training.jsonl")
+
+    def test_appends_and_skips_torn_lines(self):
+        store = TrainingStore(self.path)
+        store.append("Sort a list.", 0.2)
+        with open(self.path, "a") as f:
+            f.write('{"query": "cut sh')
+        self.assertEqual(store.rows(), [("Sort a list.", 0.2)])
+
+    def test_training_set_keeps_newest_label(self):
+        rows = [("Sort a list.", 0.9), ("Plan a migration.", 0.8), ("  sort a LIST. ", 0.1)]
+        queries, labels = training_set(rows, seed=[("Sort a list.", 1), ("Say hi.", 0)])
+        self.assertEqual(queries, ["sort a list.", "plan a migration.", "say hi."])
+        self.assertEqual(labels, [0, 1, 0])
+
+
+class TestComplexityLearner(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.store = TrainingStore(os.path.join(self.tmpdir.name, "training.jsonl"))
+        self.model_path = os.path.join(self.tmpdir.name, "model.pkl")
+
+    def learner(self, **kwargs):
+        learner = ComplexityLearner(self.store, model_path=self.model_path, seed=SEED, **kwargs)
+        self.addCleanup(learner.shutdown)
+        return learner
+
+    def test_examples_are_learned_in_the_background(self):
+        learner = self.learner(refit_every=0)
+        model = learner.model
+        for _ in range(3):
+            learner.submit("Design, implement, test and deploy a distributed cache.", 1.0)
+        learner.flush()
+        self.assertEqual(learner.stats["updates"], 3)
+        self.assertEqual(len(self.store.rows()), 3)
+        self.assertIs(learner.model, model)
+        self.assertEqual(learner.predict_proba(["Say hi."]).shape, (1, 2))
+
+    def test_periodic_refit_swaps_and_saves_the_model(self):
+        learner = self.learner(refit_every=2)
+        model = learner.model
+        learner.submit("Plan, build and ship a mobile app.", 0.9)
+        learner.submit("Name a color.", 0.1)
+        learner.flush()
+        self.assertEqual(learner.stats["refits"], 1)
+        self.assertIsNot(learner.model, model)
+        with open(self.model_path, "rb") as f:
+            self.assertTrue(supports_partial_fit(pickle.load(f)))
+
+    def test_old_model_is_replaced_by_a_refit(self):
+        old = Pipeline([("tfidf", TfidfVectorizer()), ("clf", LogisticRegression())])
+        old.fit([query for query, _ in SEED], [label for _, label in SEED])
+        with open(self.model_path, "wb") as f:
+            pickle.dump(old, f)
+        learner = self.learner()
+        learner.flush()
+        self.assertTrue(supports_partial_fit(learner.model))
+        self.assertEqual(learner.stats["refits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
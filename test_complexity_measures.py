@@ -0,0 +1,206 @@
+import os
+import pickle
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import complexity_measures
+from complexity_executor import Measure
+from complexity_measures import QueryAnalysis
+
+QUERY = "First parse the logs, then build a report and email it to the team."
+
+
+class TestQueryAnalysis(unittest.TestCase):
+    def test_spacy_runs_once_for_all_spacy_measures(self):
+        analysis = QueryAnalysis(QUERY)
+        nlp = MagicMock(wraps=complexity_measures.get_nlp())
+        with patch.object(complexity_measures, "get_nlp", return_value=nlp):
+            complexity_measures.is_complex_nlp_dependency(analysis)
+            complexity_measures.is_complex_spacy_srl(analysis)
+            complexity_measures.is_complex_graph(analysis)
+            complexity_measures.is_complex_recursive(analysis)
+            complexity_measures.is_complex_ast(analysis)
+        self.assertEqual(nlp.call_count, 1)
+
+    def test_measures_score_strings_and_analyses_alike(self):
+        analysis = QueryAnalysis(QUERY)
+        for measure in (
+            complexity_measures.is_complex_nlp_dependency,
+            complexity_measures.is_complex_ontology,
+            complexity_measures.is_complex_cognitive,
+            complexity_measures.is_complex_psycholinguistic,
+            complexity_measures.is_complex_entropy,
+            complexity_measures.is_complex_temporal,
+        ):
+            self.assertAlmostEqual(measure(QUERY), measure(analysis), msg=measure.__name__)
+
+    def test_word_and_length_checks_only_tokenize(self):
+        nlp = MagicMock(wraps=complexity_measures.get_nlp())
+        with patch.object(complexity_measures, "get_nlp", return_value=nlp):
+            self.assertEqual(complexity_measures.is_real_words("parse the logs ."), "parse the logs .")
+            self.assertEqual(complexity_measures.count_spacy_tokens(["parse the logs", "email it"]), [3, 2])
+        nlp.assert_not_called()
+
+    def test_parse_texts_matches_single_parses(self):
+        texts = [QUERY, "Sort the list."]
+        docs = complexity_measures.parse_texts(texts)
+        self.assertEqual(
+            [[token.dep_ for token in doc] for doc in docs],
+            [[token.dep_ for token in QueryAnalysis(text).doc] for text in texts],
+        )
+
+    def test_shared_parse_skips_only_components_no_measure_needs(self):
+        self.assertEqual(complexity_measures.spacy_disable_for(["nlp", "ast", "entropy"]), ["lemmatizer", "ner"])
+        self.assertEqual(complexity_measures.spacy_disable_for(["nlp", "graph"]), ["ner"])
+        self.assertEqual(complexity_measures.spacy_disable_for(["entropy"]), complexity_measures.SPACY_DISABLED)
+        with self.assertRaises(ValueError):
+            complexity_measures.configure_spacy("xl")
+
+    def test_batch_measures_match_single_query_measures(self):
+        queries = [QUERY, "If it rains, then first close the windows and finally lock the door.", "Hi"]
+        for single, batch in (
+            (complexity_measures.is_complex_cognitive, complexity_measures.is_complex_cognitive_batch),
+            (complexity_measures.is_complex_temporal, complexity_measures.is_complex_temporal_batch),
+            (complexity_measures.is_complex_ml, complexity_measures.is_complex_ml_batch),
+            (complexity_measures.is_complex_statistical, complexity_measures.is_complex_statistical_batch),
+        ):
+            for expected, actual in zip([single(query) for query in queries], batch(queries)):
+                self.assertAlmostEqual(expected, actual, msg=batch.__name__)
+
+    def test_keyword_measures_share_one_scan(self):
+        analysis = QueryAnalysis("First, if it is hard, then retry; then for each item log it.")
+        with patch.object(
+            complexity_measures.KEYWORD_SCANNER, "count", wraps=complexity_measures.KEYWORD_SCANNER.count
+        ) as count:
+            self.assertEqual(complexity_measures.is_complex_cognitive(analysis), 1.0)
+            self.assertEqual(complexity_measures.is_complex_temporal(analysis), 1.0)
+            self.assertEqual(complexity_measures.is_complex_sentiment(analysis), 1.0)
+        self.assertEqual(count.call_count, 1)
+        self.assertEqual(
+            complexity_measures.count_keywords(analysis, ["then", "retry", "fails"]),
+            {"then": 2, "retry": 1},
+        )
+
+    def test_pickles_text_only(self):
+        analysis = QueryAnalysis(QUERY, disable=["ner", "lemmatizer"], tier="sm")
+        analysis.tokens
+        copy = pickle.loads(pickle.dumps(analysis))
+        self.assertEqual((str(copy), copy.disable, copy.tier), (QUERY, ["ner", "lemmatizer"], "sm"))
+        self.assertEqual(copy._memo, {})
+        self.assertEqual(copy.tokens, analysis.tokens)
+
+
+class TestScoreComplexity(unittest.TestCase):
+    def setUp(self):
+        plan = complexity_measures.Plan(steps=[])
+        self.calls = []
+        measures = [
+            self.measure("llm", (0.9, plan), cost=30.0, required=True),
+            self.measure("nlp", 1.0, cost=0.1),
+            # The cascade starts these too; they are still running when llm and nlp settle the decision
+            self.measure("ml", 1.0, cost=0.2, seconds=0.5),
+            self.measure("graph", 0.0, cost=5.0, seconds=1.0),
+            self.measure("sentiment", 1.0, cost=0.0),
+        ]
+        weights = {"llm": 0.4, "nlp": 0.2, "ml": 0.2, "graph": 0.2, "sentiment": 0.0}
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        for target, value in (
+            ("COMPLEXITY_MEASURES", measures),
+            ("COMPLEXITY_WEIGHTS", weights),
+            ("latency_profile_path", None),
+            ("save_path", os.path.join(self.tmpdir.name, "complexity.log")),
+            ("complexity_cache_path", None),
+            ("complexity_cache_ttl_seconds", None),
+        ):
+            patcher = patch.object(complexity_measures, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.dict(complexity_measures._resources)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.executor = complexity_measures.configure_measure_executor()
+        self.executor.costs.clear()
+        self.addCleanup(self.executor.shutdown)
+
+    def measure(self, name, value, seconds=0.05, **kwargs):
+        def run(query):
+            self.calls.append(name)
+            time.sleep(seconds)
+            return value
+
+        return Measure(name, run, **kwargs)
+
+    def test_early_exit_skips_measures_that_cannot_change_the_decision(self):
+        assessment = complexity_measures.score_complexity(QUERY)
+        # llm 0.36 + nlp 0.2 already exceeds 0.5 whatever ml and graph score
+        self.assertTrue(assessment.is_complex)
+        self.assertEqual(assessment.skipped, ["ml", "graph"])
+        self.assertNotIn("sentiment", self.calls)
+        self.assertIsNotNone(assessment.plan)
+
+    def test_only_full_assessments_train_the_classifier(self):
+        learner = MagicMock()
+        with patch.object(complexity_measures, "get_ml_learner", return_value=learner):
+            complexity_measures.is_complex_final(QUERY)
+            learner.submit.assert_not_called()
+            complexity_measures.is_complex_final(QUERY, output_full_score=True)
+        learner.submit.assert_called_once()
+
+    def test_cache_serves_reworded_queries_without_running_measures(self):
+        complexity_measures.configure_complexity_cache(os.path.join(self.tmpdir.name, "cache.sqlite3"), None)
+        self.addCleanup(complexity_measures.configure_complexity_cache, None)
+        learner = MagicMock()
+        with patch.object(complexity_measures, "get_ml_learner", return_value=learner):
+            score, plan = complexity_measures.is_complex_final(QUERY, output_full_score=True)
+            self.calls.clear()
+            cached_score, cached_plan = complexity_measures.is_complex_final(
+                "  " + QUERY.upper().replace(" ", " \n "), output_full_score=True
+            )
+            self.assertEqual(self.calls, [])
+            self.assertAlmostEqual(cached_score, score)
+            self.assertEqual(cached_plan, plan)
+            learner.submit.assert_called_once()
+
+            # New weights change the cache version, so the query is scored again
+            with patch.object(complexity_measures, "COMPLEXITY_WEIGHTS", {"llm": 0.5, "nlp": 0.5}):
+                complexity_measures.is_complex_final(QUERY, output_full_score=True)
+            self.assertIn("llm", self.calls)
+
+    def test_full_score_and_requested_zero_weight_measures(self):
+        assessment = complexity_measures.score_complexity(QUERY, early_exit=False, extra_measures=["sentiment"])
+        self.assertEqual(assessment.skipped, [])
+        self.assertEqual(set(assessment.scores), {"llm", "nlp", "ml", "graph", "sentiment"})
+        self.assertAlmostEqual(assessment.total_score, 0.76)
+        self.assertEqual(assessment.confidence, 1.0)
+
+    def test_batch_scores_every_query_with_every_weighted_measure(self):
+        frame = complexity_measures.is_complex_final_batch([QUERY, "Say hi."])
+        self.assertEqual(list(frame.columns), ["query", "llm", "nlp", "ml", "graph", "total_score", "is_complex", "plan"])
+        self.assertEqual(list(frame["query"]), [QUERY, "Say hi."])
+        self.assertEqual(list(frame["total_score"].round(2)), [0.76, 0.76])
+        self.assertTrue(frame["is_complex"].all())
+        self.assertEqual(self.calls.count("llm"), 2)
+        self.assertNotIn("sentiment", self.calls)
+
+        frame = complexity_measures.is_complex_final_batch([QUERY], need_plan=False)
+        self.assertNotIn("llm", frame.columns)
+        self.assertAlmostEqual(frame["total_score"][0], 2 / 3)
+        self.assertIsNone(frame["plan"][0])
+
+    def test_time_budget_runs_what_fits_and_renormalizes(self):
+        self.assertEqual([m.name for m in complexity_measures.select_measures(0.5)], ["nlp", "ml"])
+        self.assertEqual([m.name for m in complexity_measures.select_measures(0.01)], ["nlp"])
+
+        assessment = complexity_measures.score_complexity(QUERY, time_budget=5.5)
+        self.assertEqual(assessment.measures_used, ["nlp", "ml", "graph"])
+        self.assertEqual(assessment.skipped, ["llm"])
+        self.assertIsNone(assessment.plan)
+        self.assertAlmostEqual(assessment.total_score, 2 / 3)
+        self.assertAlmostEqual(assessment.confidence, 0.6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from lexicon_pack import TABLES, LexiconTable, load_pack, noun_forms
+
+
+class TestLexiconTable(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.mapping = {f"word{i}": i % 7 for i in range(1000)}
+        self.mapping.update({"hypothesis": 4, "children": 9})
+
+    def test_lookups_survive_a_memory_mapped_round_trip(self):
+        LexiconTable.build(self.mapping).save(self.tmpdir.name, "syllables")
+        table = LexiconTable.load(self.tmpdir.name, "syllables")
+        self.assertIsInstance(table.keys, np.memmap)
+        self.assertFalse(table.keys.flags.writeable)
+        self.assertEqual(len(table), len(self.mapping))
+        self.assertEqual({word: table.get(word) for word in self.mapping}, self.mapping)
+        self.assertIsNone(table.get("missing"))
+        self.assertNotIn("missing", table)
+        self.assertLessEqual(len(self.mapping) / len(table.keys), 0.5)
+
+    def test_values_must_fit_in_a_byte(self):
+        with self.assertRaises(ValueError):
+            LexiconTable.build({"word": 256})
+
+    def test_incomplete_pack_is_not_loaded(self):
+        for name in TABLES:
+            LexiconTable.build(self.mapping).save(self.tmpdir.name, name)
+        self.assertIsNone(load_pack(self.tmpdir.name))
+        with open(os.path.join(self.tmpdir.name, "manifest.json"), "w") as f:
+            json.dump({"version": 1, "tables": {name: len(self.mapping) for name in TABLES}}, f)
+        self.assertEqual(load_pack(self.tmpdir.name)["hypernym_depth"].get("children"), 9)
+
+    def test_noun_forms_cover_morphy_plurals(self):
+        forms = set(noun_forms(["bus", "party", "fireman", "box"], {"children": ["child"]}))
+        self.assertTrue({"children", "buses", "parties", "firemen", "boxes", "box"} <= forms)
+
+
+if __name__ == "__main__":
+    unittest.main()
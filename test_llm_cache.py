@@ -0,0 +1,198 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from openai.types import CreateEmbeddingResponse
+from openai.types.chat import ChatCompletion
+from pydantic import BaseModel
+
+from llm_cache import (
+    CachePolicy,
+    LLMResponseCache,
+    cache_key,
+    decode_response,
+    encode_response,
+)
+from llm_gateway import LLMGateway
+
+
+class Verdict(BaseModel):
+    complete: bool
+    reason: str
+
+
+class Score(BaseModel):
+    value: float
+
+
+def chat_completion(content):
+    return ChatCompletion.model_validate(
+        {
+            "id": "chatcmpl-1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "m",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }
+            ],
+        }
+    )
+
+
+class CountingClient:
+    """Minimal async client returning real openai response objects."""
+
+    def __init__(self):
+        self.calls = 0
+
+        class _Completions:
+            async def create(inner, **params):
+                self.calls += 1
+                return chat_completion(f"answer {self.calls}")
+
+        class _Chat:
+            completions = _Completions()
+
+        self.chat = _Chat()
+
+    async def close(self):
+        pass
+
+
+class TestCacheKey(unittest.TestCase):
+    def test_key_ignores_param_order_and_none(self):
+        a = cache_key("chat", {"model": "m", "messages": [{"role": "user", "content": "x"}], "top_p": None})
+        b = cache_key("chat", {"messages": [{"role": "user", "content": "x"}], "model": "m"})
+        self.assertEqual(a, b)
+
+    def test_key_depends_on_sampling_and_schema(self):
+        base = {"model": "m", "messages": []}
+        self.assertNotEqual(cache_key("chat", base), cache_key("chat", {**base, "temperature": 0.2}))
+        self.assertNotEqual(
+            cache_key("parse", {**base, "response_format": Verdict}),
+            cache_key("parse", {**base, "response_format": Score}),
+        )
+
+
+class TestLLMResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "cache.sqlite3")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip_persists_across_instances(self):
+        cache = LLMResponseCache(self.path)
+        cache.put("k", "chat", encode_response(chat_completion("hello")), "site")
+        cache.close()
+
+        reopened = LLMResponseCache(self.path)
+        response = decode_response("chat", reopened.get("k"))
+        self.assertEqual(response.choices[0].message.content, "hello")
+        reopened.close()
+
+    def test_parsed_and_embedding_responses_decode(self):
+        parsed = {
+            "id": "p",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "m",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {
+                        "role": "assistant",
+                        "content": '{"complete": true, "reason": "done"}',
+                        "parsed": {"complete": True, "reason": "done"},
+                    },
+                }
+            ],
+        }
+        response = decode_response("parse", json.dumps(parsed), Verdict)
+        self.assertIsInstance(response.choices[0].message.parsed, Verdict)
+
+        embedding = CreateEmbeddingResponse.model_validate(
+            {
+                "object": "list",
+                "model": "e",
+                "data": [{"object": "embedding", "index": 0, "embedding": [0.5]}],
+                "usage": {"prompt_tokens": 1, "total_tokens": 1},
+            }
+        )
+        restored = decode_response("embed", encode_response(embedding))
+        self.assertEqual(restored.data[0].embedding, [0.5])
+
+    def test_ttl_expiry(self):
+        cache = LLMResponseCache(self.path, ttl_seconds=0.05)
+        cache.put("k", "chat", "{}")
+        self.assertIsNotNone(cache.get("k"))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("k"))
+        cache.close()
+
+    def test_lru_eviction_keeps_recently_used(self):
+        cache = LLMResponseCache(self.path, max_bytes=25)
+        cache.put("a", "chat", "x" * 10)
+        time.sleep(0.01)
+        cache.put("b", "chat", "y" * 10)
+        time.sleep(0.01)
+        cache.get("a")
+        time.sleep(0.01)
+        cache.put("c", "chat", "z" * 10)
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        cache.close()
+
+
+class TestGatewayCaching(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.client = CountingClient()
+        self.gateway = LLMGateway(client=self.client)
+        self.gateway.configure_single_flight(None)
+        self.cache = LLMResponseCache(os.path.join(self.tmpdir.name, "cache.sqlite3"))
+        self.gateway.configure_cache(
+            self.cache, {"judge_step": CachePolicy(max_temperature=0.5)}
+        )
+
+    def tearDown(self):
+        self.gateway.close()
+        self.cache.close()
+        self.tmpdir.cleanup()
+
+    def ask(self, call_site, temperature=0.2):
+        response = self.gateway.chat_sync(
+            call_site=call_site,
+            model="m",
+            messages=[{"role": "user", "content": "same question"}],
+            temperature=temperature,
+        )
+        return response.choices[0].message.content
+
+    def test_opted_in_call_site_is_served_from_cache(self):
+        self.assertEqual(self.ask("judge_step"), "answer 1")
+        self.assertEqual(self.ask("judge_step"), "answer 1")
+        self.assertEqual(self.client.calls, 1)
+
+    def test_other_call_sites_bypass_cache(self):
+        self.ask("call_openai")
+        self.ask("call_openai")
+        self.assertEqual(self.client.calls, 2)
+
+    def test_policy_temperature_ceiling(self):
+        self.ask("judge_step", temperature=0.9)
+        self.ask("judge_step", temperature=0.9)
+        self.assertEqual(self.client.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
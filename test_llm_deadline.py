@@ -0,0 +1,90 @@
+import asyncio
+import time
+import unittest
+
+import llm_deadline
+from llm_gateway import LLMGateway
+from llm_scheduler import LLMScheduler, LLMTimeoutError, SchedulerError
+from test_llm_gateway import FakeAsyncClient
+
+
+class TestDeadlineContext(unittest.TestCase):
+    def test_nested_deadlines_only_shorten(self):
+        self.assertIsNone(llm_deadline.current_deadline())
+        with llm_deadline.deadline(10):
+            outer = llm_deadline.current_deadline()
+            with llm_deadline.deadline(60):
+                self.assertEqual(llm_deadline.current_deadline(), outer)
+            with llm_deadline.deadline(1):
+                self.assertLess(llm_deadline.remaining(), 1.01)
+            with llm_deadline.deadline(None):
+                self.assertEqual(llm_deadline.current_deadline(), outer)
+        self.assertIsNone(llm_deadline.remaining())
+
+    def test_timeout_for(self):
+        timeouts = {"default": 60.0, "merge_steps": 5.0}
+        self.assertEqual(llm_deadline.timeout_for("merge_steps", timeouts), 5.0)
+        self.assertEqual(llm_deadline.timeout_for("other", timeouts), 60.0)
+        self.assertIsNone(llm_deadline.timeout_for("other", {}))
+
+
+class TestSchedulerTimeouts(unittest.TestCase):
+    def hang(self, calls):
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(10)
+
+        return call
+
+    def test_attempt_timeout_is_retried_then_typed(self):
+        scheduler = LLMScheduler(max_retries=1, base_delay=0.0)
+        calls = []
+        with self.assertRaises(LLMTimeoutError) as ctx:
+            asyncio.run(scheduler.execute(self.hang(calls), "m", 1, "merge_steps", timeout=0.05))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(ctx.exception.call_site, "merge_steps")
+        self.assertIsInstance(ctx.exception, SchedulerError)
+        self.assertIsInstance(ctx.exception, TimeoutError)
+
+    def test_deadline_stops_retries(self):
+        scheduler = LLMScheduler(max_retries=5, base_delay=0.0)
+        calls = []
+        started = time.monotonic()
+        with self.assertRaises(LLMTimeoutError):
+            asyncio.run(
+                scheduler.execute(
+                    self.hang(calls), "m", 1, "convert_plan", timeout=5.0, deadline=time.monotonic() + 0.1
+                )
+            )
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(len(calls), 1)
+
+    def test_expired_deadline_never_calls(self):
+        calls = []
+        with self.assertRaises(LLMTimeoutError):
+            asyncio.run(LLMScheduler().execute(self.hang(calls), "m", 1, deadline=time.monotonic() - 1))
+        self.assertEqual(calls, [])
+
+
+class TestGatewayDeadline(unittest.TestCase):
+    def test_caller_deadline_bounds_gateway_requests(self):
+        client = FakeAsyncClient(delay=1.0)
+        gateway = LLMGateway(client=client, scheduler=LLMScheduler(max_retries=1, base_delay=0.0))
+        gateway.configure_timeouts({"default": 30.0})
+        try:
+            started = time.monotonic()
+            with llm_deadline.deadline(0.1):
+                with self.assertRaises(LLMTimeoutError):
+                    gateway.chat_sync(call_site="analyze_final_output", model="m", messages=[])
+            self.assertLess(time.monotonic() - started, 0.5)
+            # Outside the deadline the per-call-site timeout still applies
+            gateway.configure_timeouts({"default": 30.0, "merge_steps": 0.05})
+            with self.assertRaises(LLMTimeoutError):
+                gateway.chat_sync(call_site="merge_steps", model="m", messages=[])
+        finally:
+            gateway.close()
+        self.assertEqual(gateway.ledger.snapshot()[0].error, "LLMTimeoutError")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+import llm_gateway
+from llm_gateway import LLMGateway, LLMGatewayError, find_stop_marker
+
+
+def make_completion(content, finish_reason="stop"):
+    return SimpleNamespace(
+        choices=[
+            SimpleNamespace(
+                index=0,
+                finish_reason=finish_reason,
+                message=SimpleNamespace(content=content, parsed=None),
+            )
+        ],
+        usage=None,
+    )
+
+
+class FakeAsyncClient:
+    """Records every request and answers after an optional delay."""
+
+    def __init__(self, delay=0.0, reply="ok"):
+        self.delay = delay
+        self.reply = reply
+        self.calls = []
+        self.threads = set()
+        self.closed = False
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.beta = SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(parse=self._parse))
+        )
+        self.embeddings = SimpleNamespace(create=self._embed)
+
+    async def _respond(self, kind, params):
+        self.calls.append((kind, params))
+        self.threads.add(threading.current_thread().name)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        reply = self.reply(kind, params) if callable(self.reply) else self.reply
+        if kind == "embed":
+            return SimpleNamespace(data=[SimpleNamespace(embedding=[0.1, 0.2])], usage=None)
+        return make_completion(reply)
+
+    async def _create(self, **params):
+        return await self._respond("chat", params)
+
+    async def _parse(self, **params):
+        return await self._respond("parse", params)
+
+    async def _embed(self, **params):
+        return await self._respond("embed", params)
+
+    async def close(self):
+        self.closed = True
+
+
+class TestLLMGateway(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeAsyncClient()
+        self.gateway = LLMGateway(client=self.client)
+
+    def tearDown(self):
+        self.gateway.close()
+
+    def test_sync_shims_return_raw_responses(self):
+        response = self.gateway.chat_sync(
+            call_site="test", model="m", messages=[{"role": "user", "content": "hi"}]
+        )
+        self.assertEqual(response.choices[0].message.content, "ok")
+        self.gateway.parse_sync(model="m", messages=[], response_format=dict)
+        embedding = self.gateway.embed_sync(model="e", input="text")
+        self.assertEqual(embedding.data[0].embedding, [0.1, 0.2])
+        self.assertEqual([kind for kind, _ in self.client.calls], ["chat", "parse", "embed"])
+        self.assertEqual(self.client.calls[1][1]["response_format"], dict)
+
+    def test_requests_run_on_the_gateway_loop(self):
+        self.gateway.chat_sync(model="m", messages=[])
+        self.assertEqual(self.client.threads, {"llm-gateway"})
+
+    def test_gather_sync_runs_requests_concurrently(self):
+        self.client.delay = 0.2
+        started = time.monotonic()
+        results = self.gateway.gather_sync(
+            *(self.gateway.chat(model="m", messages=[{"content": str(i)}]) for i in range(5))
+        )
+        self.assertLess(time.monotonic() - started, 0.6)
+        self.assertEqual(len(results), 5)
+
+    def test_async_api_from_foreign_loop(self):
+        async def call():
+            return await self.gateway.chat(model="m", messages=[])
+
+        response = asyncio.run(call())
+        self.assertEqual(response.choices[0].message.content, "ok")
+        self.assertEqual(self.client.threads, {"llm-gateway"})
+
+    def test_sync_shim_on_gateway_loop_raises(self):
+        async def nested():
+            return self.gateway.chat_sync(model="m", messages=[])
+
+        with self.assertRaises(LLMGatewayError):
+            self.gateway.run(nested())
+
+    def test_close_closes_client(self):
+        self.gateway.chat_sync(model="m", messages=[])
+        self.gateway.close()
+        self.assertTrue(self.client.closed)
+
+
+class TestStopMarkers(unittest.TestCase):
+    def test_earliest_marker_wins(self):
+        text = "<thinking>a</thinking><step>b</step><answer>c</answer>"
+        self.assertEqual(find_stop_marker(text, ["</answer>", "</step>"]), text.index("</step>"))
+        self.assertEqual(find_stop_marker(text, ["</reflection>"]), -1)
+        self.assertEqual(find_stop_marker(text, ["</step>"], start=text.index("</step>") + 1), -1)
+
+
+class TestDefaultGateway(unittest.TestCase):
+    def test_module_shortcuts_use_installed_gateway(self):
+        client = FakeAsyncClient(reply="from default")
+        previous = llm_gateway.set_gateway(LLMGateway(client=client))
+        try:
+            response = llm_gateway.chat_sync(model="m", messages=[])
+            self.assertEqual(response.choices[0].message.content, "from default")
+        finally:
+            llm_gateway.get_gateway().close()
+            llm_gateway.set_gateway(previous)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import asyncio
+import time
+import unittest
+
+from llm_gateway import LLMGateway
+from llm_hedging import Hedger, HedgePolicy, percentile
+from test_llm_gateway import FakeAsyncClient
+
+
+class SlowThenFast:
+    """First invocation hangs for ``slow`` seconds, later ones take ``fast``."""
+
+    def __init__(self, slow=1.0, fast=0.01):
+        self.slow = slow
+        self.fast = fast
+        self.started = 0
+        self.cancelled = 0
+
+    async def __call__(self):
+        self.started += 1
+        delay = self.slow if self.started == 1 else self.fast
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return f"call {self.started}"
+
+
+def warmed_hedger(policy, latency=0.02, samples=20, call_site="site"):
+    hedger = Hedger({call_site: policy})
+    stats = hedger._site(call_site)
+    stats.latencies.extend([latency] * samples)
+    stats.requests = samples
+    return hedger
+
+
+class TestHedger(unittest.TestCase):
+    def test_percentile(self):
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 0.5), 3)
+        self.assertIsNone(percentile([], 0.95))
+
+    def test_no_hedging_until_enough_samples(self):
+        hedger = Hedger({"site": HedgePolicy(min_samples=5, budget_fraction=1.0)})
+        self.assertIsNone(hedger.hedge_delay("site"))
+        self.assertIsNone(hedger.hedge_delay("unhedged"))
+
+    def test_slow_request_is_hedged_and_loser_cancelled(self):
+        hedger = warmed_hedger(HedgePolicy(budget_fraction=0.5))
+        call = SlowThenFast()
+
+        async def run():
+            result = await hedger.run(call, "site")
+            await asyncio.sleep(0)  # let the cancellation land
+            return result
+
+        started = time.monotonic()
+        result = asyncio.run(run())
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(result, "call 2")
+        self.assertEqual(call.cancelled, 1)
+        metrics = hedger.metrics()["site"]
+        self.assertEqual((metrics["hedged"], metrics["hedge_wins"]), (1, 1))
+
+    def test_budget_caps_hedges(self):
+        hedger = warmed_hedger(HedgePolicy(budget_fraction=0.0))
+        call = SlowThenFast(slow=0.1)
+        self.assertEqual(asyncio.run(hedger.run(call, "site")), "call 1")
+        self.assertEqual(call.started, 1)
+
+    def test_failed_primary_falls_back_to_hedge(self):
+        hedger = warmed_hedger(HedgePolicy(budget_fraction=1.0))
+        attempts = []
+
+        async def call():
+            attempts.append(1)
+            if len(attempts) == 1:
+                await asyncio.sleep(0.1)
+                raise RuntimeError("primary failed")
+            await asyncio.sleep(0.2)
+            return "hedge"
+
+        self.assertEqual(asyncio.run(hedger.run(call, "site")), "hedge")
+
+
+class TestGatewayHedging(unittest.TestCase):
+    def test_gateway_records_latency_and_hedges(self):
+        client = FakeAsyncClient(delay=0.01)
+        gateway = LLMGateway(client=client)
+        gateway.configure_hedging(
+            Hedger({"call_openai": HedgePolicy(min_samples=3, budget_fraction=0.5)})
+        )
+        try:
+            for _ in range(3):
+                gateway.chat_sync(call_site="call_openai", model="m", messages=[])
+            client.delay = 0.3
+            gateway.chat_sync(call_site="call_openai", model="m", messages=[])
+        finally:
+            gateway.close()
+        metrics = gateway.hedger.metrics()["call_openai"]
+        self.assertEqual(metrics["requests"], 4)
+        self.assertEqual(metrics["hedged"], 1)
+        self.assertEqual(len(client.calls), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
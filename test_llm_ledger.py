@@ -0,0 +1,105 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+
+import openai
+
+import llm_ledger
+from llm_gateway import LLMGateway
+from llm_ledger import LLMLedger
+from llm_standin import StandinServer
+
+
+class TestLedger(unittest.TestCase):
+    def test_cost_uses_cached_input_price_and_snapshot_names(self):
+        ledger = LLMLedger(prices={"gpt-4o-mini": {"input": 1.0, "cached_input": 0.5, "output": 2.0}})
+        self.assertAlmostEqual(ledger.cost("gpt-4o-mini-2024-07-18", 1_000_000, 1_000_000, 500_000), 2.75)
+        self.assertEqual(ledger.cost("unknown-model", 1000, 1000), 0.0)
+
+    def test_labels_and_rollups(self):
+        ledger = LLMLedger()
+        with llm_ledger.labels(task="t1", plan_step=1):
+            ledger.record("chat", "judge_step", "gpt-4o-mini", prompt_tokens=100, completion_tokens=10)
+            with llm_ledger.labels(plan_step=2, phase="finalization"):
+                ledger.record("chat", "self_consistency", "gpt-4o-mini", prompt_tokens=50, completion_tokens=5)
+        ledger.record("chat", "self_consistency", "gpt-4o-mini", source="cache")
+        self.assertEqual(llm_ledger.current_labels(), {})
+
+        by_step = ledger.rollup("plan_step")
+        self.assertEqual(by_step["1"]["prompt_tokens"], 100)
+        self.assertEqual(by_step["2"]["completion_tokens"], 5)
+        by_phase = ledger.rollup("phase")
+        self.assertEqual(set(by_phase), {"judging", "finalization", "reasoning"})
+        self.assertEqual(by_phase["reasoning"]["cache_hits"], 1)
+        self.assertEqual(ledger.rollup("task")["t1"]["requests"], 2)
+        self.assertEqual(ledger.totals(since=2)["requests"], 0)
+        with self.assertRaises(ValueError):
+            ledger.rollup("weekday")
+
+    def test_export(self):
+        ledger = LLMLedger()
+        ledger.record("embed", "get_embedding", "text-embedding-3-small", prompt_tokens=8)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            json_path, csv_path = ledger.export(os.path.join(tmpdir, "usage"))
+            with open(json_path) as f:
+                data = json.load(f)
+            with open(csv_path) as f:
+                rows = list(csv.DictReader(f))
+        self.assertEqual(data["totals"]["prompt_tokens"], 8)
+        self.assertIn("complexity", data["rollups"]["phase"])
+        self.assertEqual(rows[0]["call_site"], "get_embedding")
+
+
+class TestGatewayLedger(unittest.TestCase):
+    def setUp(self):
+        self.server = StandinServer(mode="synth", seed=1).start()
+        self.gateway = LLMGateway(client=openai.AsyncOpenAI(api_key="test", base_url=self.server.base_url))
+        self.gateway.configure_single_flight(None)
+
+    def tearDown(self):
+        self.gateway.close()
+        self.server.stop()
+
+    def test_requests_are_recorded_with_caller_labels(self):
+        messages = [{"role": "user", "content": "Use <step> tags"}]
+        with llm_ledger.labels(task="demo", plan_step=3):
+            self.gateway.chat_sync(call_site="judge_step", model="gpt-4o-mini", messages=messages)
+            # Coroutines built here run on the gateway loop but keep these labels
+            self.gateway.gather_sync(
+                self.gateway.chat(call_site="self_consistency", model="gpt-4o-mini", messages=messages),
+                self.gateway.embed(call_site="get_embedding", model="text-embedding-3-small", input="x"),
+            )
+            self.gateway.chat_stream_sync(
+                stop_at=["</step>"], call_site="self_consistency", model="gpt-4o-mini", messages=messages
+            )
+
+        entries = self.gateway.ledger.snapshot()
+        self.assertEqual(len(entries), 4)
+        self.assertTrue(all(entry.task == "demo" and entry.plan_step == "3" for entry in entries))
+        judge = entries[0]
+        self.assertEqual((judge.call_site, judge.phase, judge.retries), ("judge_step", "judging", 0))
+        self.assertGreater(judge.prompt_tokens, 0)
+        self.assertGreater(judge.cost_usd, 0.0)
+        self.assertTrue(entries[-1].estimated)  # the stream was cut before its usage chunk
+
+    def test_failures_are_recorded(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            transcript = os.path.join(tmpdir, "empty.jsonl")
+            open(transcript, "w").close()
+            server = StandinServer(mode="replay", transcript_path=transcript, strict=True).start()
+            gateway = LLMGateway(client=openai.AsyncOpenAI(api_key="test", base_url=server.base_url, max_retries=0))
+            try:
+                with self.assertRaises(openai.NotFoundError):
+                    gateway.chat_sync(call_site="call_openai", model="m", messages=[])
+            finally:
+                gateway.close()
+                server.stop()
+        entry = gateway.ledger.snapshot()[-1]
+        self.assertEqual((entry.error, entry.prompt_tokens), ("NotFoundError", 0))
+        self.assertEqual(gateway.ledger.totals()["errors"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
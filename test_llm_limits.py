@@ -0,0 +1,99 @@
+import unittest
+from types import SimpleNamespace
+
+import openai
+
+from llm_gateway import LLMGateway
+from llm_limits import CompletionSizer, completion_tokens_per_choice, is_truncated
+from test_llm_gateway import FakeAsyncClient, make_completion
+
+
+def completion(tokens, n=1):
+    response = make_completion("x" * 4 * tokens)
+    response.choices = response.choices * n
+    response.usage = SimpleNamespace(completion_tokens=tokens * n)
+    return response
+
+
+def warmed_sizer(lengths, **kwargs):
+    sizer = CompletionSizer(min_samples=len(lengths), **kwargs)
+    for tokens in lengths:
+        sizer.observe("merge_steps", completion(tokens))
+    return sizer
+
+
+class TestCompletionSizer(unittest.TestCase):
+    def test_tokens_per_choice(self):
+        self.assertEqual(completion_tokens_per_choice(completion(30, n=3)), 30)
+        self.assertEqual(completion_tokens_per_choice(make_completion("abcd" * 10)), 10)
+        self.assertTrue(is_truncated(make_completion("cut", finish_reason="length")))
+
+    def test_multi_choice_records_the_longest_choice(self):
+        response = make_completion("x" * 40)
+        response.choices = response.choices + make_completion("x" * 120).choices
+        response.usage = SimpleNamespace(completion_tokens=40)
+        self.assertEqual(completion_tokens_per_choice(response), 30)
+        response.usage = None
+        self.assertEqual(completion_tokens_per_choice(response), 30)
+
+    def test_limit_is_percentile_plus_headroom_capped_by_request(self):
+        sizer = warmed_sizer([100] * 19 + [200], percentile=0.95, headroom=1.5, extra_tokens=10)
+        self.assertEqual(sizer.limit_for("merge_steps"), 160)
+        self.assertEqual(sizer.limit_for("merge_steps", requested=2500), 160)
+        self.assertEqual(sizer.limit_for("merge_steps", requested=50), 50)
+        self.assertIsNone(sizer.limit_for("unseen"))
+
+    def test_apply_keeps_param_name_and_skips_embeddings(self):
+        sizer = warmed_sizer([10] * 5, headroom=1.0, extra_tokens=0)
+        self.assertEqual(sizer.apply("chat", "merge_steps", {"max_tokens": 500})["max_tokens"], 10)
+        self.assertEqual(sizer.apply("chat", "merge_steps", {})["max_completion_tokens"], 10)
+        params = {"input": "x"}
+        self.assertIs(sizer.apply("embed", "merge_steps", params), params)
+
+
+class TestGatewayCompletionLimits(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeAsyncClient()
+        self.gateway = LLMGateway(client=self.client)
+        self.gateway.configure_completion_limits(warmed_sizer([100] * 5, headroom=1.0, extra_tokens=0))
+
+    def tearDown(self):
+        self.gateway.close()
+
+    def request(self):
+        return self.gateway.chat_sync(call_site="merge_steps", model="m", messages=[], max_completion_tokens=2500)
+
+    def test_request_uses_adaptive_limit(self):
+        self.request()
+        self.assertEqual(self.client.calls[0][1]["max_completion_tokens"], 100)
+
+    def test_truncated_response_is_retried_at_original_limit(self):
+        self.client.reply = lambda kind, params: "long" if params["max_completion_tokens"] == 2500 else "cut"
+
+        async def respond(kind, params):
+            self.client.calls.append((kind, params))
+            text = self.client.reply(kind, params)
+            return make_completion(text, finish_reason="length" if text == "cut" else "stop")
+
+        self.client._respond = respond
+        response = self.request()
+        self.assertEqual(response.choices[0].message.content, "long")
+        self.assertEqual([params["max_completion_tokens"] for _, params in self.client.calls], [100, 2500])
+        self.assertEqual(self.gateway.sizer.stats["truncated_retries"], 1)
+
+    def test_structured_output_truncation_is_retried(self):
+        attempts = []
+
+        async def parse(**params):
+            attempts.append(params["max_completion_tokens"])
+            if len(attempts) == 1:
+                raise openai.LengthFinishReasonError(completion=make_completion("", finish_reason="length"))
+            return make_completion("{}")
+
+        self.client.beta.chat.completions.parse = parse
+        self.gateway.parse_sync(call_site="merge_steps", model="m", messages=[], response_format=dict, max_completion_tokens=2500)
+        self.assertEqual(attempts, [100, 2500])
+
+
+if __name__ == "__main__":
+    unittest.main()
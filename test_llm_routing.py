@@ -0,0 +1,56 @@
+import unittest
+
+from llm_gateway import LLMGateway
+from llm_routing import EscalationRule, ModelRouter
+from test_llm_gateway import FakeAsyncClient
+
+
+class TestModelRouter(unittest.TestCase):
+    def setUp(self):
+        self.router = ModelRouter(
+            routes={"cast_binary_vote": "small", "default": "mid"},
+            escalations={"revise_step": EscalationRule(model="big", below_reward=0.5)},
+        )
+
+    def test_routes_and_default(self):
+        self.assertEqual(self.router.route("cast_binary_vote", "gpt-4o"), "small")
+        self.assertEqual(self.router.route("self_consistency", "gpt-4o"), "mid")
+        self.assertEqual(self.router.route("get_embedding", "text-embedding-3-small", kind="embed"), "text-embedding-3-small")
+        self.assertEqual(ModelRouter().route("anything", "asked"), "asked")
+
+    def test_escalation_only_below_threshold(self):
+        self.assertEqual(self.router.route("revise_step", "m", reward=0.3), "big")
+        self.assertEqual(self.router.route("revise_step", "m", reward=0.7), "mid")
+        self.assertEqual(self.router.route("revise_step", "m"), "mid")
+
+    def test_apply_strips_reward_and_counts(self):
+        params = self.router.apply("chat", "revise_step", {"model": "m", "step_reward": 0.2, "messages": []})
+        self.assertEqual(params, {"model": "big", "messages": []})
+        self.router.apply("chat", "cast_binary_vote", {"model": "m"})
+        self.assertEqual(self.router.stats, {"rerouted": 1, "escalated": 1})
+
+
+class TestGatewayRouting(unittest.TestCase):
+    def test_gateway_sends_routed_model(self):
+        client = FakeAsyncClient()
+        gateway = LLMGateway(client=client)
+        gateway.configure_routing(
+            ModelRouter(
+                routes={"judge_step_completion": "small"},
+                escalations={"revise_step": EscalationRule(model="big")},
+            )
+        )
+        try:
+            gateway.chat_sync(call_site="judge_step_completion", model="gpt-4o", messages=[])
+            gateway.chat_sync(call_site="revise_step", model="gpt-4o", messages=[], step_reward=0.1)
+            gateway.chat_sync(call_site="revise_step", model="gpt-4o", messages=[], step_reward=0.9)
+        finally:
+            gateway.close()
+        sent = [params for _, params in client.calls]
+        self.assertEqual([params["model"] for params in sent], ["small", "big", "gpt-4o"])
+        self.assertTrue(all("step_reward" not in params for params in sent))
+        self.assertEqual(gateway.ledger.snapshot()[1].model, "big")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+
+import httpx
+import openai
+
+from llm_gateway import LLMGateway
+from llm_scheduler import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LLMScheduler,
+    LLMTimeoutError,
+    Priority,
+    TokenBucket,
+    estimate_request_tokens,
+    retry_after_seconds,
+)
+from test_llm_gateway import FakeAsyncClient
+
+
+def api_error(status, headers=None):
+    request = httpx.Request("POST", "http://test/v1/chat/completions")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    if status == 429:
+        return openai.RateLimitError("rate limited", response=response, body=None)
+    return openai.InternalServerError("server error", response=response, body=None)
+
+
+class FlakyCall:
+    """Fails with the queued errors, then succeeds."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return SimpleNamespace(usage=SimpleNamespace(total_tokens=10))
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_wait_time_and_reserve(self):
+        bucket = TokenBucket(60)  # one unit per second
+        self.assertEqual(bucket.wait_time(60), 0.0)
+        bucket.take(60)
+        self.assertAlmostEqual(bucket.wait_time(2), 2.0, delta=0.05)
+        bucket.give(50)
+        self.assertEqual(bucket.wait_time(20, reserve=0.5), 0.0)
+        self.assertGreater(bucket.wait_time(25, reserve=0.5), 0.0)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_and_half_opens(self):
+        breaker = CircuitBreaker(threshold=2, reset_seconds=0.05)
+        breaker.record_failure()
+        breaker.check()
+        breaker.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            breaker.check()
+        time.sleep(0.06)
+        self.assertEqual(breaker.state, "half-open")
+        self.assertTrue(breaker.check())
+        with self.assertRaises(CircuitOpenError):
+            breaker.check()
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertFalse(breaker.check())
+
+
+class TestScheduler(unittest.TestCase):
+    def test_retries_honour_retry_after(self):
+        scheduler = LLMScheduler(max_retries=2)
+        call = FlakyCall(api_error(429, {"retry-after-ms": "100"}))
+        started = time.monotonic()
+        asyncio.run(scheduler.execute(call, model="m", tokens=10))
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+        self.assertEqual(call.calls, 2)
+        self.assertEqual(scheduler.stats["rate_limited"], 1)
+        self.assertEqual(retry_after_seconds(api_error(429, {"retry-after": "3"})), 3.0)
+
+    def test_non_retryable_errors_raise_immediately(self):
+        scheduler = LLMScheduler()
+        call = FlakyCall(ValueError("bad request"))
+        with self.assertRaises(ValueError):
+            asyncio.run(scheduler.execute(call, model="m", tokens=10))
+        self.assertEqual(call.calls, 1)
+
+    def test_circuit_breaker_fails_fast(self):
+        scheduler = LLMScheduler(max_retries=0, breaker_threshold=1, breaker_reset_seconds=60)
+        with self.assertRaises(openai.InternalServerError):
+            asyncio.run(scheduler.execute(FlakyCall(api_error(500)), model="m", tokens=1))
+        call = FlakyCall()
+        with self.assertRaises(CircuitOpenError):
+            asyncio.run(scheduler.execute(call, model="m", tokens=1))
+        self.assertEqual(call.calls, 0)
+
+    def test_half_open_admits_one_probe(self):
+        scheduler = LLMScheduler(max_retries=0, breaker_threshold=1, breaker_reset_seconds=0.05)
+        with self.assertRaises(openai.InternalServerError):
+            asyncio.run(scheduler.execute(FlakyCall(api_error(500)), model="m", tokens=1))
+        time.sleep(0.06)
+        calls = []
+
+        async def probe():
+            calls.append("call")
+            await asyncio.sleep(0.05)
+
+        async def run():
+            return await asyncio.gather(
+                *(scheduler.execute(probe, model="m", tokens=1) for _ in range(3)), return_exceptions=True
+            )
+
+        outcomes = asyncio.run(run())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sum(isinstance(outcome, CircuitOpenError) for outcome in outcomes), 2)
+        self.assertEqual(scheduler.breaker.state, "closed")
+
+    def test_deadline_expiry_does_not_trip_the_breaker(self):
+        scheduler = LLMScheduler(max_retries=0, breaker_threshold=1)
+
+        async def hang():
+            await asyncio.sleep(1)
+
+        with self.assertRaises(LLMTimeoutError) as raised:
+            asyncio.run(scheduler.execute(hang, model="m", tokens=1, deadline=time.monotonic() + 0.05))
+        self.assertTrue(raised.exception.expired)
+        self.assertEqual(scheduler.breaker.state, "closed")
+
+        with self.assertRaises(LLMTimeoutError) as raised:
+            asyncio.run(scheduler.execute(hang, model="m", tokens=1, timeout=0.05))
+        self.assertFalse(raised.exception.expired)
+        self.assertEqual(scheduler.breaker.state, "open")
+
+    def test_priority_order_when_rate_limited(self):
+        scheduler = LLMScheduler(
+            rate_limits={"m": {"rpm": 600}},
+            priorities={"bg": "background", "hot": "critical"},
+            background_reserve=0.0,
+        )
+        order = []
+
+        async def run():
+            lane = scheduler._lane("m")
+            lane.requests.take(lane.requests.capacity)  # drain: next slot in ~0.1s
+
+            def call(name):
+                async def _call():
+                    order.append(name)
+
+                return _call
+
+            background = asyncio.create_task(scheduler.execute(call("bg"), "m", 1, "bg"))
+            await asyncio.sleep(0)
+            critical = asyncio.create_task(scheduler.execute(call("hot"), "m", 1, "hot"))
+            await asyncio.gather(background, critical)
+
+        asyncio.run(run())
+        self.assertEqual(order, ["hot", "bg"])
+        self.assertEqual(scheduler.priority_for("other"), Priority.NORMAL)
+
+    def test_token_estimate(self):
+        params = {"messages": [{"role": "user", "content": "x" * 400}], "max_tokens": 100, "n": 2}
+        self.assertGreater(estimate_request_tokens(params), 300)
+        self.assertEqual(estimate_request_tokens({"input": "abcd" * 10}), 10)
+
+
+class TestGatewayScheduling(unittest.TestCase):
+    def test_gateway_routes_through_scheduler(self):
+        scheduler = LLMScheduler()
+        gateway = LLMGateway(client=FakeAsyncClient(), scheduler=scheduler)
+        try:
+            gateway.chat_sync(call_site="name_file", model="m", messages=[])
+        finally:
+            gateway.close()
+        self.assertEqual(scheduler.stats["requests"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
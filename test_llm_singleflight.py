@@ -0,0 +1,107 @@
+import asyncio
+import time
+import unittest
+
+from llm_gateway import LLMGateway
+from llm_singleflight import SingleFlight
+from test_llm_gateway import FakeAsyncClient
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_identical_calls_share_one_upstream_call(self):
+        flight = SingleFlight(call_sites=["site"], linger_seconds=0)
+        calls = []
+
+        async def upstream():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def run():
+            return await asyncio.gather(*(flight.do("k", upstream, "site") for _ in range(4)))
+
+        self.assertEqual(asyncio.run(run()), ["result"] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats["collapsed"], 3)
+        self.assertEqual(flight.collapsed_calls, 3)
+
+    def test_failures_are_shared_but_not_remembered(self):
+        flight = SingleFlight(call_sites=["site"], linger_seconds=10)
+        attempts = []
+
+        async def upstream():
+            attempts.append(1)
+            await asyncio.sleep(0.01)
+            if len(attempts) == 1:
+                raise RuntimeError("boom")
+            return "ok"
+
+        async def run():
+            first = await asyncio.gather(
+                flight.do("k", upstream), flight.do("k", upstream), return_exceptions=True
+            )
+            second = await flight.do("k", upstream)
+            return first, second
+
+        first, second = asyncio.run(run())
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in first))
+        self.assertEqual(second, "ok")
+        self.assertEqual(len(attempts), 2)
+
+    def test_caller_cancellation_does_not_cancel_shared_call(self):
+        flight = SingleFlight(linger_seconds=0)
+
+        async def upstream():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        async def run():
+            impatient = asyncio.ensure_future(flight.do("k", upstream))
+            patient = asyncio.ensure_future(flight.do("k", upstream))
+            await asyncio.sleep(0.01)
+            impatient.cancel()
+            return await patient
+
+        self.assertEqual(asyncio.run(run()), "done")
+
+
+class TestGatewaySingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeAsyncClient(delay=0.1)
+        self.gateway = LLMGateway(client=self.client)
+        self.gateway.configure_single_flight(
+            SingleFlight(call_sites=["output_type_determination"], linger_seconds=1.0)
+        )
+
+    def tearDown(self):
+        self.gateway.close()
+
+    def request(self, call_site):
+        return self.gateway.parse(
+            call_site=call_site,
+            model="m",
+            messages=[{"role": "user", "content": "same problem definition"}],
+            response_format=dict,
+        )
+
+    def test_opted_in_call_site_is_coalesced(self):
+        self.gateway.gather_sync(*(self.request("output_type_determination") for _ in range(3)))
+        # Back-to-back sequential repeat inside the linger window
+        self.gateway.run(self.request("output_type_determination"))
+        self.assertEqual(len(self.client.calls), 1)
+        self.assertEqual(self.gateway.single_flight.collapsed_calls, 3)
+
+    def test_other_call_sites_are_not_coalesced(self):
+        self.gateway.gather_sync(*(self.request("cast_binary_vote") for _ in range(3)))
+        self.assertEqual(len(self.client.calls), 3)
+
+    def test_linger_window_expires(self):
+        self.gateway.single_flight.linger_seconds = 0.05
+        self.gateway.run(self.request("output_type_determination"))
+        time.sleep(0.1)
+        self.gateway.run(self.request("output_type_determination"))
+        self.assertEqual(len(self.client.calls), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from typing import List
+
+import openai
+from pydantic import BaseModel, Field
+
+from llm_gateway import LLMGateway, choice_texts
+from llm_standin import LatencyModel, StandinServer, parse_latency_args
+
+
+class CompletionStatus(BaseModel):
+    completion: bool = Field(..., title="Completion Status")
+
+
+class DirectReply(BaseModel):
+    to: str = ""
+    content: str = ""
+
+
+class ExtractFormat(BaseModel):
+    Facts: List[str] = Field(default_factory=list)
+    Direct_Replies: DirectReply = Field(default_factory=DirectReply)
+
+
+def make_gateway(server):
+    return LLMGateway(client=openai.AsyncOpenAI(api_key="test", base_url=server.base_url))
+
+
+class TestSynthMode(unittest.TestCase):
+    def setUp(self):
+        self.server = StandinServer(mode="synth", seed=1).start()
+        self.gateway = make_gateway(self.server)
+
+    def tearDown(self):
+        self.gateway.close()
+        self.server.stop()
+
+    def test_tagged_response_follows_prompt(self):
+        prompt = "Answer with <count>, <thinking>, <step>, <reflection> and <reward> tags. <count>4</count>"
+        response = self.gateway.chat_sync(
+            call_site="call_openai", model="m", messages=[{"role": "user", "content": prompt}]
+        )
+        content = response.choices[0].message.content
+        self.assertIn("<count>3</count>", content)
+        for tag in ("thinking", "step", "reflection"):
+            self.assertIn(f"<{tag}>", content)
+        self.assertRegex(content, r"<reward>(0\.\d+|1\.0)</reward>")
+        self.assertGreater(response.usage.total_tokens, 0)
+
+    def test_n_choices_in_one_request(self):
+        response = self.gateway.chat_sync(model="m", n=4, messages=[{"role": "user", "content": "hi"}])
+        self.assertEqual(len(choice_texts(response)), 4)
+        self.assertEqual(self.server.stats["synthesized"], 1)
+
+    def test_parse_returns_schema_valid_objects(self):
+        status = self.gateway.parse_sync(model="m", messages=[], response_format=CompletionStatus)
+        self.assertIsInstance(status.choices[0].message.parsed, CompletionStatus)
+        extracted = self.gateway.parse_sync(model="m", messages=[], response_format=ExtractFormat)
+        self.assertIsInstance(extracted.choices[0].message.parsed.Direct_Replies, DirectReply)
+
+    def test_embeddings_are_deterministic_unit_vectors(self):
+        a = self.gateway.embed_sync(model="e", input="hello", dimensions=8)
+        b = self.gateway.embed_sync(model="e", input="hello", dimensions=8)
+        self.assertEqual(a.data[0].embedding, b.data[0].embedding)
+        self.assertAlmostEqual(sum(v * v for v in a.data[0].embedding), 1.0, places=6)
+
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        self.server = StandinServer(mode="synth", seed=1, latency={"chat": "fixed:0.6"}).start()
+        self.gateway = make_gateway(self.server)
+
+    def tearDown(self):
+        self.gateway.close()
+        self.server.stop()
+
+    def test_stream_stops_at_step_boundary(self):
+        prompt = "Use <count>, <thinking>, <step>, <reflection> and <reward> tags. <count>3</count>"
+        started = time.monotonic()
+        response = self.gateway.chat_stream_sync(
+            stop_at=["</step>", "</answer>"],
+            call_site="self_consistency",
+            model="m",
+            messages=[{"role": "user", "content": prompt}],
+        )
+        elapsed = time.monotonic() - started
+        content = response.choices[0].message.content
+        self.assertIn("<step>", content)
+        self.assertNotIn("</step>", content)
+        self.assertNotIn("<reflection>", content)
+        self.assertEqual(response.choices[0].finish_reason, "stop")
+        # The tail of the stream (reflection, reward) was never waited for
+        self.assertLess(elapsed, 0.6)
+
+    def test_stream_cuts_every_choice(self):
+        prompt = "Use <count>, <thinking>, <step>, <reflection> and <reward> tags. <count>3</count>"
+        response = self.gateway.chat_stream_sync(
+            stop_at=["</step>"], model="m", n=3, messages=[{"role": "user", "content": prompt}]
+        )
+        texts = choice_texts(response)
+        self.assertEqual(len(texts), 3)
+        for text in texts:
+            self.assertIn("<step>", text)
+            self.assertNotIn("<reflection>", text)
+
+    def test_stream_without_marker_returns_everything(self):
+        response = self.gateway.chat_stream_sync(
+            stop_at=["</never>"], model="m", messages=[{"role": "user", "content": "plain"}]
+        )
+        self.assertEqual(response.choices[0].message.content, "Stand-in response to: plain")
+        self.assertGreater(response.usage.total_tokens, 0)
+
+
+class TestLatency(unittest.TestCase):
+    def test_specs(self):
+        self.assertEqual(LatencyModel("fixed:0.25").sample(), 0.25)
+        self.assertTrue(0.1 <= LatencyModel("uniform:0.1,0.2", seed=3).sample() <= 0.2)
+        with self.assertRaises(ValueError):
+            LatencyModel("weibull:1")
+        self.assertEqual(
+            parse_latency_args(["fixed:0.1", "judge_step=normal:0.2,0.01"]),
+            {"default": "fixed:0.1", "judge_step": "normal:0.2,0.01"},
+        )
+
+    def test_per_call_site_latency(self):
+        server = StandinServer(latency={"slow_site": "fixed:0.3"}).start()
+        gateway = make_gateway(server)
+        try:
+            started = time.monotonic()
+            gateway.chat_sync(call_site="fast_site", model="m", messages=[])
+            fast = time.monotonic() - started
+            started = time.monotonic()
+            gateway.chat_sync(call_site="slow_site", model="m", messages=[])
+            slow = time.monotonic() - started
+            self.assertGreaterEqual(slow, 0.3)
+            self.assertLess(fast, 0.3)
+        finally:
+            gateway.close()
+            server.stop()
+
+
+class TestRecordReplay(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.transcript = os.path.join(self.tmpdir.name, "run.jsonl")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_recorded_traffic_replays_identically(self):
+        upstream = StandinServer(mode="synth", seed=7).start()
+        recorder = StandinServer(mode="record", transcript_path=self.transcript, upstream=upstream.base_url).start()
+        gateway = make_gateway(recorder)
+        messages = [{"role": "user", "content": "Name this project"}]
+        try:
+            recorded = gateway.chat_sync(call_site="name_project", model="m", messages=messages)
+        finally:
+            gateway.close()
+            recorder.stop()
+            upstream.stop()
+
+        with open(self.transcript) as f:
+            entry = json.loads(f.readline())
+        self.assertEqual(entry["call_site"], "name_project")
+
+        replayer = StandinServer(mode="replay", transcript_path=self.transcript, strict=True).start()
+        gateway = make_gateway(replayer)
+        try:
+            replayed = gateway.chat_sync(call_site="name_project", model="m", messages=messages)
+            self.assertEqual(replayed.id, recorded.id)
+            with self.assertRaises(openai.NotFoundError):
+                gateway.run(
+                    gateway.client.with_options(max_retries=0).chat.completions.create(
+                        model="m", messages=[{"role": "user", "content": "never recorded"}]
+                    )
+                )
+        finally:
+            gateway.close()
+            replayer.stop()
+        self.assertEqual(replayer.stats["replayed"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()